@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# 快取設定，可透過環境變數覆寫
+DEFAULT_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", os.path.join(".cache", "analysis_cache.sqlite3"))
+DEFAULT_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))
+DEFAULT_MEMORY_ITEMS = int(os.getenv("ANALYSIS_CACHE_MEMORY_ITEMS", "128"))
+DEFAULT_DISK_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_DISK_MAX_BYTES", str(50 * 1024 * 1024)))
+
+def normalize_transcript(text: str) -> str:
+    """Normalize a transcript so trivially different pastes map to the same cache key."""
+    text = unicodedata.normalize("NFC", text or "")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [line.rstrip() for line in text.strip().split("\n")]
+    return "\n".join(lines)
+
+def make_cache_key(transcript: str, language: str, prompt_version: str,
+                   model: str, temperature: float, max_tokens: int) -> str:
+    """
+    Build a content-addressed cache key for an analysis request.
+
+    Returns:
+        Hex SHA-256 digest of the normalized transcript and request parameters
+    """
+    material = json.dumps(
+        {
+            "transcript": normalize_transcript(transcript),
+            "language": language,
+            "prompt_version": prompt_version,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class AnalysisCache:
+    """
+    Two-tier cache for analysis results: an in-memory LRU in front of a SQLite file.
+
+    Entries expire after a TTL. The memory tier is bounded by item count and the
+    disk tier by the total size of stored values; least recently used entries are
+    evicted first. Hit and miss counters are kept per tier.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH,
+                 ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 memory_items: int = DEFAULT_MEMORY_ITEMS,
+                 disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES):
+        """
+        Initialize the cache.
+
+        Args:
+            path: SQLite file for the persistent tier, or None for memory only
+            ttl_seconds: Lifetime of an entry in seconds
+            memory_items: Maximum number of entries kept in memory
+            disk_max_bytes: Maximum total size of values kept on disk
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_cache_accessed ON analysis_cache (accessed_at)"
+            )
+            self._conn.commit()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached value.
+
+        Returns:
+            The cached value dict, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._is_expired(entry["created_at"], now):
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry["value"]
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if not self._is_expired(created_at, now):
+                        self._conn.execute(
+                            "UPDATE analysis_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                        self._conn.commit()
+                        value = json.loads(value)
+                        self._remember(key, {"value": value, "created_at": created_at})
+                        self.stats["disk_hits"] += 1
+                        return value
+                    self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a JSON-serializable value under the given key in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, {"value": value, "created_at": now})
+
+            if self._conn is not None:
+                encoded = json.dumps(value, ensure_ascii=False)
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO analysis_cache (key, value, size, created_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (key, encoded, len(encoded.encode("utf-8")), now, now)
+                )
+                self._evict_disk()
+                self._conn.commit()
+
+    def _evict_disk(self) -> None:
+        """Drop expired entries, then least recently used ones until under the size limit."""
+        if self.ttl_seconds > 0:
+            self._conn.execute(
+                "DELETE FROM analysis_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM analysis_cache").fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+
+        rows = self._conn.execute(
+            "SELECT key, size FROM analysis_cache ORDER BY accessed_at ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.disk_max_bytes:
+                break
+            self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+            total -= size
+            self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM analysis_cache")
+                self._conn.commit()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get hit/miss counters and the current number of entries in memory."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            stats["memory_items"] = len(self._memory)
+            return stats
+
+_cache: Optional[AnalysisCache] = None
+_cache_lock = threading.Lock()
+
+def get_analysis_cache() -> AnalysisCache:
+    """Get the shared analysis cache for this process."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnalysisCache()
+    return _cache
@@ -0,0 +1,264 @@
+import re
+import json
+import datetime
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+PARSE_CACHE_SIZE = 256
+TITLE_MAX_CHARS = 50
+
+_CHECKBOX_PATTERN = re.compile(r"^-\s*\[( |x|X)\]\s*(.*)$")
+_OWNER_PATTERN = re.compile(r"[，,;；]?\s*(?:負責人|Responsible|Owner)\s*[：:]\s*([^，,;；]+)")
+_DEADLINE_PATTERN = re.compile(r"[，,;；]?\s*(?:截止日期|截止時間|Deadline|Due)\s*[：:]\s*([^，,;；]+)")
+_PLACEHOLDER_WORDS = ("主題", "topic", "背景", "background")
+
+@dataclass(frozen=True)
+class TodoItem:
+    """A to-do item of an analysis result."""
+    text: str                       # The item as written, without the checkbox
+    task: str                       # The action, without owner and deadline
+    owner: Optional[str] = None
+    deadline: Optional[str] = None
+    checked: bool = False
+    priority: Optional[str] = None
+
+    def to_markdown(self) -> str:
+        return f"- [{'x' if self.checked else ' '}] {self.text}"
+
+@dataclass(frozen=True)
+class ParsedAnalysis:
+    """The structure of an analysis result: title, summary and to-do items."""
+    title: str
+    summary: str = ""               # Text of the summary section
+    todo_list: str = ""             # Text of the to-do section
+    summary_points: Tuple[str, ...] = field(default_factory=tuple)
+    todos: Tuple[TodoItem, ...] = field(default_factory=tuple)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to JSON-serializable data (e.g. for storing with a history item)."""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ParsedAnalysis":
+        return cls(
+            title=data["title"],
+            summary=data.get("summary", ""),
+            todo_list=data.get("todo_list", ""),
+            summary_points=tuple(data.get("summary_points", ())),
+            todos=tuple(TodoItem(**todo) for todo in data.get("todos", ())),
+        )
+
+def _is_summary_heading(section: str) -> bool:
+    return "📌" in section or "Summary" in section or "摘要" in section
+
+def _is_todo_heading(section: str) -> bool:
+    return "✅" in section or "To-Do" in section or "待辦" in section
+
+def _section_body(section: str) -> str:
+    return section.split("\n", 1)[1].strip() if "\n" in section else ""
+
+def parse_todo_line(line: str) -> Optional[TodoItem]:
+    """Parse a "- [ ] task, Responsible: name, Deadline: date" line, or return None if it is not a to-do."""
+    match = _CHECKBOX_PATTERN.match(line.strip())
+    if not match:
+        return None
+    text = match.group(2).strip()
+    owner = _OWNER_PATTERN.search(text)
+    deadline = _DEADLINE_PATTERN.search(text)
+    task = _DEADLINE_PATTERN.sub("", _OWNER_PATTERN.sub("", text)).strip(" ，,;；")
+    return TodoItem(
+        text=text,
+        task=task or text,
+        owner=owner.group(1).strip() if owner else None,
+        deadline=deadline.group(1).strip() if deadline else None,
+        checked=match.group(1).lower() == "x",
+    )
+
+def parse_todo_lines(todo_list: str) -> List[TodoItem]:
+    """Parse the to-do items of a to-do section, skipping other lines."""
+    todos = [parse_todo_line(line) for line in (todo_list or "").split("\n")]
+    return [todo for todo in todos if todo is not None]
+
+def _shorten_title(title: str) -> str:
+    """Limit a title to TITLE_MAX_CHARS, cutting at a natural break point if possible."""
+    if len(title) <= TITLE_MAX_CHARS:
+        return title
+    head = title[:TITLE_MAX_CHARS]
+    for separator in (",", "，", ".", "。", " "):
+        break_point = head.rfind(separator)
+        if break_point != -1:
+            return title[:break_point + 1] + "..."
+    return head + "..."
+
+def _extract_title(summary_section: Optional[str]) -> str:
+    if summary_section is not None:
+        # Use the first bullet point that's not a template placeholder
+        for line in summary_section.strip().split("\n"):
+            stripped = line.strip()
+            if stripped.startswith("- ") and not (
+                "[" in line and "]" in line and any(word in line for word in _PLACEHOLDER_WORDS)
+            ):
+                title = stripped[2:].strip().replace("[", "").replace("]", "")
+                return _shorten_title(title)
+
+        # If there is no good bullet point, use the section heading
+        section_title = summary_section.strip().split("\n")[0].strip()
+        if section_title:
+            return "Summary of " + section_title[:40]
+
+    return f"Analysis {datetime.datetime.now().strftime('%Y-%m-%d')}"
+
+# 由結構化輸出直接建立的解析結果（保留優先順序等 Markdown 無法表達的欄位）
+_primed: "OrderedDict[str, ParsedAnalysis]" = OrderedDict()
+_primed_lock = threading.Lock()
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(result_text: str) -> ParsedAnalysis:
+    summary = ""
+    todo_list = ""
+    title_section = None
+
+    for section in result_text.split("##"):
+        if _is_summary_heading(section):
+            summary = _section_body(section)
+            if title_section is None:
+                title_section = section
+        elif _is_todo_heading(section):
+            todo_list = _section_body(section)
+
+    summary_points = tuple(
+        line.strip()[2:].strip()
+        for line in summary.split("\n")
+        if line.strip().startswith(("- ", "* ")) and line.strip()[2:].strip()
+    )
+
+    return ParsedAnalysis(
+        title=_extract_title(title_section),
+        summary=summary,
+        todo_list=todo_list,
+        summary_points=summary_points,
+        todos=tuple(parse_todo_lines(todo_list)),
+    )
+
+# 結構化輸出 (JSON) 的欄位與各語言的 Markdown 標題
+STRUCTURED_OUTPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "array", "items": {"type": "string"}},
+        "tasks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "task": {"type": "string"},
+                    "owner": {"type": ["string", "null"]},
+                    "deadline": {"type": ["string", "null"]},
+                    "priority": {"type": ["string", "null"], "enum": ["high", "medium", "low", None]},
+                },
+                "required": ["task"],
+            },
+        },
+    },
+    "required": ["summary", "tasks"],
+}
+
+_MARKDOWN_LABELS = {
+    "中文": {"summary": "## 📌 摘要", "todos": "## ✅ 待辦事項清單", "owner": "負責人：", "deadline": "截止日期：", "separator": "，"},
+    "English": {"summary": "## 📌 Summary", "todos": "## ✅ To-Do List", "owner": "Responsible: ", "deadline": "Deadline: ", "separator": ", "},
+}
+
+def _clean(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def parse_structured_output(output: str) -> Optional[Dict[str, Any]]:
+    """
+    Validate a structured (JSON) analysis output against STRUCTURED_OUTPUT_SCHEMA.
+
+    Returns:
+        Dict with "summary" (list of points) and "tasks" (list of dicts with task,
+        owner, deadline and priority), or None if the output is not usable
+    """
+    try:
+        data = json.loads(output)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("summary"), list) or not isinstance(data.get("tasks"), list):
+        return None
+
+    tasks = []
+    for task in data["tasks"]:
+        if isinstance(task, str):
+            task = {"task": task}
+        if not isinstance(task, dict) or not _clean(task.get("task")):
+            continue
+        priority = (_clean(task.get("priority")) or "").lower()
+        tasks.append({
+            "task": _clean(task["task"]),
+            "owner": _clean(task.get("owner")),
+            "deadline": _clean(task.get("deadline")),
+            "priority": priority if priority in ("high", "medium", "low") else None,
+        })
+    return {"summary": [point for point in map(_clean, data["summary"]) if point], "tasks": tasks}
+
+def render_structured_result(data: Dict[str, Any], language: str) -> Tuple[str, ParsedAnalysis]:
+    """
+    Render a validated structured output to the usual Markdown result.
+
+    The ParsedAnalysis is built from the fields directly and primed in the parse
+    cache, so the rendered Markdown is never parsed back.
+
+    Returns:
+        (markdown, parsed)
+    """
+    labels = _MARKDOWN_LABELS["中文"] if language == "中文" else _MARKDOWN_LABELS["English"]
+
+    todos = []
+    for task in data["tasks"]:
+        parts = [task["task"]]
+        if task["owner"]:
+            parts.append(labels["owner"] + task["owner"])
+        if task["deadline"]:
+            parts.append(labels["deadline"] + task["deadline"])
+        todos.append(TodoItem(
+            text=labels["separator"].join(parts),
+            task=task["task"],
+            owner=task["owner"],
+            deadline=task["deadline"],
+            priority=task["priority"],
+        ))
+
+    summary = "\n".join(f"- {point}" for point in data["summary"])
+    todo_list = "\n".join(todo.to_markdown() for todo in todos)
+    markdown = f"{labels['summary']}\n{summary}\n\n{labels['todos']}\n{todo_list}"
+    parsed = ParsedAnalysis(
+        title=_extract_title(f"{labels['summary'][2:]}\n{summary}"),
+        summary=summary,
+        todo_list=todo_list,
+        summary_points=tuple(data["summary"]),
+        todos=tuple(todos),
+    )
+    with _primed_lock:
+        _primed[markdown] = parsed
+        while len(_primed) > PARSE_CACHE_SIZE:
+            _primed.popitem(last=False)
+    return markdown, parsed
+
+def parse_analysis(result_text: Optional[str]) -> ParsedAnalysis:
+    """
+    Parse an analysis result in a single pass.
+
+    Results are memoized by their text, so Streamlit reruns, Notion exports and
+    the history sidebar share one parse of each result.
+    """
+    if not result_text:
+        return ParsedAnalysis(title="Untitled Analysis")
+    primed = _primed.get(result_text)
+    if primed is not None:
+        return primed
+    return _parse(result_text)
@@ -0,0 +1,455 @@
+import os
+import time
+import difflib
+import hashlib
+import logging
+from typing import Callable, Dict, List, Optional
+
+from analysis_cache import AnalysisCache, get_analysis_cache, make_cache_key
+from analysis_parser import parse_structured_output, render_structured_result
+from map_reduce import (
+    MAP_MAX_TOKENS, MAX_CHUNK_TOKENS,
+    build_reduce_prompt, chunk_transcript, map_chunks, merge_partials
+)
+from model_router import get_model_router
+from openai_api import StreamInterruptedError, stream_openai_api, is_error_output
+from prompt_registry import TASK_ANALYSIS, TASK_ANALYSIS_JSON, TASK_INCREMENTAL, get_prompt
+from token_budget import choose_max_tokens, count_tokens, plan_request
+from transcript_compression import CompressedTranscript, compress_transcript
+from utils import extract_summary_title
+
+logger = logging.getLogger(__name__)
+
+# 未指定模型時由 model_router 依請求大小、語言與延遲/成本目標選擇；設定 ANALYSIS_MODEL 可固定使用某個模型
+DEFAULT_MODEL = "gpt-3.5-turbo"
+FIXED_MODEL = os.getenv("ANALYSIS_MODEL") or None
+DEFAULT_TEMPERATURE = 0.3
+
+# 輸出模式："markdown" 直接產生 Markdown，"json" 以 JSON mode 產生結構化資料後在本地轉為 Markdown
+OUTPUT_MODE_MARKDOWN = "markdown"
+OUTPUT_MODE_JSON = "json"
+DEFAULT_OUTPUT_MODE = os.getenv("ANALYSIS_OUTPUT_MODE", OUTPUT_MODE_MARKDOWN)
+
+# 變動內容超過原對話的此比例時，改為完整重新分析
+INCREMENTAL_MAX_CHANGE_RATIO = 0.5
+
+# 各階段在整體進度中所佔的比例，總和為 1
+PROGRESS_STAGE_WEIGHTS = {
+    "prompt": 0.05,   # 建立提示詞
+    "request": 0.10,  # 發送請求並等待第一個 token
+    "tokens": 0.70,   # 接收回應 token
+    "parse": 0.05,    # 解析結果
+    "save": 0.10,     # 保存到歷史紀錄
+}
+
+PROGRESS_STAGES = list(PROGRESS_STAGE_WEIGHTS.keys())
+
+ProgressCallback = Callable[[float, str, Dict], None]
+
+class ProgressReporter:
+    """
+    Convert per-stage progress of the analysis pipeline into overall progress events.
+
+    Each event is delivered to the callback as (overall_fraction, stage, details),
+    where overall_fraction is in [0, 1] and never decreases.
+    """
+
+    def __init__(self, callback: Optional[ProgressCallback] = None):
+        self.callback = callback
+        self.fraction = 0.0
+        self.started_at = time.perf_counter()
+
+    def _stage_offset(self, stage: str) -> float:
+        offset = 0.0
+        for name in PROGRESS_STAGES:
+            if name == stage:
+                return offset
+            offset += PROGRESS_STAGE_WEIGHTS[name]
+        raise ValueError(f"Unknown progress stage: {stage}")
+
+    def report(self, stage: str, stage_fraction: float = 0.0, **details) -> None:
+        """
+        Report progress within a stage.
+
+        Args:
+            stage: One of PROGRESS_STAGES
+            stage_fraction: How much of this stage is done, from 0 to 1
+            details: Extra information passed through to the callback
+        """
+        stage_fraction = min(max(stage_fraction, 0.0), 1.0)
+        fraction = self._stage_offset(stage) + PROGRESS_STAGE_WEIGHTS[stage] * stage_fraction
+        self.fraction = max(self.fraction, min(fraction, 1.0))
+
+        if self.callback:
+            details["elapsed"] = time.perf_counter() - self.started_at
+            self.callback(self.fraction, stage, details)
+
+def build_prompt(chat_input: str, language: str, output_mode: str = OUTPUT_MODE_MARKDOWN) -> str:
+    """根據選擇的語言與輸出模式建立分析提示詞"""
+    task = TASK_ANALYSIS_JSON if output_mode == OUTPUT_MODE_JSON else TASK_ANALYSIS
+    return get_prompt(task, language).render(chat_input=chat_input)
+
+def diff_transcripts(previous: str, current: str) -> Dict:
+    """
+    Compare two versions of a transcript line by line.
+
+    Returns:
+        Dict containing the added and removed lines, the changes formatted as
+        "+ line" / "- line", and change_ratio, the changed characters relative
+        to the current transcript
+    """
+    previous_lines = [line.rstrip() for line in previous.strip().splitlines()]
+    current_lines = [line.rstrip() for line in current.strip().splitlines()]
+    matcher = difflib.SequenceMatcher(None, previous_lines, current_lines, autojunk=False)
+
+    added: List[str] = []
+    removed: List[str] = []
+    changes: List[str] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("replace", "delete"):
+            removed.extend(previous_lines[i1:i2])
+            changes.extend(f"- {line}" for line in previous_lines[i1:i2] if line.strip())
+        if tag in ("replace", "insert"):
+            added.extend(current_lines[j1:j2])
+            changes.extend(f"+ {line}" for line in current_lines[j1:j2] if line.strip())
+
+    changed_chars = sum(len(line) for line in added) + sum(len(line) for line in removed)
+    return {
+        "added": added,
+        "removed": removed,
+        "changes": "\n".join(changes),
+        "change_ratio": changed_chars / max(len(current.strip()), 1),
+    }
+
+def build_incremental_prompt(previous_result: str, changes: str, language: str) -> str:
+    """根據選擇的語言建立增量分析提示詞"""
+    return get_prompt(TASK_INCREMENTAL, language).render(previous_result=previous_result.strip(), changes=changes)
+
+def _expand_structured(data: Dict, compressed: CompressedTranscript) -> Dict:
+    """Restore speaker names in the fields of a validated structured output."""
+    return {
+        "summary": [compressed.expand(point) for point in data["summary"]],
+        "tasks": [
+            {key: compressed.expand(value) if key != "priority" and value else value for key, value in task.items()}
+            for task in data["tasks"]
+        ],
+    }
+
+def _stream_completion(prompt: str, api_key: str, progress: ProgressReporter,
+                       on_delta: Optional[Callable[[str], None]],
+                       model: str, temperature: float, max_tokens: int,
+                       response_format: Optional[Dict] = None,
+                       routing: Optional[Dict] = None) -> str:
+    """
+    Stream a completion, reporting token progress, and return the full output.
+
+    If the stream fails after part of the output arrived, the partial output is
+    discarded and an error message returned instead, so a truncated result is
+    never treated as a success. If the model was chosen by the router, the
+    measured latency is recorded against its routing decision.
+    """
+    output = ""
+    tokens_received = 0
+    started = time.perf_counter()
+    first_token_seconds = None
+    try:
+        for delta in stream_openai_api(prompt, api_key, model=model, temperature=temperature,
+                                       max_tokens=max_tokens, response_format=response_format):
+            if tokens_received == 0:
+                first_token_seconds = time.perf_counter() - started
+                progress.report("request", 1.0)
+            # 每個串流片段大致對應一個 token
+            tokens_received += 1
+            output += delta
+            progress.report(
+                "tokens",
+                tokens_received / max_tokens,
+                tokens_received=tokens_received,
+                tokens_estimated=max_tokens
+            )
+            if on_delta:
+                on_delta(output)
+    except StreamInterruptedError as e:
+        logger.warning("Stream interrupted after %d chunks: %s", tokens_received, e)
+        output = f"錯誤: 回應在傳輸途中中斷，請重試（{e}）"
+    progress.report("tokens", 1.0, tokens_received=tokens_received, tokens_estimated=max_tokens)
+    if routing:
+        get_model_router().record(
+            routing, time.perf_counter() - started, first_token_seconds, tokens_received,
+            success=bool(output.strip()) and not is_error_output(output.strip())
+        )
+    return output
+
+def _route(prompt: str, transcript: str, language: str, max_tokens: Optional[int]) -> Dict:
+    """Let the model router choose the model of a request."""
+    if max_tokens is None:
+        max_tokens = choose_max_tokens(count_tokens(transcript, DEFAULT_MODEL))
+    return get_model_router().route(count_tokens(prompt, DEFAULT_MODEL), max_tokens, language)
+
+def run_analysis(chat_input: str, language: str, api_key: str,
+                 progress: Optional[ProgressReporter] = None,
+                 on_delta: Optional[Callable[[str], None]] = None,
+                 model: Optional[str] = FIXED_MODEL,
+                 temperature: float = DEFAULT_TEMPERATURE,
+                 max_tokens: Optional[int] = None,
+                 cache: Optional[AnalysisCache] = None,
+                 use_cache: bool = True,
+                 output_mode: str = DEFAULT_OUTPUT_MODE) -> Dict:
+    """
+    Run the analysis pipeline: build the prompt, stream the completion and parse the result.
+
+    Args:
+        chat_input: The conversation record to analyze
+        language: UI language, "中文" or "English"
+        api_key: OpenAI API key
+        progress: Reporter receiving progress events (optional)
+        on_delta: Called with the accumulated output every time a new chunk arrives (optional)
+        model: OpenAI model name (optional, chosen by the model router if omitted)
+        temperature: Sampling temperature
+        max_tokens: Output token budget (optional, chosen by the token planner if omitted)
+        cache: Analysis cache to use (defaults to the shared process cache)
+        use_cache: Whether to look up and store results in the cache
+        output_mode: OUTPUT_MODE_MARKDOWN, or OUTPUT_MODE_JSON to request JSON with a
+            fixed schema and render the Markdown locally (long transcripts that need
+            chunking always use Markdown)
+
+    The transcript is compressed (see compress_transcript) before it is put into
+    the prompt, and speaker aliases in the output are expanded back.
+
+    Returns:
+        Dict containing success status, the result text, its title, whether it
+        came from the cache and the token plan, or an error message. In JSON mode
+        "parsed" holds the structure built directly from the JSON fields. The plan
+        also reports "original_prompt_tokens" and "saved_tokens", the prompt size
+        without compression and the tokens the compression saved, and "routing"
+        the router's decision when the model was not given.
+    """
+    progress = progress or ProgressReporter()
+
+    progress.report("prompt", 0.0)
+    structured = output_mode == OUTPUT_MODE_JSON
+    compressed = compress_transcript(chat_input, model or DEFAULT_MODEL)
+    transcript = compressed.with_legend()
+    prompt = build_prompt(transcript, language, output_mode)
+    routing = None
+    if model is None:
+        routing = _route(prompt, transcript, language, max_tokens)
+        model = routing["model"]
+    plan = plan_request(
+        prompt, transcript, model, max_tokens,
+        chunk_tokens=MAX_CHUNK_TOKENS,
+        chunk_output_tokens=MAP_MAX_TOKENS
+    )
+    plan["original_prompt_tokens"] = plan["prompt_tokens"] - plan["transcript_tokens"] + count_tokens(chat_input, model)
+    plan["saved_tokens"] = max(plan["original_prompt_tokens"] - plan["prompt_tokens"], 0)
+    plan["routing"] = routing
+    logger.info(
+        "Analysis plan: model=%s mode=%s prompt_tokens=%d (saved %d, %d speaker aliases) max_tokens=%d chunks=%d ok=%s",
+        plan["model"], plan["mode"], plan["prompt_tokens"], plan["saved_tokens"], len(compressed.aliases),
+        plan["max_tokens"], plan["estimated_chunks"], plan["ok"]
+    )
+    if not plan["ok"]:
+        return {"success": False, "message": plan["message"], "plan": plan}
+
+    max_tokens = plan["max_tokens"]
+    chunked = plan["mode"] == "chunked"
+    structured = structured and not chunked
+    template = get_prompt(TASK_ANALYSIS_JSON if structured else TASK_ANALYSIS, language)
+
+    cache_key = None
+    if use_cache:
+        cache = cache or get_analysis_cache()
+        cache_key = make_cache_key(chat_input, language, template.cache_version, model, temperature, max_tokens)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            progress.report("parse", 1.0, cached=True)
+            analysis = {
+                "success": True, "result": cached["result"], "title": cached["title"],
+                "cached": True, "plan": plan
+            }
+            if cached.get("structured"):
+                analysis["result"], analysis["parsed"] = render_structured_result(cached["structured"], language)
+            return analysis
+    progress.report("prompt", 1.0)
+
+    if chunked:
+        # 超出上下文長度：分段並行摘要後，再合併為最終結果（每段都附上說話者代號對照）
+        chunks = [compressed.with_legend(chunk) for chunk in chunk_transcript(compressed.text)]
+        progress.report("request", 0.0, chunks_done=0, chunks_total=len(chunks))
+        mapped = map_chunks(
+            chunks, language, api_key, model, temperature,
+            on_chunk_done=lambda done, total: progress.report(
+                "request", done / total, chunks_done=done, chunks_total=total
+            )
+        )
+        if not mapped["success"]:
+            return {"success": False, "message": mapped["message"], "plan": plan}
+        prompt = build_reduce_prompt(mapped["partials"], language)
+    else:
+        progress.report("request", 0.0)
+
+    if on_delta and compressed.aliases:
+        show_delta = on_delta
+        on_delta = lambda text: show_delta(compressed.expand(text))
+
+    if structured:
+        # JSON 不適合即時顯示，串流只用來回報進度
+        output = _stream_completion(
+            prompt, api_key, progress, None, model, temperature, max_tokens,
+            response_format={"type": "json_object"}, routing=routing
+        )
+    else:
+        output = _stream_completion(
+            prompt, api_key, progress, on_delta, model, temperature, max_tokens, routing=routing
+        )
+
+    if chunked and (not output.strip() or is_error_output(output.strip())):
+        output = merge_partials(mapped["partials"], language)
+        if on_delta:
+            on_delta(output)
+
+    progress.report("parse", 0.0)
+    output = output.strip()
+    if not output or is_error_output(output):
+        return {"success": False, "message": output or "錯誤: API 未返回任何內容", "plan": plan}
+
+    analysis = {"success": True, "cached": False, "plan": plan}
+    cached_value = {}
+    if structured:
+        data = parse_structured_output(output)
+        if data is None:
+            return {"success": False, "message": "錯誤: 無法解析結構化輸出（可能超過輸出上限）", "plan": plan}
+        data = _expand_structured(data, compressed)
+        output, analysis["parsed"] = render_structured_result(data, language)
+        title = analysis["parsed"].title
+        cached_value["structured"] = data
+        if on_delta:
+            on_delta(output)
+    else:
+        output = compressed.expand(output)
+        title = extract_summary_title(output)
+    progress.report("parse", 1.0)
+
+    if cache_key:
+        cache.set(cache_key, {"result": output, "title": title, **cached_value})
+
+    analysis.update(result=output, title=title)
+    return analysis
+
+def run_incremental_analysis(chat_input: str, previous_input: str, previous_result: str,
+                             language: str, api_key: str,
+                             progress: Optional[ProgressReporter] = None,
+                             on_delta: Optional[Callable[[str], None]] = None,
+                             model: Optional[str] = FIXED_MODEL,
+                             temperature: float = DEFAULT_TEMPERATURE,
+                             cache: Optional[AnalysisCache] = None,
+                             use_cache: bool = True,
+                             output_mode: str = DEFAULT_OUTPUT_MODE) -> Dict:
+    """
+    Update a previous analysis after its transcript was edited.
+
+    Only the previous result and the added/removed lines are sent, so the cost of
+    an update grows with the size of the edit rather than the transcript. Falls
+    back to run_analysis() when there is no usable previous version, the edit
+    changes more than INCREMENTAL_MAX_CHANGE_RATIO of the transcript, or JSON
+    output is requested (the update prompt only produces Markdown).
+
+    Args:
+        chat_input: The edited conversation record
+        previous_input: The conversation record the previous result was made from
+        previous_result: The previous analysis result
+
+    Returns:
+        Same as run_analysis(), plus "incremental" telling whether only the
+        changes were analyzed and, if so, "lines_added" and "lines_removed"
+    """
+    progress = progress or ProgressReporter()
+
+    def full_analysis() -> Dict:
+        analysis = run_analysis(
+            chat_input, language, api_key, progress=progress, on_delta=on_delta,
+            model=model, temperature=temperature, cache=cache, use_cache=use_cache,
+            output_mode=output_mode
+        )
+        analysis["incremental"] = False
+        return analysis
+
+    if output_mode == OUTPUT_MODE_JSON:
+        return full_analysis()
+    if not previous_input or not previous_result or is_error_output(previous_result.strip()):
+        return full_analysis()
+
+    progress.report("prompt", 0.0)
+    diff = diff_transcripts(previous_input, chat_input)
+    if not diff["changes"]:
+        # 只有空白差異：沿用先前結果
+        progress.report("parse", 1.0, cached=True)
+        return {
+            "success": True, "result": previous_result, "title": extract_summary_title(previous_result),
+            "cached": True, "incremental": True, "lines_added": 0, "lines_removed": 0,
+            "plan": plan_request(previous_result, "", model or DEFAULT_MODEL)
+        }
+    if diff["change_ratio"] > INCREMENTAL_MAX_CHANGE_RATIO:
+        return full_analysis()
+
+    # 輸出長度與完整分析相同，因此依完整對話決定輸出上限
+    max_tokens = choose_max_tokens(count_tokens(chat_input, model or DEFAULT_MODEL))
+    prompt = build_incremental_prompt(previous_result, diff["changes"], language)
+    # 退回完整分析時會重新路由，因此路由結果不覆寫 model
+    routing = _route(prompt, diff["changes"], language, max_tokens) if model is None else None
+    request_model = routing["model"] if routing else model
+    plan = plan_request(prompt, diff["changes"], request_model, max_tokens)
+    plan["routing"] = routing
+    logger.info(
+        "Incremental analysis plan: model=%s prompt_tokens=%d max_tokens=%d lines_added=%d lines_removed=%d",
+        plan["model"], plan["prompt_tokens"], plan["max_tokens"], len(diff["added"]), len(diff["removed"])
+    )
+    if not plan["ok"] or plan["mode"] != "single":
+        return full_analysis()
+
+    cache_key = None
+    if use_cache:
+        cache = cache or get_analysis_cache()
+        # 相同內容已有完整分析時直接沿用
+        full_version = get_prompt(TASK_ANALYSIS, language).cache_version
+        cached = cache.get(make_cache_key(chat_input, language, full_version, request_model, temperature, max_tokens))
+        if cached is not None:
+            progress.report("parse", 1.0, cached=True)
+            return {
+                "success": True, "result": cached["result"], "title": cached["title"],
+                "cached": True, "incremental": False, "plan": plan
+            }
+        # 增量結果取決於先前的版本，因此另存於包含先前版本雜湊的鍵，不當作完整分析的結果
+        previous_hash = hashlib.sha256(f"{previous_input}\n{previous_result}".encode("utf-8")).hexdigest()
+        incremental_version = f"{get_prompt(TASK_INCREMENTAL, language).cache_version}:{previous_hash}"
+        cache_key = make_cache_key(chat_input, language, incremental_version, request_model, temperature, max_tokens)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            progress.report("parse", 1.0, cached=True)
+            return {
+                "success": True, "result": cached["result"], "title": cached["title"],
+                "cached": True, "incremental": True, "lines_added": len(diff["added"]),
+                "lines_removed": len(diff["removed"]), "plan": plan
+            }
+    progress.report("prompt", 1.0)
+    progress.report("request", 0.0)
+
+    output = _stream_completion(
+        prompt, api_key, progress, on_delta, request_model, temperature, max_tokens, routing=routing
+    )
+
+    progress.report("parse", 0.0)
+    output = output.strip()
+    if not output or is_error_output(output):
+        return {"success": False, "message": output or "錯誤: API 未返回任何內容", "plan": plan}
+
+    title = extract_summary_title(output)
+    progress.report("parse", 1.0)
+
+    if cache_key:
+        cache.set(cache_key, {"result": output, "title": title})
+
+    return {
+        "success": True, "result": output, "title": title, "cached": False, "incremental": True,
+        "lines_added": len(diff["added"]), "lines_removed": len(diff["removed"]), "plan": plan
+    }
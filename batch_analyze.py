@@ -0,0 +1,175 @@
+"""
+Headless batch analysis of archived transcripts.
+
+Usage:
+    python batch_analyze.py notes/ --output results.jsonl --markdown-dir results/
+    python batch_analyze.py "notes/**/*.md" --language English --concurrency 8
+"""
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Set
+
+from dotenv import load_dotenv
+
+from analysis_pipeline import run_analysis
+from token_budget import count_tokens
+from transcript_ingest import load_transcript
+
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".srt", ".vtt", ".docx")
+
+def collect_files(target: str) -> List[str]:
+    """Collect transcript files from a directory (recursively) or a glob pattern."""
+    if os.path.isdir(target):
+        pattern = os.path.join(target, "**", "*")
+    else:
+        pattern = target
+    files = [
+        path for path in glob.glob(pattern, recursive=True)
+        if os.path.isfile(path) and path.lower().endswith(SUPPORTED_EXTENSIONS)
+    ]
+    return sorted(files)
+
+def read_transcript(path: str) -> str:
+    """
+    Read a transcript file.
+
+    Text and Markdown files are used as they are; subtitles and Word documents are
+    normalized into timestamped speaker turns.
+
+    Raises:
+        ValueError: If the file cannot be read
+    """
+    if path.lower().endswith((".txt", ".md")):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    return load_transcript(path, path)["transcript"]
+
+def file_hash(text: str, language: str) -> str:
+    """Hash a transcript together with the analysis language for checkpointing."""
+    return hashlib.sha256(f"{language}\n{text}".encode("utf-8")).hexdigest()
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Load the hashes of transcripts that were already analyzed."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+def analyze_file(path: str, text: str, language: str, api_key: str) -> Dict:
+    """Analyze a single transcript and collect timing and token counts."""
+    started = time.perf_counter()
+    analysis = run_analysis(text, language, api_key)
+    elapsed = time.perf_counter() - started
+
+    plan = analysis.get("plan", {})
+    output_tokens = count_tokens(analysis.get("result", ""), plan.get("model", "gpt-3.5-turbo"))
+    return {
+        "path": path,
+        "success": analysis["success"],
+        "title": analysis.get("title", ""),
+        "result": analysis.get("result", ""),
+        "message": analysis.get("message", ""),
+        "cached": analysis.get("cached", False),
+        "model": plan.get("model", ""),
+        "prompt_tokens": plan.get("prompt_tokens", 0),
+        "saved_tokens": plan.get("saved_tokens", 0),
+        "output_tokens": output_tokens,
+        "seconds": round(elapsed, 3),
+    }
+
+def write_markdown(markdown_dir: str, record: Dict) -> None:
+    """Write an analysis result next to the others as a Markdown file."""
+    name = os.path.splitext(os.path.basename(record["path"]))[0]
+    target = os.path.join(markdown_dir, f"{name}-{record['hash'][:8]}.md")
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(f"# {record['title']}\n\n{record['result']}\n")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Analyze a directory of transcripts with Context Catcher.")
+    parser.add_argument("target", help="Directory or glob pattern of .txt/.md/.srt/.vtt/.docx transcripts")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("--markdown-dir", help="Also write each result as a Markdown file into this directory")
+    parser.add_argument("--checkpoint", help="File of completed transcript hashes (default: <output>.checkpoint)")
+    parser.add_argument("--language", default="中文", choices=["中文", "English"], help="Analysis language")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of analyses in flight")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        print("Error: API key not found. Please check your .env file.")
+        return 1
+
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+    completed = load_checkpoint(checkpoint_path)
+    if args.markdown_dir:
+        os.makedirs(args.markdown_dir, exist_ok=True)
+
+    pending = []
+    for path in collect_files(args.target):
+        try:
+            text = read_transcript(path)
+        except ValueError as e:
+            print(f"[skip] {path}: {e}")
+            continue
+        digest = file_hash(text, args.language)
+        if digest not in completed and text.strip():
+            pending.append((path, text, digest))
+
+    print(f"Found {len(pending)} transcript(s) to analyze ({len(completed)} already done)")
+    if not pending:
+        return 0
+
+    started = time.perf_counter()
+    succeeded = failed = total_tokens = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor, \
+            open(args.output, "a", encoding="utf-8") as output, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        futures = {
+            executor.submit(analyze_file, path, text, args.language, api_key): (path, digest)
+            for path, text, digest in pending
+        }
+        for future in as_completed(futures):
+            path, digest = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                # 單一檔案的意外錯誤不中斷整批處理，下次執行時會重試
+                failed += 1
+                print(f"[fail] {path}: {e}")
+                continue
+            record["hash"] = digest
+            # 快取命中的結果沒有實際呼叫 API，不計入處理量
+            if not record["cached"]:
+                total_tokens += record["prompt_tokens"] + record["output_tokens"]
+
+            if record["success"]:
+                succeeded += 1
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                if args.markdown_dir:
+                    write_markdown(args.markdown_dir, record)
+                # 只有成功的檔案才寫入檢查點，失敗的會在下次執行時重試
+                checkpoint.write(record["hash"] + "\n")
+                checkpoint.flush()
+                print(f"[ok]   {record['path']} ({record['seconds']}s{', cached' if record['cached'] else ''})")
+            else:
+                failed += 1
+                print(f"[fail] {record['path']}: {record['message']}")
+
+    minutes = (time.perf_counter() - started) / 60.0
+    print(
+        f"\nDone: {succeeded} succeeded, {failed} failed in {minutes * 60:.1f}s "
+        f"({succeeded / minutes:.1f} docs/min, {total_tokens / minutes:.0f} tokens/min)"
+    )
+    return 0 if failed == 0 else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
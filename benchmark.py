@@ -0,0 +1,452 @@
+"""
+End-to-end benchmark of the analyze and Notion export paths against the local mock server.
+
+Each scenario (flow x transcript size x concurrency) reports p50/p95/p99 latency,
+throughput, peak RSS and traced allocations. Results are written as JSON so runs
+on different commits can be compared.
+
+Usage:
+    python benchmark.py --sizes 2000,20000,80000 --concurrency 1,4,16 --requests 40
+    python benchmark.py --latency-ms 300 --latency-sigma 0.5 --error-rate 0.02
+    python benchmark.py --compare benchmark_results/benchmark-<commit>-<time>.json
+"""
+import os
+import sys
+import math
+import json
+import time
+import random
+import shutil
+import socket
+import platform
+import argparse
+import datetime
+import tempfile
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+# 基準測試的歷史紀錄、索引與快取寫入獨立的暫存資料夾；須在匯入應用模組之前設定
+BENCHMARK_DATA_DIR = tempfile.mkdtemp(prefix="context-catcher-benchmark-")
+os.environ["HISTORY_DB_PATH"] = os.path.join(BENCHMARK_DATA_DIR, "history.sqlite3")
+os.environ["NEAR_DUPLICATE_INDEX_PATH"] = os.path.join(BENCHMARK_DATA_DIR, "fingerprints.sqlite3")
+os.environ["EMBEDDING_INDEX_DIR"] = os.path.join(BENCHMARK_DATA_DIR, "embeddings")
+os.environ["NOTION_INDEX_PATH"] = os.path.join(BENCHMARK_DATA_DIR, "notion_index.sqlite3")
+os.environ["NOTION_OUTBOX_PATH"] = os.path.join(BENCHMARK_DATA_DIR, "notion_outbox.sqlite3")
+os.environ["ANALYSIS_CACHE_PATH"] = os.path.join(BENCHMARK_DATA_DIR, "analysis_cache.sqlite3")
+os.environ["MODEL_ROUTING_LOG_PATH"] = os.path.join(BENCHMARK_DATA_DIR, "routing.jsonl")
+
+from analysis_parser import parse_analysis
+from analysis_pipeline import DEFAULT_MODEL, ProgressReporter, build_prompt, run_analysis
+from embedding_index import get_embedding_index
+from history_store import get_history_store
+from near_duplicate import get_near_duplicate_index
+from notion_integration import NotionIntegration, get_notion_rate_limiter
+from openai_api import call_openai_api, set_openai_base_url
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_RESULTS_DIR = "benchmark_results"
+BENCHMARK_API_KEY = "sk-benchmark"
+BENCHMARK_USER_ID = "benchmark"
+BENCHMARK_DATABASE_ID = "benchmark-database"
+
+# 等待模擬伺服器啟動的最長秒數
+SERVER_START_TIMEOUT = 10
+
+# 記錄記憶體配置（tracemalloc）的額外請求數；tracemalloc 會大幅拖慢程式，因此不與計時的請求一起執行
+ALLOCATION_SAMPLE_REQUESTS = 5
+
+# 比較基準結果時，p95 延遲或處理量變差超過此比例即視為退步
+DEFAULT_MAX_REGRESSION = 0.10
+
+_SPEAKERS = {
+    "中文": ["王小明（產品經理）", "李小華", "陳大同", "林美玲"],
+    "English": ["Alice Wang (PM)", "Bob Chen", "Carol Lin", "David Lee"],
+}
+_PHRASES = {
+    "中文": ["新版功能預計下個月上線", "後端 API 需要在週五前完成", "設計稿還需要再調整一次",
+             "測試環境目前不太穩定", "我們下週一開始內部測試", "客戶回饋主要集中在登入流程",
+             "這部分由我負責跟進", "預算需要再跟財務確認", "文件請在週三前更新"],
+    "English": ["the new release should ship next month", "the backend API must be done by Friday",
+                "the design needs one more iteration", "the staging environment is still unstable",
+                "internal testing starts next Monday", "most customer feedback is about the login flow",
+                "I will follow up on this", "we need to confirm the budget with finance",
+                "please update the docs by Wednesday"],
+}
+
+def generate_transcript(chars: int, language: str, seed: int) -> str:
+    """Generate a synthetic meeting transcript of about the given number of characters."""
+    rng = random.Random(seed)
+    separator = "：" if language == "中文" else ": "
+    joiner = "，" if language == "中文" else ", "
+    lines = [f"Meeting #{seed}"]
+    size = len(lines[0])
+    while size < chars:
+        phrases = rng.sample(_PHRASES[language], rng.randint(1, 3))
+        line = rng.choice(_SPEAKERS[language]) + separator + joiner.join(phrases)
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def summarize_latencies(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99, mean and max of latencies in seconds, reported in milliseconds."""
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 2)
+    return {
+        "p50_ms": ms(percentile(values, 0.50)),
+        "p95_ms": ms(percentile(values, 0.95)),
+        "p99_ms": ms(percentile(values, 0.99)),
+        "mean_ms": ms(sum(values) / len(values)) if values else None,
+        "max_ms": ms(max(values)) if values else None,
+    }
+
+def peak_rss_mb() -> Optional[float]:
+    """High-water mark of the process's resident memory (None where unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 回報，macOS 以 bytes 回報
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# --- 分析與匯出流程 ---
+
+def analyze_once(transcript: str, language: str) -> Tuple[bool, Dict[str, float]]:
+    """
+    Run one analysis the way the app does: run_analysis() (token planning, model
+    routing, the analysis cache and the streamed completion), then save the result
+    to the history with its near-duplicate fingerprint.
+
+    Every transcript is unique, so the cache is looked up and written but never hit.
+
+    Returns:
+        (success, seconds spent in each stage)
+    """
+    # 以進度事件記錄各階段開始的時間
+    stage_started: Dict[str, float] = {}
+    def on_progress(fraction: float, stage: str, details: Dict) -> None:
+        stage_started.setdefault(stage, time.perf_counter())
+
+    started = time.perf_counter()
+    analysis = run_analysis(transcript, language, BENCHMARK_API_KEY,
+                            progress=ProgressReporter(on_progress), on_delta=lambda output: None)
+    finished = time.perf_counter()
+
+    stages = {}
+    marks = sorted(stage_started.items(), key=lambda pair: pair[1])
+    for i, (stage, mark) in enumerate(marks):
+        end = marks[i + 1][1] if i + 1 < len(marks) else finished
+        stages[stage] = end - (started if i == 0 else mark)
+    if not analysis["success"]:
+        return False, stages
+
+    mark = time.perf_counter()
+    store = get_history_store()
+    item_id = store.add(BENCHMARK_USER_ID, title=analysis["title"], language=language,
+                        transcript=transcript, result=analysis["result"])
+    pruned = store.apply_retention(BENCHMARK_USER_ID)
+    get_near_duplicate_index().remove_items(BENCHMARK_USER_ID, pruned)
+    get_embedding_index().remove_items(BENCHMARK_USER_ID, pruned)
+    get_near_duplicate_index().add(BENCHMARK_USER_ID, item_id, transcript)
+    stages["save"] = time.perf_counter() - mark
+    return True, stages
+
+def run_analyze_scenario(transcripts: List[str], language: str, concurrency: int) -> Dict[str, Any]:
+    """Analyze every transcript with the given number of analyses in flight."""
+    def task(transcript: str) -> Tuple[float, bool, Dict[str, float]]:
+        started = time.perf_counter()
+        success, stages = analyze_once(transcript, language)
+        return time.perf_counter() - started, success, stages
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(task, transcripts))
+    wall = time.perf_counter() - started
+
+    stage_times: Dict[str, List[float]] = {}
+    for _, _, stages in outcomes:
+        for stage, seconds in stages.items():
+            stage_times.setdefault(stage, []).append(seconds)
+    failures = sum(1 for _, success, _ in outcomes if not success)
+    latencies = [elapsed for elapsed, _, _ in outcomes]
+    return {
+        "requests": len(transcripts),
+        "failures": failures,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(len(transcripts) / wall, 2) if wall else None,
+        "latency": summarize_latencies(latencies),
+        "stages_p50_ms": {
+            stage: summarize_latencies(values)["p50_ms"] for stage, values in stage_times.items()
+        },
+    }
+
+def run_export_scenario(transcripts: List[str], language: str, concurrency: int,
+                        base_url: str, requests_per_second: float) -> Dict[str, Any]:
+    """
+    Export one analyzed history item per transcript with NotionIntegration.export_history.
+
+    Latency is measured per page upsert (each export attempt); the retries and
+    rate limiting of export_history show up in the throughput.
+    """
+    result = call_openai_api(build_prompt(transcripts[0], language), BENCHMARK_API_KEY, model=DEFAULT_MODEL)
+    items = [
+        {"title": f"Meeting {i}", "timestamp": "2026-01-01 10:00", "chat_input": transcript,
+         "analysis_result": result, "parsed": parse_analysis(result)}
+        for i, transcript in enumerate(transcripts)
+    ]
+    integration = NotionIntegration("secret-benchmark", BENCHMARK_DATABASE_ID, base_url=base_url)
+    latencies: List[float] = []
+    upsert = integration.upsert_page_with_analysis
+
+    def timed_upsert(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return upsert(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    integration.upsert_page_with_analysis = timed_upsert
+    started = time.perf_counter()
+    get_notion_rate_limiter().sync(limit_per_minute=requests_per_second * 60)
+    results = integration.export_history(items, max_workers=concurrency)
+    wall = time.perf_counter() - started
+    return {
+        "requests": len(items),
+        "failures": sum(1 for item in results if not item.get("success")),
+        "attempts": sum(item.get("attempts", 1) for item in results),
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(len(items) / wall, 2) if wall else None,
+        "latency": summarize_latencies(latencies),
+    }
+
+def measure(run: Callable[[List[str]], Dict[str, Any]], timed: List[str],
+            sample: List[str]) -> Dict[str, Any]:
+    """
+    Run a scenario on the timed transcripts and report the process's peak RSS,
+    then run it again on the sample transcripts under tracemalloc to measure
+    the memory allocated (skipped when sample is empty).
+    """
+    result = run(timed)
+    result["peak_rss_mb"] = peak_rss_mb()
+    if sample:
+        tracemalloc.start()
+        try:
+            run(sample)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result["allocations"] = {
+            "sampled_requests": len(sample),
+            "peak_mb": round(peak / (1024 * 1024), 2),
+            "retained_mb": round(current / (1024 * 1024), 2),
+        }
+    return result
+
+# --- 模擬伺服器 ---
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_mock_server(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    """Start mock_server.py in a subprocess, so its work is not counted in the measurements."""
+    port = _free_port()
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py"),
+        "--port", str(port), "--latency-ms", str(args.latency_ms), "--latency-sigma", str(args.latency_sigma),
+        "--rate-limit-rate", str(args.rate_limit_rate), "--error-rate", str(args.error_rate),
+        "--retry-after", str(args.retry_after), "--seed", str(args.seed),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}/v1"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            requests.get(mock_stats_url(base_url), timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("The mock server did not start in time")
+
+def mock_stats_url(base_url: str) -> str:
+    return base_url.rstrip("/").rsplit("/v1", 1)[0] + "/_mock/stats"
+
+# --- 結果比較 ---
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], max_regression: float) -> List[str]:
+    """
+    Print the p50/p95 latency and throughput change of every scenario in both runs.
+
+    Returns:
+        Names of the scenarios whose p95 latency or throughput got worse by more than max_regression
+    """
+    previous = {scenario["name"]: scenario for scenario in baseline.get("scenarios", [])}
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at', '?')}):")
+    print(f"{'scenario':<34}{'p50 ms':>18}{'p95 ms':>18}{'req/s':>16}")
+    for scenario in current["scenarios"]:
+        before = previous.get(scenario["name"])
+        if before is None:
+            continue
+
+        def change(old, new):
+            if not old or new is None:
+                return "n/a", 0.0
+            ratio = (new - old) / old
+            return f"{new:.1f} ({ratio:+.0%})", ratio
+
+        p50, _ = change(before["latency"]["p50_ms"], scenario["latency"]["p50_ms"])
+        p95, p95_ratio = change(before["latency"]["p95_ms"], scenario["latency"]["p95_ms"])
+        throughput, throughput_ratio = change(before["throughput_per_second"], scenario["throughput_per_second"])
+        flag = ""
+        if p95_ratio > max_regression or throughput_ratio < -max_regression:
+            regressions.append(scenario["name"])
+            flag = "  <- regression"
+        print(f"{scenario['name']:<34}{p50:>18}{p95:>18}{throughput:>16}{flag}")
+    return regressions
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the analyze and Notion export paths against the mock server.")
+    parser.add_argument("--flows", default="analyze,export", help="Comma-separated flows to run: analyze, export")
+    parser.add_argument("--sizes", type=_int_list, default=[2000, 20000, 80000], help="Transcript sizes in characters")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16], help="Concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per scenario")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed requests before each scenario")
+    parser.add_argument("--language", default="中文", choices=["中文", "English"], help="Transcript language")
+    parser.add_argument("--notion-rps", type=float, default=100.0,
+                        help="Notion request rate of the export flow (the app uses 3 against the real API)")
+    parser.add_argument("--no-trace-allocations", action="store_true",
+                        help=f"Skip the {ALLOCATION_SAMPLE_REQUESTS}-request tracemalloc pass of each scenario")
+    parser.add_argument("--base-url", help="Use an already running mock server instead of starting one")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Median mock server latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="Log-normal spread of the mock latency")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of mock responses that are 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock responses that are 5xx")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds of injected 429s")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the transcripts and the mock server")
+    parser.add_argument("--output", help=f"Result JSON file (default: {DEFAULT_RESULTS_DIR}/benchmark-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier result JSON file to compare with")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="Exit with status 1 if p95 latency or throughput worsens by more than this fraction")
+    args = parser.parse_args(argv)
+
+    flows = [flow.strip() for flow in args.flows.split(",") if flow.strip()]
+    unknown = set(flows) - {"analyze", "export"}
+    if unknown:
+        parser.error(f"Unknown flows: {', '.join(sorted(unknown))}")
+
+    process = None
+    try:
+        if args.base_url:
+            base_url = args.base_url.rstrip("/")
+        else:
+            process, base_url = start_mock_server(args)
+        set_openai_base_url(base_url)
+        print(f"Mock server: {base_url}")
+        print(f"Benchmark data: {BENCHMARK_DATA_DIR}")
+
+        scenarios = []
+        seed = args.seed
+        for flow in flows:
+            for size in args.sizes:
+                for concurrency in args.concurrency:
+                    name = f"{flow}/{size}chars/c{concurrency}"
+                    samples = 0 if args.no_trace_allocations else ALLOCATION_SAMPLE_REQUESTS
+                    transcripts = []
+                    for _ in range(args.warmup + args.requests + samples):
+                        seed += 1
+                        transcripts.append(generate_transcript(size, args.language, seed))
+                    warmup = transcripts[:args.warmup]
+                    timed = transcripts[args.warmup:args.warmup + args.requests]
+                    sample = transcripts[args.warmup + args.requests:]
+
+                    if flow == "analyze":
+                        for transcript in warmup:
+                            analyze_once(transcript, args.language)
+                        run = lambda batch: run_analyze_scenario(batch, args.language, concurrency)
+                    else:
+                        if warmup:
+                            run_export_scenario(warmup, args.language, 1, base_url, args.notion_rps)
+                        run = lambda batch: run_export_scenario(batch, args.language, concurrency,
+                                                                base_url, args.notion_rps)
+
+                    result = measure(run, timed, sample)
+                    scenarios.append({"name": name, "flow": flow, "size_chars": size,
+                                      "concurrency": concurrency, **result})
+                    latency = result["latency"]
+                    print(
+                        f"{name:<34} p50 {latency['p50_ms']}ms  p95 {latency['p95_ms']}ms  "
+                        f"p99 {latency['p99_ms']}ms  {result['throughput_per_second']} req/s  "
+                        f"failures {result['failures']}  peak RSS {result['peak_rss_mb']} MB"
+                    )
+
+        try:
+            server_stats = requests.get(mock_stats_url(base_url), timeout=5).json()
+        except (requests.RequestException, ValueError):
+            server_stats = None
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(BENCHMARK_DATA_DIR, ignore_errors=True)
+
+    commit = git_commit()
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    report = {
+        "commit": commit,
+        "created_at": created_at.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "server_stats": server_stats,
+        "scenarios": scenarios,
+    }
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"benchmark-{commit or 'unknown'}-{created_at.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} scenario(s) regressed by more than {args.max_regression:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from analysis_parser import parse_analysis
+from openai_api import create_embeddings
+
+logger = logging.getLogger(__name__)
+
+# 向量索引設定，可透過環境變數覆寫
+DEFAULT_EMBEDDING_DIR = os.getenv("EMBEDDING_INDEX_DIR", os.path.join(".cache", "embeddings"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_MAX_CHARS = 6000  # 約 8k token 的輸入上限內（中文每字約 1.2 token）
+INITIAL_CAPACITY = 1024
+
+def build_embedding_text(item: Dict[str, str]) -> str:
+    """Build the text embedded for a history item: title, summary and to-do items, then the transcript."""
+    parsed = item.get("parsed") or parse_analysis(item.get("analysis_result"))
+    parts = [item.get("title", ""), parsed.summary, parsed.todo_list, item.get("chat_input", "")]
+    text = "\n".join(part for part in parts if part)
+    return text[:EMBEDDING_MAX_CHARS]
+
+def embedding_key(text: str, model: str = EMBEDDING_MODEL) -> str:
+    """Cache key of an embedding: the model and the exact text embedded."""
+    return hashlib.sha256(json.dumps([model, text], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class EmbeddingIndex:
+    """
+    Local vector index of history items for semantic search.
+
+    Vectors are L2-normalized and stored as float16 rows of a memory-mapped
+    NumPy file, so cosine similarity is a single matrix-vector product and the
+    index costs 3 KB per item for text-embedding-3-small. A SQLite table maps
+    content hashes to rows, so identical text is never embedded twice, and
+    another maps history item IDs to rows.
+    """
+
+    def __init__(self, directory: str = DEFAULT_EMBEDDING_DIR, model: str = EMBEDDING_MODEL):
+        """
+        Initialize the index.
+
+        Args:
+            directory: Directory holding the vector file and its SQLite id map
+            model: Embedding model; each model gets its own vector file
+        """
+        self.model = model
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        safe_model = "".join(c if c.isalnum() or c in "-_." else "_" for c in model)
+        self.vectors_path = os.path.join(directory, f"{safe_model}.f16")
+        self.db_path = os.path.join(directory, f"{safe_model}.sqlite3")
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.memmap] = None
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS vectors (
+                    content_key TEXT PRIMARY KEY,
+                    row INTEGER NOT NULL UNIQUE
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS item_vectors (
+                    user_id TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    row INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, item_id)
+                )
+                """
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        self.dimensions = int(meta["dimensions"]) if "dimensions" in meta else None
+        if self.dimensions and os.path.exists(self.vectors_path):
+            self._open_vectors()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _open_vectors(self, min_rows: int = 0) -> None:
+        """Map the vector file, growing it (doubling) to hold at least min_rows rows."""
+        row_bytes = self.dimensions * 2
+        current_rows = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        capacity = max(current_rows, INITIAL_CAPACITY)
+        while capacity < min_rows:
+            capacity *= 2
+        if capacity != current_rows:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        if self._vectors is None or len(self._vectors) != capacity:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self.dimensions))
+
+    def _next_row(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT MAX(row) FROM vectors").fetchone()[0]
+        return 0 if row is None else row + 1
+
+    def embed(self, texts: List[str], api_key: str) -> Tuple[List[Optional[int]], Optional[str]]:
+        """
+        Get the vector rows of texts, embedding only those not seen before.
+
+        Missing texts are sent to the API in batches of EMBEDDING_BATCH_SIZE.
+
+        Returns:
+            (rows, error): the row of each text (None if embedding failed) and the
+            first error message, if any
+        """
+        keys = [embedding_key(text, self.model) for text in texts]
+        with closing(self._connect()) as conn:
+            known = dict(conn.execute(
+                f"SELECT content_key, row FROM vectors WHERE content_key IN ({','.join('?' for _ in keys)})",
+                keys
+            ).fetchall()) if keys else {}
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in known and key not in missing:
+                missing[key] = text
+
+        error = None
+        pending = list(missing.items())
+        for start in range(0, len(pending), EMBEDDING_BATCH_SIZE):
+            batch = pending[start:start + EMBEDDING_BATCH_SIZE]
+            embeddings = create_embeddings([text for _, text in batch], api_key, model=self.model)
+            if isinstance(embeddings, str):
+                error = error or embeddings
+                logger.warning("Embedding request failed: %s", embeddings)
+                continue
+            known.update(self._store(list(zip((key for key, _ in batch), embeddings))))
+
+        return [known.get(key) for key in keys], error
+
+    def _store(self, embedded: List[Tuple[str, List[float]]]) -> Dict[str, int]:
+        """
+        Normalize and append vectors, returning the row of each content key.
+
+        Another thread may have stored the same text while this one waited for the
+        API, so keys are checked again under the lock and existing rows are reused.
+        """
+        with self._lock, closing(self._connect()) as conn, conn:
+            keys = [key for key, _ in embedded]
+            rows = dict(conn.execute(
+                f"SELECT content_key, row FROM vectors WHERE content_key IN ({','.join('?' for _ in keys)})",
+                keys
+            ).fetchall())
+            embedded = [(key, vector) for key, vector in embedded if key not in rows]
+            if not embedded:
+                return rows
+
+            matrix = np.asarray([vector for _, vector in embedded], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.maximum(norms, 1e-12)
+
+            if self.dimensions is None:
+                self.dimensions = matrix.shape[1]
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dimensions', ?)", (str(self.dimensions),))
+            first_row = self._next_row(conn)
+            self._open_vectors(first_row + len(embedded))
+            self._vectors[first_row:first_row + len(embedded)] = matrix.astype(np.float16)
+            self._vectors.flush()
+            for offset, (key, _) in enumerate(embedded):
+                conn.execute("INSERT INTO vectors (content_key, row) VALUES (?, ?)", (key, first_row + offset))
+                rows[key] = first_row + offset
+        return rows
+
+    def missing_item_ids(self, user_id: str, item_ids: Iterable[int]) -> List[int]:
+        """Get the IDs among item_ids that have no vector yet."""
+        item_ids = list(item_ids)
+        if not item_ids:
+            return []
+        with closing(self._connect()) as conn:
+            indexed = {row[0] for row in conn.execute(
+                f"SELECT item_id FROM item_vectors WHERE user_id = ? AND item_id IN ({','.join('?' for _ in item_ids)})",
+                [user_id] + item_ids
+            )}
+        return [item_id for item_id in item_ids if item_id not in indexed]
+
+    def index_items(self, user_id: str, items: List[Dict[str, str]], api_key: str) -> Optional[str]:
+        """
+        Embed history items (full items with id, title, chat_input and analysis_result).
+
+        Returns:
+            An error message if some items could not be embedded, else None
+        """
+        if not items:
+            return None
+        rows, error = self.embed([build_embedding_text(item) for item in items], api_key)
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO item_vectors (user_id, item_id, row) VALUES (?, ?, ?)",
+                [(user_id, item["id"], row) for item, row in zip(items, rows) if row is not None]
+            )
+        return error
+
+    def index_history(self, store, user_id: str, api_key: str, page_size: int = 500) -> Optional[str]:
+        """
+        Embed every item of a user's history that has no vector yet.
+
+        Args:
+            store: HistoryStore to read the items from
+
+        Returns:
+            An error message if some items could not be embedded, else None
+        """
+        error = None
+        offset = 0
+        while True:
+            page = store.list(user_id, limit=page_size, offset=offset)
+            if not page:
+                return error
+            missing = self.missing_item_ids(user_id, (item["id"] for item in page))
+            items = [store.get(user_id, item_id) for item_id in missing]
+            error = self.index_items(user_id, [item for item in items if item], api_key) or error
+            offset += page_size
+
+    def remove_items(self, user_id: str, item_ids: Iterable[int]) -> None:
+        """Forget the vectors of deleted history items (the cached embeddings are kept)."""
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "DELETE FROM item_vectors WHERE user_id = ? AND item_id = ?",
+                [(user_id, item_id) for item_id in item_ids]
+            )
+
+    def search(self, user_id: str, query: str, api_key: str, top_k: int = 10) -> Tuple[List[Tuple[int, float]], Optional[str]]:
+        """
+        Find the history items most similar in meaning to the query.
+
+        Returns:
+            (results, error): (item ID, cosine similarity) pairs, most similar first,
+            and an error message if the query could not be embedded
+        """
+        rows, error = self.embed([query], api_key)
+        if rows[0] is None:
+            return [], error
+
+        with closing(self._connect()) as conn:
+            pairs = conn.execute("SELECT item_id, row FROM item_vectors WHERE user_id = ?", (user_id,)).fetchall()
+        if not pairs:
+            return [], None
+
+        item_ids = np.fromiter((pair[0] for pair in pairs), dtype=np.int64, count=len(pairs))
+        item_rows = np.fromiter((pair[1] for pair in pairs), dtype=np.int64, count=len(pairs))
+        with self._lock:
+            query_vector = np.asarray(self._vectors[rows[0]], dtype=np.float32)
+            scores = np.asarray(self._vectors[item_rows], dtype=np.float32) @ query_vector
+
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(item_ids[i]), float(scores[i])) for i in best], None
+
+_index: Optional[EmbeddingIndex] = None
+_index_lock = threading.Lock()
+
+def get_embedding_index() -> EmbeddingIndex:
+    """Get the shared embedding index for this process."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = EmbeddingIndex()
+    return _index
@@ -0,0 +1,409 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import datetime
+import threading
+from abc import ABC, abstractmethod
+from contextlib import closing
+from typing import Any, Dict, Iterator, List, Optional
+
+from analysis_cache import normalize_transcript
+from analysis_parser import ParsedAnalysis, parse_analysis
+from text_search import build_match_query, highlight_snippet, split_terms, tokenize_for_index
+
+# 歷史紀錄設定，可透過環境變數覆寫
+DEFAULT_HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "sqlite")
+DEFAULT_HISTORY_PATH = os.getenv("HISTORY_DB_PATH", os.path.join(".cache", "history.sqlite3"))
+DEFAULT_MAX_ITEMS_PER_USER = int(os.getenv("HISTORY_MAX_ITEMS_PER_USER", "50000"))
+DEFAULT_MAX_AGE_DAYS = int(os.getenv("HISTORY_MAX_AGE_DAYS", "0"))  # 0 表示不依時間刪除
+
+HISTORY_PAGE_SIZE = 10
+SEARCH_RESULT_LIMIT = 20
+FTS_INDEX_VERSION = 1  # 分詞規則改變時遞增，既有的全文索引會重建
+
+def transcript_hash(transcript: str) -> str:
+    """Hash a transcript after normalization, so identical meetings share a hash."""
+    return hashlib.sha256(normalize_transcript(transcript).encode("utf-8")).hexdigest()
+
+def _search_fields(transcript: str, result: str) -> Dict[str, str]:
+    """Split an analysis into the fields indexed for full-text search."""
+    parsed = parse_analysis(result)
+    return {
+        "transcript": transcript or "",
+        "summary": parsed.summary or result or "",
+        "todos": parsed.todo_list,
+    }
+
+def _add_snippet(item: Dict[str, Any], fields: Dict[str, str], query: str) -> Dict[str, Any]:
+    """Attach a highlighted snippet from the first field matching the query."""
+    item["snippet"] = ""
+    for name in ("summary", "todos", "transcript"):
+        snippet = highlight_snippet(fields[name], query)
+        if snippet:
+            item["snippet"] = snippet
+            break
+    return item
+
+def _to_history_item(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a stored row into the history item shape used by the UI."""
+    local_tz = datetime.datetime.now().astimezone().tzinfo
+    created = datetime.datetime.fromtimestamp(row["created_at"], local_tz)
+    item = {
+        "id": row["id"],
+        "title": row["title"],
+        "timestamp": created.strftime("%Y-%m-%d"),
+        "datetime_obj": created,
+        "language": row["language"],
+        "content_hash": row["content_hash"],
+    }
+    if "transcript" in row:
+        item["chat_input"] = row["transcript"]
+        item["analysis_result"] = row["result"]
+        # 解析結果隨項目保存，讀取時不需重新解析
+        parsed = row.get("parsed")
+        if isinstance(parsed, str):
+            parsed = ParsedAnalysis.from_dict(json.loads(parsed))
+        item["parsed"] = parsed or parse_analysis(row["result"])
+    return item
+
+class HistoryStore(ABC):
+    """
+    Interface of a usage history backend.
+
+    Listing methods return lightweight items (id, title, timestamp, ...) without
+    the transcript and result; use get() to load a full item.
+    """
+
+    @abstractmethod
+    def add(self, user_id: str, title: str, language: str, transcript: str, result: str) -> int:
+        """Store an analysis and return its ID."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, user_id: str, item_id: int) -> Optional[Dict[str, Any]]:
+        """Get a full history item including chat_input, analysis_result and its parsed structure."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self, user_id: str, limit: int = HISTORY_PAGE_SIZE, offset: int = 0) -> List[Dict[str, Any]]:
+        """Get a page of history items, newest first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, user_id: str) -> int:
+        """Count the history items of a user."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, user_id: str, item_id: int) -> None:
+        """Delete a history item."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def apply_retention(self, user_id: str) -> List[int]:
+        """Delete items beyond the retention policy and return the IDs of the deleted items."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, user_id: str, query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Search transcripts, summaries and to-do items.
+
+        Returns:
+            Lightweight items ranked by relevance, each with a "snippet" where
+            matched terms are marked in bold Markdown
+        """
+        raise NotImplementedError
+
+    def iter_items(self, user_id: str, batch_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """Iterate over the full items of a user, newest first, loading them in batches."""
+        offset = 0
+        while True:
+            page = self.list(user_id, limit=batch_size, offset=offset)
+            if not page:
+                return
+            for item in page:
+                full = self.get(user_id, item["id"])
+                if full:
+                    yield full
+            offset += batch_size
+
+class SQLiteHistoryStore(HistoryStore):
+    """
+    History backend storing analyses in an indexed SQLite table.
+
+    Items are indexed by (user_id, created_at) for paginated listing and by
+    (user_id, content_hash) for lookups of the same transcript.
+    """
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH,
+                 max_items_per_user: int = DEFAULT_MAX_ITEMS_PER_USER,
+                 max_age_days: int = DEFAULT_MAX_AGE_DAYS):
+        """
+        Initialize the store.
+
+        Args:
+            path: SQLite file holding the history
+            max_items_per_user: Oldest items beyond this count are deleted
+            max_age_days: Items older than this are deleted (0 keeps them forever)
+        """
+        self.path = path
+        self.max_items_per_user = max_items_per_user
+        self.max_age_days = max_age_days
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    language TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    transcript TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    parsed TEXT
+                )
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(history)")}
+            if "parsed" not in columns:
+                conn.execute("ALTER TABLE history ADD COLUMN parsed TEXT")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_history_user_created ON history (user_id, created_at DESC)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_history_user_hash ON history (user_id, content_hash)"
+            )
+            # 全文檢索索引，rowid 對應 history.id，內容為預先切好的 CJK bigram
+            conn.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                    transcript, summary, todos, tokenize = 'unicode61 remove_diacritics 2'
+                )
+                """
+            )
+            if conn.execute("PRAGMA user_version").fetchone()[0] < FTS_INDEX_VERSION:
+                conn.execute("DELETE FROM history_fts")
+                conn.execute(f"PRAGMA user_version = {FTS_INDEX_VERSION}")
+            self._index_missing(conn)
+
+    def _index_missing(self, conn: sqlite3.Connection) -> None:
+        """Index history rows stored before full-text search existed."""
+        rows = conn.execute(
+            "SELECT id, transcript, result FROM history WHERE id NOT IN (SELECT rowid FROM history_fts)"
+        ).fetchall()
+        for row in rows:
+            self._index_row(conn, row["id"], row["transcript"], row["result"])
+
+    @staticmethod
+    def _index_row(conn: sqlite3.Connection, item_id: int, transcript: str, result: str) -> None:
+        fields = _search_fields(transcript, result)
+        conn.execute(
+            "INSERT INTO history_fts (rowid, transcript, summary, todos) VALUES (?, ?, ?, ?)",
+            (item_id, tokenize_for_index(fields["transcript"]),
+             tokenize_for_index(fields["summary"]), tokenize_for_index(fields["todos"]))
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add(self, user_id: str, title: str, language: str, transcript: str, result: str) -> int:
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO history (user_id, title, created_at, language, content_hash, transcript, result, parsed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (user_id, title, time.time(), language, transcript_hash(transcript), transcript, result,
+                 json.dumps(parse_analysis(result).to_dict(), ensure_ascii=False))
+            )
+            self._index_row(conn, cursor.lastrowid, transcript, result)
+            return cursor.lastrowid
+
+    def get(self, user_id: str, item_id: int) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM history WHERE user_id = ? AND id = ?", (user_id, item_id)
+            ).fetchone()
+        return _to_history_item(dict(row)) if row else None
+
+    def list(self, user_id: str, limit: int = HISTORY_PAGE_SIZE, offset: int = 0) -> List[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                """
+                SELECT id, title, created_at, language, content_hash FROM history
+                WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?
+                """,
+                (user_id, limit, offset)
+            ).fetchall()
+        return [_to_history_item(dict(row)) for row in rows]
+
+    def count(self, user_id: str) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM history WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def delete(self, user_id: str, item_id: int) -> None:
+        with closing(self._connect()) as conn, conn:
+            deleted = conn.execute("DELETE FROM history WHERE user_id = ? AND id = ?", (user_id, item_id)).rowcount
+            if deleted:
+                conn.execute("DELETE FROM history_fts WHERE rowid = ?", (item_id,))
+
+    def apply_retention(self, user_id: str) -> List[int]:
+        conditions = []
+        params: List[Any] = []
+        if self.max_age_days > 0:
+            conditions.append("created_at < ?")
+            params.append(time.time() - self.max_age_days * 86400)
+        if self.max_items_per_user > 0:
+            conditions.append(
+                "id NOT IN (SELECT id FROM history WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?)"
+            )
+            params.extend([user_id, self.max_items_per_user])
+        if not conditions:
+            return []
+        with closing(self._connect()) as conn, conn:
+            deleted = [row[0] for row in conn.execute(
+                f"SELECT id FROM history WHERE user_id = ? AND ({' OR '.join(conditions)})",
+                [user_id] + params
+            )]
+            conn.executemany("DELETE FROM history WHERE id = ?", [(item_id,) for item_id in deleted])
+            conn.executemany("DELETE FROM history_fts WHERE rowid = ?", [(item_id,) for item_id in deleted])
+        return deleted
+
+    def search(self, user_id: str, query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[Dict[str, Any]]:
+        match = build_match_query(query)
+        if not match:
+            return []
+        # 摘要與待辦的命中權重高於逐字稿
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                """
+                SELECT h.id, h.title, h.created_at, h.language, h.content_hash, h.transcript AS body, h.result
+                FROM history_fts JOIN history h ON h.id = history_fts.rowid
+                WHERE history_fts MATCH ? AND h.user_id = ?
+                ORDER BY bm25(history_fts, 1.0, 4.0, 2.0) LIMIT ?
+                """,
+                (match, user_id, limit)
+            ).fetchall()
+        results = []
+        for row in rows:
+            row = dict(row)
+            fields = _search_fields(row.pop("body"), row.pop("result"))
+            results.append(_add_snippet(_to_history_item(row), fields, query))
+        return results
+
+class MemoryHistoryStore(HistoryStore):
+    """History backend kept in process memory, lost on restart (for development and tests)."""
+
+    def __init__(self, max_items_per_user: int = DEFAULT_MAX_ITEMS_PER_USER):
+        self.max_items_per_user = max_items_per_user
+        self._rows: Dict[str, List[Dict[str, Any]]] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def add(self, user_id: str, title: str, language: str, transcript: str, result: str) -> int:
+        with self._lock:
+            item_id = self._next_id
+            self._next_id += 1
+            self._rows.setdefault(user_id, []).insert(0, {
+                "id": item_id, "title": title, "created_at": time.time(), "language": language,
+                "content_hash": transcript_hash(transcript), "transcript": transcript, "result": result,
+                "parsed": parse_analysis(result),
+            })
+            return item_id
+
+    def get(self, user_id: str, item_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for row in self._rows.get(user_id, []):
+                if row["id"] == item_id:
+                    return _to_history_item(row)
+        return None
+
+    def list(self, user_id: str, limit: int = HISTORY_PAGE_SIZE, offset: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._rows.get(user_id, [])[offset:offset + limit]
+            return [
+                _to_history_item({k: v for k, v in row.items() if k not in ("transcript", "result", "parsed")})
+                for row in rows
+            ]
+
+    def count(self, user_id: str) -> int:
+        with self._lock:
+            return len(self._rows.get(user_id, []))
+
+    def delete(self, user_id: str, item_id: int) -> None:
+        with self._lock:
+            self._rows[user_id] = [row for row in self._rows.get(user_id, []) if row["id"] != item_id]
+
+    def apply_retention(self, user_id: str) -> List[int]:
+        with self._lock:
+            rows = self._rows.get(user_id, [])
+            self._rows[user_id] = rows[:self.max_items_per_user]
+            return [row["id"] for row in rows[self.max_items_per_user:]]
+
+    def search(self, user_id: str, query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[Dict[str, Any]]:
+        terms = split_terms(query)
+        if not terms:
+            return []
+        with self._lock:
+            rows = list(self._rows.get(user_id, []))
+        scored = []
+        for row in rows:
+            fields = _search_fields(row["transcript"], row["result"])
+            text = " ".join(fields.values()).lower()
+            if all(term in text for term in terms):
+                score = sum(text.count(term) for term in terms)
+                light = {k: v for k, v in row.items() if k not in ("transcript", "result", "parsed")}
+                scored.append((score, _add_snippet(_to_history_item(light), fields, query)))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [item for _, item in scored[:limit]]
+
+class UserHistory:
+    """
+    The history of one user, sized and iterated lazily.
+
+    len() runs a COUNT query and iteration loads full items in batches, so it can
+    be handed to code expecting a list (such as the Notion bulk export) without
+    loading every analysis up front.
+    """
+
+    def __init__(self, store: HistoryStore, user_id: str):
+        self.store = store
+        self.user_id = user_id
+
+    def __len__(self) -> int:
+        return self.store.count(self.user_id)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.store.iter_items(self.user_id)
+
+HISTORY_BACKENDS = {
+    "sqlite": SQLiteHistoryStore,
+    "memory": MemoryHistoryStore,
+}
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+def get_history_store() -> HistoryStore:
+    """Get the shared history store for this process, using the configured backend."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = HISTORY_BACKENDS.get(DEFAULT_HISTORY_BACKEND)
+                if backend is None:
+                    raise ValueError(f"Unknown history backend: {DEFAULT_HISTORY_BACKEND}")
+                _store = backend()
+    return _store
@@ -0,0 +1,111 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+# 連線設定，可透過環境變數覆寫
+DEFAULT_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+DEFAULT_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+DEFAULT_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+
+class HttpClient:
+    """
+    A process-wide pool of keep-alive HTTP sessions, one per upstream host.
+
+    Reusing a session keeps TCP/TLS connections open between calls, so only the
+    first request to OpenAI or Notion pays the handshake. Every request gets a
+    (connect, read) timeout so a hung upstream cannot block a worker forever.
+    """
+
+    def __init__(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 pool_size: int = DEFAULT_POOL_SIZE):
+        """
+        Initialize the client.
+
+        Args:
+            connect_timeout: Seconds to wait for a connection to be established
+            read_timeout: Seconds to wait between bytes received from the server
+            pool_size: Maximum number of kept-alive connections per host
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """The default (connect, read) timeout passed to requests."""
+        return (self.connect_timeout, self.read_timeout)
+
+    def get_session(self, url: str) -> requests.Session:
+        """Get the pooled session for the host of the given URL, creating it on first use."""
+        parts = urlsplit(url)
+        host_key = f"{parts.scheme}://{parts.netloc}"
+
+        session = self._sessions.get(host_key)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(host_key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size,
+                    pool_block=False
+                )
+                session.mount(host_key, adapter)
+                self._sessions[host_key] = session
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the pooled session for the URL's host."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.get_session(url).request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self) -> None:
+        """Close all pooled sessions and their connections."""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+def get_http_client() -> HttpClient:
+    """Get the shared HTTP client for this process."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+def configure_http_client(connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                          read_timeout: float = DEFAULT_READ_TIMEOUT,
+                          pool_size: int = DEFAULT_POOL_SIZE) -> HttpClient:
+    """Replace the shared HTTP client with one using the given timeouts and pool size."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = HttpClient(connect_timeout, read_timeout, pool_size)
+    return _client
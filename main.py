@@ -1,11 +1,17 @@
 import streamlit as st
 import os
-import requests
-import json
-import time
 import datetime
 import pytz
+import uuid
+from analysis_pipeline import (
+    DEFAULT_OUTPUT_MODE, OUTPUT_MODE_JSON, OUTPUT_MODE_MARKDOWN,
+    ProgressReporter, run_analysis, run_incremental_analysis
+)
+from embedding_index import get_embedding_index
+from history_store import HISTORY_PAGE_SIZE, UserHistory, get_history_store
+from near_duplicate import get_near_duplicate_index
 from notion_component import render_notion_section
+from transcript_ingest import SUPPORTED_EXTENSIONS, load_transcript
 from utils import extract_summary_title
 
 # 獲取本地時區
@@ -39,6 +45,11 @@ ui_text = {
         "feedback_caption": "點擊上方按鈕，在 Google 表單中提供您的寶貴意見",
         "language_selector": "選擇語言",
         "input_label": "請貼上你的對話紀錄",
+        "upload_label": "或上傳對話檔案",
+        "upload_help": "支援 txt、md、srt、vtt、docx；檔案在伺服器端解析為含時間戳記的發言，不會放進文字框",
+        "upload_loaded": "📄 已載入 {name}：{turns} 段發言、{speakers} 位說話者、{chars} 字。移除檔案即可改用文字框輸入。",
+        "upload_preview": "預覽前幾段發言",
+        "upload_error": "⚠️ 無法讀取檔案：{error}",
         "examples_header": "範例對話",
         "examples_selector": "選擇一個範例",
         "paste_example": "一鍵貼上範例",
@@ -72,16 +83,54 @@ ui_text = {
         "notion_api_key_help": "您可以從 https://www.notion.so/my-integrations 獲取 API key",
         "notion_database_id_help": "您想要保存分析結果的資料庫 ID",
         "notion_setup_instructions": "如何設置 Notion 集成",
+        "notion_send_queued": "✅ 已加入匯出佇列，將在背景發送到 Notion",
+        "notion_outbox_header": "最近的匯出",
+        "notion_outbox_queued": "⏳ 排隊中",
+        "notion_outbox_sending": "📤 發送中",
+        "notion_outbox_refresh": "重新整理狀態",
+        "notion_outbox_retry": "重試失敗項目",
+        "notion_bulk_export_button": "匯出全部歷史紀錄到 Notion（{count}）",
+        "notion_bulk_retry_button": "重試失敗的匯出（{count}）",
+        "notion_bulk_progress": "正在匯出到 Notion（{done} / {total}）...",
+        "notion_bulk_success": "✅ 已將 {count} 筆分析匯出到 Notion",
+        "notion_bulk_partial": "⚠️ 成功 {succeeded} 筆，失敗 {failed} 筆",
+        "near_duplicate_found": "這段對話與先前的分析「{title}」（{timestamp}）相似度達 {similarity}%，可直接沿用結果，不需再次調用 API。",
+        "near_duplicate_reuse": "沿用先前結果",
+        "near_duplicate_update": "只分析變動部分",
+        "near_duplicate_reanalyze": "重新分析",
         "usage_history_header": "使用歷史",
         "usage_history_empty": "尚無使用歷史",
         "usage_history_item": "{title}",
         "usage_history_restore": "恢復此分析",
         "usage_history_toggle": "切換歷史紀錄",
+        "usage_history_page": "第 {page} / {pages} 頁",
+        "usage_history_search": "搜尋歷史紀錄",
+        "usage_history_search_placeholder": "輸入關鍵字，例如：測試報告",
+        "usage_history_search_empty": "找不到符合的紀錄",
+        "usage_history_semantic": "語意搜尋",
+        "usage_history_semantic_help": "以 OpenAI Embeddings 依意思搜尋，例如「關於上線時程的會議」",
+        "usage_history_semantic_error": "部分紀錄無法建立語意索引：{error}",
+        "usage_history_similarity": "相似度 {score:.2f}",
+        "usage_history_link": "🔗 保留歷史連結",
+        "usage_history_link_help": "將歷史識別碼加入網址，之後以此網址開啟即可看到相同的歷史。任何取得此網址的人都能讀取您的分析紀錄，請勿分享。",
         "view_history_button": "📋 查看使用歷史",
         "view_history_tooltip": "查看您的使用歷史記錄",
         "close_history_button": "關閉",
         "reset_button": "🔄 重置頁面",
-        "reset_tooltip": "清除所有輸入和結果，重新開始"
+        "reset_tooltip": "清除所有輸入和結果，重新開始",
+        "progress_prompt": "正在準備提示詞...",
+        "progress_request": "正在等待 AI 回應...",
+        "progress_tokens": "正在接收回應（{tokens_received} / ~{tokens_estimated} tokens）...",
+        "progress_chunks": "對話較長，正在分段分析（{chunks_done} / {chunks_total}）...",
+        "progress_parse": "正在解析結果...",
+        "progress_save": "正在保存到歷史紀錄...",
+        "analysis_cached": "⚡ 此結果來自快取，未重新調用 API",
+        "structured_output": "結構化輸出 (JSON)",
+        "structured_output_help": "要求模型以固定欄位的 JSON 回覆（摘要重點、任務、負責人、截止日期、優先順序），再於本地轉為 Markdown，減少輸出 token 與解析錯誤",
+        "analysis_incremental": "🔁 僅分析了變動部分（新增 {lines_added} 行、移除 {lines_removed} 行），並更新了先前的結果",
+        "analysis_tokens": "提示詞 {prompt_tokens} tokens · 輸出上限 {max_tokens} tokens · 模型 {model}",
+        "analysis_compression": "輸入壓縮節省 {saved_tokens} tokens（壓縮前 {original_prompt_tokens} tokens）",
+        "analysis_routing": "自動選擇模型 {model}（目標 {target}，預估 {estimated_seconds:.1f} 秒、約 US${estimated_cost:.4f}）"
     },
     "English": {
         "title": "Context Catcher",
@@ -97,6 +146,11 @@ ui_text = {
         "feedback_caption": "Click the button above to provide your valuable feedback in the Google Form",
         "language_selector": "Select Language",
         "input_label": "Please paste your conversation record",
+        "upload_label": "Or upload a transcript file",
+        "upload_help": "Supports txt, md, srt, vtt and docx; the file is parsed on the server into timestamped turns instead of being put into the text box",
+        "upload_loaded": "📄 Loaded {name}: {turns} turns, {speakers} speakers, {chars} characters. Remove the file to type in the text box again.",
+        "upload_preview": "Preview the first turns",
+        "upload_error": "⚠️ Could not read the file: {error}",
         "examples_header": "Example Conversations",
         "examples_selector": "Select an example",
         "paste_example": "Paste Example",
@@ -130,16 +184,54 @@ ui_text = {
         "notion_api_key_help": "You can get your API key from https://www.notion.so/my-integrations",
         "notion_database_id_help": "The ID of the database where you want to save the analysis",
         "notion_setup_instructions": "How to set up Notion integration",
+        "notion_send_queued": "✅ Added to the export queue, it will be sent to Notion in the background",
+        "notion_outbox_header": "Recent exports",
+        "notion_outbox_queued": "⏳ Queued",
+        "notion_outbox_sending": "📤 Sending",
+        "notion_outbox_refresh": "Refresh status",
+        "notion_outbox_retry": "Retry failed",
+        "notion_bulk_export_button": "Export all history to Notion ({count})",
+        "notion_bulk_retry_button": "Retry failed exports ({count})",
+        "notion_bulk_progress": "Exporting to Notion ({done} / {total})...",
+        "notion_bulk_success": "✅ Exported {count} analyses to Notion",
+        "notion_bulk_partial": "⚠️ {succeeded} exported, {failed} failed",
+        "near_duplicate_found": "This conversation is {similarity}% similar to the earlier analysis \"{title}\" ({timestamp}). You can reuse that result without another API call.",
+        "near_duplicate_reuse": "Reuse earlier result",
+        "near_duplicate_update": "Analyze changes only",
+        "near_duplicate_reanalyze": "Analyze again",
         "usage_history_header": "Usage History",
         "usage_history_empty": "No usage history yet",
         "usage_history_item": "{title}",
         "usage_history_restore": "Restore this analysis",
         "usage_history_toggle": "Toggle history",
+        "usage_history_page": "Page {page} / {pages}",
+        "usage_history_search": "Search history",
+        "usage_history_search_placeholder": "Enter keywords, e.g. test report",
+        "usage_history_search_empty": "No matching analyses found",
+        "usage_history_semantic": "Semantic search",
+        "usage_history_semantic_help": "Search by meaning with OpenAI embeddings, e.g. \"meetings about the launch schedule\"",
+        "usage_history_semantic_error": "Some analyses could not be indexed for semantic search: {error}",
+        "usage_history_similarity": "Similarity {score:.2f}",
+        "usage_history_link": "🔗 Keep history link",
+        "usage_history_link_help": "Adds your history ID to the URL so opening that URL later shows the same history. Anyone with the URL can read your analyses, so do not share it.",
         "view_history_button": "📋 View Usage History",
         "view_history_tooltip": "View your usage history",
         "close_history_button": "Close",
         "reset_button": "🔄 Reset Page",
-        "reset_tooltip": "Clear all inputs and results to start fresh"
+        "reset_tooltip": "Clear all inputs and results to start fresh",
+        "progress_prompt": "Preparing prompt...",
+        "progress_request": "Waiting for AI response...",
+        "progress_tokens": "Receiving response ({tokens_received} / ~{tokens_estimated} tokens)...",
+        "progress_chunks": "Long conversation, analyzing in parts ({chunks_done} / {chunks_total})...",
+        "progress_parse": "Parsing result...",
+        "progress_save": "Saving to history...",
+        "analysis_cached": "⚡ This result was served from cache without calling the API",
+        "structured_output": "Structured output (JSON)",
+        "structured_output_help": "Ask the model for JSON with fixed fields (summary points, tasks, owners, deadlines, priorities) and render the Markdown locally, saving output tokens and avoiding parse errors",
+        "analysis_incremental": "🔁 Only the changes were analyzed ({lines_added} lines added, {lines_removed} removed) to update the previous result",
+        "analysis_tokens": "Prompt {prompt_tokens} tokens · Output budget {max_tokens} tokens · Model {model}",
+        "analysis_compression": "Input compression saved {saved_tokens} tokens ({original_prompt_tokens} tokens before compression)",
+        "analysis_routing": "Model {model} chosen automatically (target {target}, estimated {estimated_seconds:.1f}s, about US${estimated_cost:.4f})"
     }
 }
 
@@ -150,6 +242,18 @@ if "analysis_result" not in st.session_state:
 if "chat_input" not in st.session_state:
     st.session_state["chat_input"] = ""
 
+# An uploaded transcript file, parsed once and kept on the server instead of in the text box
+if "uploaded_transcript" not in st.session_state:
+    st.session_state["uploaded_transcript"] = None
+
+# Changing the uploader's key is the only way to clear the file it holds
+if "upload_widget_version" not in st.session_state:
+    st.session_state["upload_widget_version"] = 0
+
+# The transcript and result of the last analysis, used to analyze later edits incrementally
+if "analysis_source" not in st.session_state:
+    st.session_state["analysis_source"] = None
+
 if "selected_example" not in st.session_state:
     st.session_state["selected_example"] = "團隊會議摘要"  # Default to first example
 
@@ -159,10 +263,22 @@ if "result_displayed" not in st.session_state:
 if "language" not in st.session_state:
     st.session_state["language"] = "中文"  # 默認語言為中文
 
-# Initialize usage history
+# Identify the user. The ?uid= link is the only credential for a history: anyone
+# holding it can read that history, so it is only put into the URL on request
+if "user_id" not in st.session_state:
+    st.session_state["user_id"] = st.query_params.get("uid") or uuid.uuid4().hex
+
+# Initialize usage history (the current page, read through from the history store)
 if "usage_history" not in st.session_state:
     st.session_state["usage_history"] = []
 
+if "history_page" not in st.session_state:
+    st.session_state["history_page"] = 0
+
+# Pages and item count already loaded from the history store in this session
+if "history_cache" not in st.session_state:
+    st.session_state["history_cache"] = {"pages": {}, "count": None}
+
 # Initialize history sidebar state (replaces the old modal state)
 if "show_history_sidebar" not in st.session_state:
     st.session_state["show_history_sidebar"] = False
@@ -429,41 +545,155 @@ st.markdown("""
 def toggle_history_sidebar():
     st.session_state["show_history_sidebar"] = not st.session_state["show_history_sidebar"]
 
-# Function to save current state to history
-def save_to_history(chat_input, analysis_result):
-    if not analysis_result:
+# Function to move between pages of the usage history
+def change_history_page(step):
+    st.session_state["history_page"] = max(0, st.session_state["history_page"] + step)
+
+# Function to get a page of the usage history, cached for this session
+def load_history_page(page):
+    cache = st.session_state["history_cache"]
+    if page not in cache["pages"]:
+        cache["pages"][page] = get_history_store().list(
+            st.session_state["user_id"],
+            limit=HISTORY_PAGE_SIZE,
+            offset=page * HISTORY_PAGE_SIZE
+        )
+    return cache["pages"][page]
+
+# Function to count the usage history, cached for this session
+def count_history():
+    cache = st.session_state["history_cache"]
+    if cache["count"] is None:
+        cache["count"] = get_history_store().count(st.session_state["user_id"])
+    return cache["count"]
+
+# Function to search the usage history by meaning rather than keywords
+def semantic_search_history(query):
+    index = get_embedding_index()
+    store = get_history_store()
+    user_id = st.session_state["user_id"]
+
+    # Embed items saved since the last semantic search (each is only embedded once)
+    error = index.index_history(store, user_id, api_key)
+    matches, query_error = index.search(user_id, query, api_key)
+    if error or query_error:
+        st.warning(current_text["usage_history_semantic_error"].format(error=query_error or error))
+
+    results = []
+    for item_id, score in matches:
+        item = store.get(user_id, item_id)
+        if item:
+            item["snippet"] = current_text["usage_history_similarity"].format(score=score)
+            results.append(item)
+    return results
+
+# Function to look for a prior analysis of a nearly identical transcript
+def find_near_duplicate(chat_input):
+    index = get_near_duplicate_index()
+    store = get_history_store()
+    user_id = st.session_state["user_id"]
+
+    # Fingerprint items saved before near-duplicate detection existed (once per session)
+    if not st.session_state.get("fingerprints_indexed"):
+        index.index_history(store, user_id)
+        st.session_state["fingerprints_indexed"] = True
+
+    # The analysis being edited is updated incrementally instead of offered again
+    source = st.session_state["analysis_source"]
+    source_input = source["chat_input"] if source else None
+
+    for item_id, similarity in index.find(user_id, chat_input):
+        item = store.get(user_id, item_id)
+        if item and item["chat_input"] != source_input:
+            st.session_state["near_duplicate"] = {
+                "item_id": item_id,
+                "title": item["title"],
+                "timestamp": item["timestamp"],
+                "similarity": similarity,
+                "chat_input": chat_input
+            }
+            return st.session_state["near_duplicate"]
+    return None
+
+# Function to show the prior analysis of a near-duplicate transcript instead of analyzing again
+def reuse_near_duplicate():
+    near_duplicate = st.session_state.pop("near_duplicate", None)
+    if not near_duplicate:
         return
+    history_item = get_history_store().get(st.session_state["user_id"], near_duplicate["item_id"])
+    if history_item:
+        st.session_state["analysis_result"] = history_item["analysis_result"]
+        st.session_state["analysis_timestamp"] = history_item["datetime_obj"]
+        st.session_state["result_displayed"] = False
+        st.session_state["analysis_source"] = {
+            "chat_input": history_item["chat_input"],
+            "result": history_item["analysis_result"]
+        }
 
-    # Extract title from the summary
-    title = extract_summary_title(analysis_result)
+# Function to update the prior analysis of a near-duplicate transcript with only the changes
+def request_incremental_update():
+    near_duplicate = st.session_state.pop("near_duplicate", None)
+    if not near_duplicate:
+        return
+    history_item = get_history_store().get(st.session_state["user_id"], near_duplicate["item_id"])
+    if history_item:
+        st.session_state["analysis_source"] = {
+            "chat_input": history_item["chat_input"],
+            "result": history_item["analysis_result"]
+        }
+    st.session_state["reanalyze_requested"] = True
 
-    # Create history item with date only (no time) to avoid timezone issues
-    current_time = get_local_time()
-    formatted_date = current_time.strftime("%Y-%m-%d")  # Only keep the date part
+# Function to analyze again although a near-duplicate analysis exists
+def request_reanalysis():
+    st.session_state.pop("near_duplicate", None)
+    st.session_state["analysis_source"] = None
+    st.session_state["reanalyze_requested"] = True
 
-    history_item = {
-        "title": title,
-        "timestamp": formatted_date,
-        "chat_input": chat_input,
-        "analysis_result": analysis_result,
-        "datetime_obj": current_time  # Still store the full datetime object for future reference if needed
-    }
-
-    # Add to history
-    st.session_state["usage_history"].insert(0, history_item)
+# Function to save current state to history
+def save_to_history(chat_input, analysis_result, title=None):
+    if not analysis_result:
+        return
 
-    # Limit history to 10 items
-    if len(st.session_state["usage_history"]) > 10:
-        st.session_state["usage_history"] = st.session_state["usage_history"][:10]
+    # Extract title from the summary unless the pipeline already did
+    if title is None:
+        title = extract_summary_title(analysis_result)
+
+    store = get_history_store()
+    item_id = store.add(
+        st.session_state["user_id"],
+        title=title,
+        language=st.session_state["language"],
+        transcript=chat_input,
+        result=analysis_result
+    )
+    # Pruned items also lose their fingerprints and vectors
+    pruned = store.apply_retention(st.session_state["user_id"])
+    get_near_duplicate_index().remove_items(st.session_state["user_id"], pruned)
+    get_embedding_index().remove_items(st.session_state["user_id"], pruned)
+    get_near_duplicate_index().add(st.session_state["user_id"], item_id, chat_input)
+    # The item is embedded for semantic search on the next semantic search, not here,
+    # so an embeddings outage or rate limit never delays the analysis
+
+    # New items go first, so every cached page is stale
+    st.session_state["history_cache"] = {"pages": {}, "count": None}
+    st.session_state["history_page"] = 0
+
+# Function to put the history ID into the URL so the history survives browser refreshes
+def keep_history_link():
+    st.query_params["uid"] = st.session_state["user_id"]
+
+# Function to drop the uploaded transcript file and go back to the text box
+def clear_uploaded_transcript():
+    st.session_state["uploaded_transcript"] = None
+    st.session_state["upload_widget_version"] += 1
 
 # Function to restore state from history
-def restore_from_history(index):
-    if index < 0 or index >= len(st.session_state["usage_history"]):
+def restore_from_history(item_id):
+    # Load the full item (the cached pages only hold titles and dates)
+    history_item = get_history_store().get(st.session_state["user_id"], item_id)
+    if history_item is None:
         return
 
-    # Get history item
-    history_item = st.session_state["usage_history"][index]
-
     # Save current state to stack if it has content
     if st.session_state["chat_input"] or st.session_state["analysis_result"]:
         current_state = {
@@ -473,44 +703,17 @@ def restore_from_history(index):
         st.session_state["history_stack"].append(current_state)
 
     # Restore state
+    clear_uploaded_transcript()
     st.session_state["chat_input"] = history_item["chat_input"]
     st.session_state["analysis_result"] = history_item["analysis_result"]
+    st.session_state["analysis_source"] = {
+        "chat_input": history_item["chat_input"],
+        "result": history_item["analysis_result"]
+    }
 
     # Rerun to update UI
     st.rerun()
 
-# 直接使用 requests 庫調用 OpenAI API，避免使用 OpenAI 客戶端
-def call_openai_api(prompt, model="gpt-3.5-turbo", temperature=0.3, max_tokens=800):
-    """使用 requests 直接調用 OpenAI API"""
-    if not api_key:
-        return "錯誤: 未找到 API key"
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-
-    payload = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": temperature,
-        "max_tokens": max_tokens
-    }
-
-    try:
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            data=json.dumps(payload)
-        )
-
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
-        else:
-            return f"錯誤: API 返回狀態碼 {response.status_code}，錯誤信息: {response.text}"
-    except Exception as e:
-        return f"錯誤: {str(e)}"
-
 # Define example conversations in both languages
 example_conversations = {
     "中文": {
@@ -638,6 +841,15 @@ with st.sidebar:
         st.error(f"{current_text['api_key_error']} {e}")
         api_key = None
 
+    # 輸出模式：結構化輸出 (JSON) 在本地轉為 Markdown，節省輸出 token
+    structured_output = st.checkbox(
+        current_text["structured_output"],
+        value=DEFAULT_OUTPUT_MODE == OUTPUT_MODE_JSON,
+        key="structured_output",
+        help=current_text["structured_output_help"]
+    )
+    output_mode = OUTPUT_MODE_JSON if structured_output else OUTPUT_MODE_MARKDOWN
+
     st.header(current_text["about_header"])
     st.write(current_text["about_text"])
 
@@ -668,11 +880,46 @@ with st.sidebar:
     if st.session_state["show_history_sidebar"]:
         st.subheader(current_text['usage_history_header'])
 
-        if not st.session_state["usage_history"]:
-            st.info(current_text["usage_history_empty"])
+        # Bookmarkable link to this history, added to the URL only when asked for
+        if st.query_params.get("uid") != st.session_state["user_id"]:
+            st.button(
+                current_text["usage_history_link"],
+                on_click=keep_history_link,
+                help=current_text["usage_history_link_help"],
+                use_container_width=True
+            )
+
+        # Search box over transcripts, summaries and to-do items
+        search_query = st.text_input(
+            current_text["usage_history_search"],
+            key="history_search_query",
+            placeholder=current_text["usage_history_search_placeholder"]
+        ).strip()
+        semantic_search = st.checkbox(
+            current_text["usage_history_semantic"],
+            key="history_semantic_search",
+            help=current_text["usage_history_semantic_help"],
+            disabled=not api_key
+        )
+
+        if search_query and semantic_search and api_key:
+            page_count = 1
+            history_items = semantic_search_history(search_query)
+        elif search_query:
+            page_count = 1
+            history_items = get_history_store().search(st.session_state["user_id"], search_query)
+        else:
+            history_count = count_history()
+            page_count = max(1, -(-history_count // HISTORY_PAGE_SIZE))
+            st.session_state["history_page"] = min(st.session_state["history_page"], page_count - 1)
+            st.session_state["usage_history"] = load_history_page(st.session_state["history_page"])
+            history_items = st.session_state["usage_history"]
+
+        if not history_items:
+            st.info(current_text["usage_history_search_empty"] if search_query else current_text["usage_history_empty"])
         else:
             # Display each history item with a restore button - improved responsive layout
-            for i, item in enumerate(st.session_state["usage_history"]):
+            for i, item in enumerate(history_items):
                 # Use a container with custom CSS class for better responsiveness
                 with st.container():
                     # For larger screens, use columns
@@ -684,15 +931,17 @@ with st.sidebar:
                             <div class="history-timestamp">{item["timestamp"]}</div>
                         </div>
                         """, unsafe_allow_html=True)
+                        if item.get("snippet"):
+                            st.markdown(item["snippet"])
 
                         # Button to restore this history item
                         if st.button(
                             current_text["usage_history_restore"],
-                            key=f"restore_btn_{i}",
+                            key=f"restore_btn_{item['id']}",
                             use_container_width=True,
                             type="primary"
                         ):
-                            restore_from_history(i)
+                            restore_from_history(item["id"])
                     else:
                         # Desktop layout - columns
                         col1, col2 = st.columns([3, 1])
@@ -702,18 +951,45 @@ with st.sidebar:
                             timestamp = item["timestamp"]
                             st.markdown(f"**{title}**")
                             st.caption(f"{timestamp}")
+                            if item.get("snippet"):
+                                st.markdown(item["snippet"])
 
                         with col2:
                             # Button to restore this history item
                             if st.button(
                                 current_text["usage_history_restore"],
-                                key=f"restore_btn_{i}",
+                                key=f"restore_btn_{item['id']}",
                                 use_container_width=True
                             ):
-                                restore_from_history(i)
+                                restore_from_history(item["id"])
 
                 st.markdown("---")
 
+            # Page through older history
+            if page_count > 1:
+                prev_col, page_col, next_col = st.columns([1, 1, 1])
+                with prev_col:
+                    st.button(
+                        "◀",
+                        key="history_prev",
+                        disabled=st.session_state["history_page"] == 0,
+                        on_click=change_history_page,
+                        args=(-1,)
+                    )
+                with page_col:
+                    st.caption(current_text["usage_history_page"].format(
+                        page=st.session_state["history_page"] + 1,
+                        pages=page_count
+                    ))
+                with next_col:
+                    st.button(
+                        "▶",
+                        key="history_next",
+                        disabled=st.session_state["history_page"] >= page_count - 1,
+                        on_click=change_history_page,
+                        args=(1,)
+                    )
+
     # Add reset button - using a form to avoid callback issues
     with st.form(key="reset_form"):
         reset_submitted = st.form_submit_button(
@@ -725,8 +1001,10 @@ with st.sidebar:
         if reset_submitted:
             # Clear input and results
             st.session_state["chat_input"] = ""
+            clear_uploaded_transcript()
             st.session_state["analysis_result"] = None
             st.session_state["result_displayed"] = False
+            st.session_state["analysis_source"] = None
             # Keep usage history and language settings
             st.rerun()
 
@@ -752,14 +1030,39 @@ if "selected_example" not in st.session_state or st.session_state["selected_exam
 # 不再需要單獨的回調函數來更新對話輸入
 
 with col1:
-    # 輸入區域 - 使用會話狀態作為初始值
-    chat_input = st.text_area(current_text["input_label"],
-                              value=st.session_state["chat_input"],  # Use session_state value
-                              height=300,
-                              key="chat_input_area")
+    # 上傳的檔案只解析一次，內容保存在伺服器端，不會放進文字框再傳回瀏覽器
+    uploaded_file = st.file_uploader(
+        current_text["upload_label"],
+        type=list(SUPPORTED_EXTENSIONS),
+        help=current_text["upload_help"],
+        key=f"transcript_upload_{st.session_state['upload_widget_version']}"
+    )
+    uploaded = st.session_state["uploaded_transcript"]
+    if uploaded_file is None:
+        uploaded = None
+    elif uploaded is None or uploaded["file_id"] != uploaded_file.file_id:
+        try:
+            uploaded = load_transcript(uploaded_file, uploaded_file.name)
+            uploaded["file_id"] = uploaded_file.file_id
+        except ValueError as e:
+            uploaded = None
+            st.error(current_text["upload_error"].format(error=e))
+    st.session_state["uploaded_transcript"] = uploaded
+
+    if uploaded:
+        st.info(current_text["upload_loaded"].format(**uploaded))
+        with st.expander(current_text["upload_preview"]):
+            st.text(uploaded["preview"])
+        chat_input = uploaded["transcript"]
+    else:
+        # 輸入區域 - 使用會話狀態作為初始值
+        chat_input = st.text_area(current_text["input_label"],
+                                  value=st.session_state["chat_input"],  # Use session_state value
+                                  height=300,
+                                  key="chat_input_area")
 
-    # Update session state after the widget is rendered
-    st.session_state["chat_input"] = chat_input
+        # Update session state after the widget is rendered
+        st.session_state["chat_input"] = chat_input
 
 with col2:
     st.subheader(current_text["examples_header"])
@@ -781,6 +1084,7 @@ with col2:
         if paste_submitted:
             # 更新會話狀態中的聊天輸入值，而不是直接更新文本區域
             st.session_state["chat_input"] = current_examples[st.session_state["selected_example"]]
+            clear_uploaded_transcript()
             # 顯示成功訊息並重新運行
             st.success(current_text["paste_success"])
             st.rerun()
@@ -801,132 +1105,123 @@ with col_history:
 
 # Session state variables are already initialized at the top of the script
 
-if analyze_button:
+reanalyze_requested = st.session_state.pop("reanalyze_requested", False)
+
+if analyze_button or reanalyze_requested:
+    st.session_state.pop("near_duplicate", None)
+
     # 檢查 API key 是否可用
     if not api_key:
         st.error(f"⚠️ {current_text['api_key_not_found']}")
     # 檢查輸入是否為空
     elif not chat_input.strip():
         st.warning(current_text["input_empty"])
-    else:
-        # 確保 session_state 中有最新的輸入值
-        st.session_state["chat_input"] = chat_input
-
+    # 幾乎相同的對話已分析過時，先讓使用者選擇沿用先前結果或重新分析（見下方）
+    elif reanalyze_requested or not find_near_duplicate(chat_input):
         with st.spinner(current_text["analyzing"]):
-            # 顯示進度條
-            progress_bar = st.progress(0)
-            for i in range(100):
-                time.sleep(0.01)
-                progress_bar.progress(i + 1)
-
-            # 根據選擇的語言設置提示詞
-            if st.session_state["language"] == "中文":
-                prompt = f"""
-你是一個專業的AI分析助手，專門處理會議記錄、對話內容和文字資料，提取關鍵資訊並生成詳細的分析報告。
-
-請對以下文字內容進行深入分析：
-
-1. 仔細閱讀輸入的文字內容，識別並提取以下要素：
-   - 主要討論主題和背景
-   - 關鍵決策和結論
-   - 重要的數據點和事實
-   - 參與者的角色和責任
-   - 時間線和截止日期
-
-2. 生成全面而詳細的摘要，確保：
-   - 涵蓋所有重要資訊
-   - 按邏輯順序組織內容
-   - 提供足夠的上下文以便理解
-   - 突出關鍵見解和結論
-
-3. 從文字中識別所有可執行的工作項目，確保每個待辦事項：
-   - 明確具體且可操作
-   - 包含負責人（如有提及）
-   - 包含截止日期（如有提及）
-   - 按優先順序或時間順序排列
-   - 使用動詞開頭，清晰描述需要完成的行動
-
-4. 最後，將摘要與待辦事項整理成 **Markdown 格式** 輸出，結構清晰、易於閱讀與複製使用。
-
-請使用以下格式輸出：
-
-## 📌 摘要
-- [主題/背景相關的重點]
-- [決策和結論相關的重點]
-- [時間線和責任相關的重點]
-- [其他重要資訊]
-
-## ✅ 待辦事項清單
-- [ ] [動詞開頭的具體任務1]，負責人：[姓名]，截止日期：[日期]
-- [ ] [動詞開頭的具體任務2]，負責人：[姓名]，截止日期：[日期]
-- [ ] [動詞開頭的具體任務3]
-
-文字內容：
-{chat_input}
-"""
+            # 進度條由分析流程實際回報的進度驅動
+            progress_bar = st.progress(0, text=current_text["progress_prompt"])
+
+            def update_progress(fraction, stage, details):
+                text = current_text[f"progress_{stage}"]
+                if stage == "tokens":
+                    text = text.format(**details)
+                elif stage == "request" and "chunks_total" in details:
+                    text = current_text["progress_chunks"].format(**details)
+                progress_bar.progress(int(fraction * 100), text=text)
+
+            progress = ProgressReporter(update_progress)
+
+            # 使用串流方式調用 OpenAI API，邊接收邊顯示結果
+            stream_placeholder = st.empty()
+            source = st.session_state["analysis_source"]
+            if source and source["chat_input"] != chat_input:
+                # 對話是先前分析過的版本修改而來：只分析變動部分
+                analysis = run_incremental_analysis(
+                    chat_input,
+                    source["chat_input"],
+                    source["result"],
+                    st.session_state["language"],
+                    api_key,
+                    progress=progress,
+                    on_delta=stream_placeholder.markdown,
+                    output_mode=output_mode
+                )
             else:
-                prompt = f"""
-You are a professional AI analysis assistant, specializing in processing meeting notes, conversation content, and text data to extract key information and generate detailed analysis reports.
-
-Please conduct an in-depth analysis of the following text content:
-
-1. Carefully read the input text and identify the following elements:
-   - Main discussion topics and background
-   - Key decisions and conclusions
-   - Important data points and facts
-   - Roles and responsibilities of participants
-   - Timelines and deadlines
-
-2. Generate a comprehensive and detailed summary, ensuring:
-   - All important information is covered
-   - Content is organized in logical order
-   - Sufficient context is provided for understanding
-   - Key insights and conclusions are highlighted
-
-3. Identify all actionable work items from the text, ensuring each to-do item:
-   - Is clear, specific, and actionable
-   - Includes the responsible person (if mentioned)
-   - Includes the deadline (if mentioned)
-   - Is arranged by priority or chronological order
-   - Starts with a verb, clearly describing the action to be completed
-
-4. Finally, organize the summary and to-do items into a **Markdown format** output that is clear, easy to read, and copy.
-
-Please use the following output format:
-
-## 📌 Summary
-- [Point related to topic/background]
-- [Point related to decisions and conclusions]
-- [Point related to timeline and responsibilities]
-- [Other important information]
-
-## ✅ To-Do List
-- [ ] [Specific task starting with a verb 1], Responsible: [Name], Deadline: [Date]
-- [ ] [Specific task starting with a verb 2], Responsible: [Name], Deadline: [Date]
-- [ ] [Specific task starting with a verb 3]
-
-Text content:
-{chat_input}
-"""
-            # 使用我們的自定義函數調用 OpenAI API
-            output = call_openai_api(prompt)
+                analysis = run_analysis(
+                    chat_input,
+                    st.session_state["language"],
+                    api_key,
+                    progress=progress,
+                    on_delta=stream_placeholder.markdown,
+                    output_mode=output_mode
+                )
+            stream_placeholder.empty()
+
+            # 顯示 token 預算規劃的警告（例如需要分段處理）
+            for warning in analysis.get("plan", {}).get("warnings", []):
+                st.warning(f"⚠️ {warning}")
 
             # 檢查輸出是否包含錯誤信息
-            if output.startswith("錯誤:") or output.startswith("Error:"):
-                st.error(f"⚠️ {output}")
+            if not analysis["success"]:
+                progress_bar.empty()
+                st.error(f"⚠️ {analysis['message']}")
                 st.info("如果遇到 API 錯誤，請檢查您的 API key 是否有效，以及是否有足夠的配額。")
             else:
+                output = analysis["result"]
+
                 # Store the current timestamp when analysis is completed
                 # Use timezone-aware datetime with local timezone
                 st.session_state["analysis_timestamp"] = get_local_time()
 
                 st.session_state["analysis_result"] = output
                 st.session_state["result_displayed"] = False  # 重設顯示狀態
+                st.session_state["analysis_source"] = {"chat_input": chat_input, "result": output}
 
                 # Save to history
-                save_to_history(chat_input, output)
+                progress.report("save", 0.0)
+                save_to_history(chat_input, output, title=analysis["title"])
+                progress.report("save", 1.0)
 
                 st.success(current_text["analysis_complete"])
+                if analysis.get("cached"):
+                    st.info(current_text["analysis_cached"])
+                elif analysis.get("incremental"):
+                    st.info(current_text["analysis_incremental"].format(**analysis))
+                st.caption(current_text["analysis_tokens"].format(**analysis["plan"]))
+                if analysis["plan"].get("saved_tokens"):
+                    st.caption(current_text["analysis_compression"].format(**analysis["plan"]))
+                if analysis["plan"].get("routing"):
+                    st.caption(current_text["analysis_routing"].format(**analysis["plan"]["routing"]))
+
+# 提供近似的先前分析結果
+near_duplicate = st.session_state.get("near_duplicate")
+if near_duplicate and near_duplicate["chat_input"] == chat_input:
+    st.info(current_text["near_duplicate_found"].format(
+        similarity=int(near_duplicate["similarity"] * 100),
+        title=near_duplicate["title"],
+        timestamp=near_duplicate["timestamp"]
+    ))
+    col_reuse, col_update, col_reanalyze = st.columns(3)
+    with col_reuse:
+        st.button(
+            current_text["near_duplicate_reuse"],
+            on_click=reuse_near_duplicate,
+            use_container_width=True,
+            type="primary"
+        )
+    with col_update:
+        st.button(
+            current_text["near_duplicate_update"],
+            on_click=request_incremental_update,
+            use_container_width=True
+        )
+    with col_reanalyze:
+        st.button(
+            current_text["near_duplicate_reanalyze"],
+            on_click=request_reanalysis,
+            use_container_width=True
+        )
 
 # 顯示結果
 if st.session_state["analysis_result"]:
@@ -939,7 +1234,14 @@ if st.session_state["analysis_result"]:
     # 使用 st.code 顯示分析結果，這樣用戶可以直接選擇和複製
     st.code(result_text, language="markdown")
 
-    # 添加 Notion 集成部分
-    render_notion_section(current_text, result_text)
+    # 添加 Notion 集成部分（匯出的是產生此結果的對話，而非輸入框中可能已修改的內容）
+    result_source = st.session_state["analysis_source"]
+    render_notion_section(
+        current_text,
+        result_text,
+        UserHistory(get_history_store(), st.session_state["user_id"]),
+        chat_input=result_source["chat_input"] if result_source else None,
+        user_id=st.session_state["user_id"]
+    )
 
 # No longer using modal for history display - using sidebar instead
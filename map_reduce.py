@@ -0,0 +1,157 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from analysis_parser import parse_analysis
+from openai_api import call_openai_api, is_error_output
+from prompt_registry import TASK_MAP, TASK_REDUCE, get_prompt
+from token_budget import count_tokens
+
+# 每個分段的輸入 token 上限；分段越小，可並行處理的段數越多
+MAX_CHUNK_TOKENS = 3000
+
+# 同時處理的分段數上限
+MAX_CHUNK_WORKERS = 4
+
+# 每個分段摘要的輸出 token 上限
+MAP_MAX_TOKENS = 500
+
+# 一行以「說話者：」或「Speaker:」開頭時視為新的發言
+_SPEAKER_PATTERN = re.compile(r"^\s*[^\s：:][^：:\n]{0,39}[：:]")
+
+def split_into_turns(transcript: str) -> List[str]:
+    """
+    Split a transcript into speaker turns.
+
+    A line starting with "Name：" or "Name:" begins a new turn; other lines are
+    treated as a continuation of the previous turn.
+    """
+    turns: List[str] = []
+    for line in transcript.strip().split("\n"):
+        if not line.strip():
+            continue
+        if turns and not _SPEAKER_PATTERN.match(line):
+            turns[-1] += "\n" + line
+        else:
+            turns.append(line)
+    return turns
+
+def _split_oversized(turn: str, max_tokens: int) -> List[str]:
+    """Split a single turn that exceeds the chunk budget into smaller pieces."""
+    chars_per_piece = max(1, int(len(turn) * max_tokens / count_tokens(turn)))
+    return [turn[i:i + chars_per_piece] for i in range(0, len(turn), chars_per_piece)]
+
+def chunk_transcript(transcript: str, max_chunk_tokens: int = MAX_CHUNK_TOKENS) -> List[str]:
+    """
+    Split a transcript into chunks of at most max_chunk_tokens, on speaker-turn boundaries.
+
+    Returns:
+        List of chunk texts in transcript order
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for turn in split_into_turns(transcript):
+        turn_tokens = count_tokens(turn) + 1
+        if turn_tokens > max_chunk_tokens:
+            pieces = _split_oversized(turn, max_chunk_tokens)
+        else:
+            pieces = [turn]
+
+        for piece in pieces:
+            piece_tokens = count_tokens(piece) + 1
+            if current and current_tokens + piece_tokens > max_chunk_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def map_chunks(chunks: List[str], language: str, api_key: str, model: str,
+               temperature: float, max_tokens: int = MAP_MAX_TOKENS,
+               max_workers: int = MAX_CHUNK_WORKERS,
+               on_chunk_done: Optional[Callable[[int, int], None]] = None) -> Dict:
+    """
+    Summarize every chunk concurrently on a bounded thread pool.
+
+    Args:
+        chunks: Chunk texts from chunk_transcript
+        language: UI language, "中文" or "English"
+        api_key: OpenAI API key
+        model: OpenAI model name
+        temperature: Sampling temperature
+        max_tokens: Output token budget per chunk
+        max_workers: Maximum number of chunks processed at the same time
+        on_chunk_done: Called with (chunks_done, chunks_total) after each chunk (optional)
+
+    Returns:
+        Dict containing success status and the partial results in chunk order, or an error message
+    """
+    template = get_prompt(TASK_MAP, language)
+    total = len(chunks)
+
+    def summarize(index: int) -> str:
+        prompt = template.render(index=index + 1, total=total, chunk=chunks[index])
+        return call_openai_api(prompt, api_key, model=model, temperature=temperature, max_tokens=max_tokens)
+
+    partials: List[str] = [""] * total
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as executor:
+        futures = {executor.submit(summarize, i): i for i in range(total)}
+        done = 0
+        for future in as_completed(futures):
+            partials[futures[future]] = future.result()
+            done += 1
+            if on_chunk_done:
+                on_chunk_done(done, total)
+
+    for output in partials:
+        if is_error_output(output):
+            return {"success": False, "message": output}
+    return {"success": True, "partials": partials}
+
+def _line_key(line: str) -> str:
+    """Normalize a summary bullet or to-do line for duplicate detection."""
+    line = re.sub(r"^-\s*(\[[ xX]\]\s*)?", "", line.strip())
+    return re.sub(r"[\s\W_]+", "", line).lower()
+
+def dedupe_lines(lines: List[str]) -> List[str]:
+    """Remove duplicate summary bullets or to-do lines, keeping the first occurrence."""
+    seen = set()
+    unique = []
+    for line in lines:
+        key = _line_key(line)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(line.strip())
+    return unique
+
+def _collect(partials: List[str]) -> Dict[str, List[str]]:
+    """Collect summary bullets and to-do lines from every partial result."""
+    summary_lines: List[str] = []
+    task_lines: List[str] = []
+    for partial in partials:
+        parsed = parse_analysis(partial)
+        summary_lines.extend(line.strip() for line in parsed.summary.split("\n") if line.strip())
+        task_lines.extend(todo.to_markdown() for todo in parsed.todos)
+    return {"summary": dedupe_lines(summary_lines), "tasks": dedupe_lines(task_lines)}
+
+def build_reduce_prompt(partials: List[str], language: str) -> str:
+    """Build the prompt that merges partial results into the final analysis."""
+    collected = _collect(partials)
+    return get_prompt(TASK_REDUCE, language).render(
+        summaries="\n".join(collected["summary"]),
+        tasks="\n".join(collected["tasks"])
+    )
+
+def merge_partials(partials: List[str], language: str) -> str:
+    """Merge partial results locally, used when the reduce request fails."""
+    collected = _collect(partials)
+    summary_header = "## 📌 摘要" if language == "中文" else "## 📌 Summary"
+    todo_header = "## ✅ 待辦事項清單" if language == "中文" else "## ✅ To-Do List"
+    return "\n".join(
+        [summary_header] + collected["summary"] + ["", todo_header] + collected["tasks"]
+    )
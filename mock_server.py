@@ -0,0 +1,455 @@
+"""
+Local stand-in for the OpenAI and Notion APIs, for load tests and benchmarks.
+
+Implements the endpoints the app uses, with configurable latency and injected
+429/5xx errors, so the whole app can run without burning quota.
+
+Usage:
+    python mock_server.py --port 8765 --latency-ms 300 --latency-sigma 0.5 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 NOTION_BASE_URL=http://127.0.0.1:8765/v1 streamlit run main.py
+"""
+import re
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+_CJK_PATTERN = re.compile(r"[一-鿿]")
+
+# 預設的分析結果，依提示詞語言與輸出模式選用
+CANNED_RESULTS = {
+    "中文": (
+        "## 📌 摘要\n"
+        "- 團隊討論新版功能的上線時程\n"
+        "- 決定下週一開始內部測試\n"
+        "- 後端 API 需於週五前完成\n\n"
+        "## ✅ 待辦事項清單\n"
+        "- [ ] 完成後端 API 交付，負責人：小華，截止日期：週五\n"
+        "- [ ] 上傳設計檔案，負責人：小陳\n"
+        "- [ ] 準備內部測試計畫，負責人：小明，截止日期：下週一\n"
+    ),
+    "English": (
+        "## 📌 Summary\n"
+        "- The team discussed the launch schedule of the new release\n"
+        "- Internal testing starts next Monday\n"
+        "- The backend API must be finished by Friday\n\n"
+        "## ✅ To-Do List\n"
+        "- [ ] Deliver the backend API, Responsible: Alice, Deadline: Friday\n"
+        "- [ ] Upload the design files, Responsible: Bob\n"
+        "- [ ] Prepare the internal test plan, Responsible: Carol, Deadline: Next Monday\n"
+    ),
+}
+
+CANNED_STRUCTURED = {
+    "中文": {
+        "summary": ["團隊討論新版功能的上線時程", "決定下週一開始內部測試"],
+        "tasks": [
+            {"task": "完成後端 API 交付", "owner": "小華", "deadline": "週五", "priority": "high"},
+            {"task": "上傳設計檔案", "owner": "小陳", "deadline": None, "priority": None},
+        ],
+    },
+    "English": {
+        "summary": ["The team discussed the launch schedule of the new release", "Internal testing starts next Monday"],
+        "tasks": [
+            {"task": "Deliver the backend API", "owner": "Alice", "deadline": "Friday", "priority": "high"},
+            {"task": "Upload the design files", "owner": "Bob", "deadline": None, "priority": None},
+        ],
+    },
+}
+
+NOTION_DATABASE_PROPERTIES = {
+    "任務名稱": {"id": "title", "type": "title", "title": {}},
+    "狀態": {"id": "status", "type": "status", "status": {"options": [
+        {"name": "未開始"}, {"name": "進行中"}, {"name": "已完成"}
+    ]}},
+    "截止日": {"id": "date", "type": "date", "date": {}},
+    "負責人": {"id": "people", "type": "people", "people": {}},
+    "任務標籤": {"id": "tags", "type": "multi_select", "multi_select": {"options": [{"name": "自動生成"}]}},
+    "任務說明": {"id": "description", "type": "rich_text", "rich_text": {}},
+}
+
+@dataclass
+class MockConfig:
+    """Behaviour of the mock server."""
+    latency_ms: float = 0.0          # 回應前延遲的中位數
+    latency_sigma: float = 0.0       # 延遲的對數常態分布參數，0 表示固定延遲
+    token_delay_ms: float = 0.0      # 串流回應每個片段之間的延遲
+    chunk_chars: int = 4             # 串流回應每個片段的字元數
+    rate_limit_rate: float = 0.0     # 回傳 429 的比例
+    server_error_rate: float = 0.0   # 回傳 500/502/503 的比例
+    retry_after: float = 1.0         # 429 回應的 Retry-After 秒數
+    requests_per_minute: int = 100000   # x-ratelimit-* 標頭回報的請求與 token 上限
+    tokens_per_minute: int = 100000000
+    embedding_dimensions: int = 256
+    chat_response: Optional[str] = None  # 固定的聊天回應，未設定時使用 CANNED_RESULTS
+    seed: Optional[int] = None
+
+@dataclass
+class MockState:
+    """Requests served, faults injected and the Notion pages and blocks created."""
+    requests: Counter = field(default_factory=Counter)
+    faults: Counter = field(default_factory=Counter)
+    pages: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    children: Dict[str, List[str]] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+def _prompt_language(prompt: str) -> str:
+    """Guess the UI language from the instruction prefix at the start of the prompt."""
+    return "中文" if _CJK_PATTERN.search(prompt[:200]) else "English"
+
+def fake_embedding(text: str, dimensions: int) -> List[float]:
+    """Deterministic embedding from hashed character bigrams, so similar texts get similar vectors."""
+    vector = [0.0] * dimensions
+    for i in range(max(len(text) - 1, 1)):
+        digest = hashlib.md5(text[i:i + 2].encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % dimensions] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+class MockServer:
+    """
+    Threaded HTTP server implementing the OpenAI and Notion endpoints used by the app.
+
+    Both APIs are served under /v1 (their paths do not overlap), so the same
+    base URL works for OPENAI_BASE_URL and NOTION_BASE_URL. GET /_mock/stats
+    returns the request and fault counters.
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self.state = MockState()
+        self._random = random.Random(self.config.seed)
+        self._random_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockServer":
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.state.lock:
+            return {"requests": dict(self.state.requests), "faults": dict(self.state.faults)}
+
+    def _rate_limit_headers(self, tokens: int) -> Dict[str, str]:
+        """x-ratelimit-* headers of an OpenAI response, which the client's rate limiter follows."""
+        return {
+            "x-ratelimit-limit-requests": str(self.config.requests_per_minute),
+            "x-ratelimit-remaining-requests": str(self.config.requests_per_minute - 1),
+            "x-ratelimit-limit-tokens": str(self.config.tokens_per_minute),
+            "x-ratelimit-remaining-tokens": str(max(self.config.tokens_per_minute - tokens, 0)),
+        }
+
+    def _sample(self) -> Tuple[float, float]:
+        """Draw (latency in seconds, fault roll) for one request."""
+        with self._random_lock:
+            latency = self.config.latency_ms / 1000.0
+            if self.config.latency_sigma > 0 and latency > 0:
+                latency *= math.exp(self._random.gauss(0.0, self.config.latency_sigma))
+            return latency, self._random.random()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 標頭與內容分兩次寫出，未關閉 Nagle 演算法時每個回應會多等一次延遲 ACK（約 40ms）
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                # 用戶端在讀完回應前關閉連線（例如重試前放棄錯誤回應）屬正常情況，不印出例外
+                try:
+                    super().handle()
+                except (ConnectionResetError, BrokenPipeError):
+                    self.close_connection = True
+
+            def _send_json(self, status: int, data: Any, headers: Optional[Dict[str, str]] = None) -> None:
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length") or 0)
+                if not length:
+                    return {}
+                try:
+                    return json.loads(self.rfile.read(length))
+                except ValueError:
+                    return {}
+
+            def _handle(self, method: str) -> None:
+                url = urlparse(self.path)
+                body = self._read_json() if method in ("POST", "PATCH") else {}
+                route = server._route(method, url.path)
+                if route is None:
+                    self._send_json(404, {"object": "error", "message": f"No route for {method} {url.path}"})
+                    return
+                name, endpoint, args = route
+                with server.state.lock:
+                    server.state.requests[name] += 1
+
+                if name != "stats":
+                    latency, roll = server._sample()
+                    if latency:
+                        time.sleep(latency)
+                    if roll < server.config.rate_limit_rate:
+                        with server.state.lock:
+                            server.state.faults[f"{name}:429"] += 1
+                        self._send_json(429, {"error": {"message": "Rate limit reached (injected)"}},
+                                        {"Retry-After": str(server.config.retry_after)})
+                        return
+                    if roll < server.config.rate_limit_rate + server.config.server_error_rate:
+                        status = (500, 502, 503)[int(roll * 1000) % 3]
+                        with server.state.lock:
+                            server.state.faults[f"{name}:{status}"] += 1
+                        self._send_json(status, {"error": {"message": "Server error (injected)"}})
+                        return
+
+                endpoint(self, body, parse_qs(url.query), *args)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_PATCH(self):
+                self._handle("PATCH")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+        return Handler
+
+    _ROUTES = [
+        ("GET", re.compile(r"^/_mock/stats$"), "stats"),
+        ("POST", re.compile(r"^/v1/chat/completions$"), "chat_completions"),
+        ("POST", re.compile(r"^/v1/embeddings$"), "embeddings"),
+        ("GET", re.compile(r"^/v1/users/me$"), "users_me"),
+        ("GET", re.compile(r"^/v1/databases/([^/]+)$"), "get_database"),
+        ("POST", re.compile(r"^/v1/pages$"), "create_page"),
+        ("PATCH", re.compile(r"^/v1/pages/([^/]+)$"), "update_page"),
+        ("GET", re.compile(r"^/v1/blocks/([^/]+)/children$"), "list_children"),
+        ("PATCH", re.compile(r"^/v1/blocks/([^/]+)/children$"), "append_children"),
+        ("PATCH", re.compile(r"^/v1/blocks/([^/]+)$"), "update_block"),
+        ("DELETE", re.compile(r"^/v1/blocks/([^/]+)$"), "delete_block"),
+    ]
+
+    def _route(self, method: str, path: str):
+        for route_method, pattern, name in self._ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                return name, getattr(self, f"_{name}"), match.groups()
+        return None
+
+    # --- 端點實作 ---
+
+    def _stats(self, handler, body, query):
+        handler._send_json(200, self.stats())
+
+    def _chat_completions(self, handler, body, query):
+        prompt = "".join(message.get("content", "") for message in body.get("messages", []))
+        language = _prompt_language(prompt)
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps(CANNED_STRUCTURED[language], ensure_ascii=False)
+        else:
+            content = self.config.chat_response or CANNED_RESULTS[language]
+        prompt_tokens = max(1, len(prompt) // 3)
+        completion_tokens = max(1, len(content) // 3)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        headers = self._rate_limit_headers(prompt_tokens + completion_tokens)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if not body.get("stream"):
+            handler._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }, headers)
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        handler.send_header("Connection", "close")
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.close_connection = True
+        step = max(1, self.config.chunk_chars)
+        for start in range(0, len(content), step):
+            if self.config.token_delay_ms:
+                time.sleep(self.config.token_delay_ms / 1000.0)
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": body.get("model"),
+                     "choices": [{"index": 0, "delta": {"content": content[start:start + step]}}]}
+            handler.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            final = {"id": completion_id, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+            handler.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+    def _embeddings(self, handler, body, query):
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        tokens = sum(len(text) // 3 for text in inputs)
+        handler._send_json(200, {
+            "object": "list", "model": body.get("model"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, self.config.embedding_dimensions)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }, self._rate_limit_headers(tokens))
+
+    def _users_me(self, handler, body, query):
+        handler._send_json(200, {"object": "user", "id": "mock-bot", "type": "bot", "name": "Mock Integration"})
+
+    def _get_database(self, handler, body, query, database_id):
+        handler._send_json(200, {
+            "object": "database", "id": database_id,
+            "title": [{"type": "text", "plain_text": "Mock Database", "text": {"content": "Mock Database"}}],
+            "properties": NOTION_DATABASE_PROPERTIES,
+        })
+
+    def _add_children(self, parent_id: str, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        created = []
+        with self.state.lock:
+            children = self.state.children.setdefault(parent_id, [])
+            for block in blocks:
+                block_id = str(uuid.uuid4())
+                children.append(block_id)
+                created.append({"object": "block", "id": block_id, **block})
+        return created
+
+    def _create_page(self, handler, body, query):
+        page_id = str(uuid.uuid4())
+        page = {
+            "object": "page", "id": page_id,
+            "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+            "parent": body.get("parent", {}), "properties": body.get("properties", {}),
+        }
+        with self.state.lock:
+            self.state.pages[page_id] = page
+        self._add_children(page_id, body.get("children", []))
+        handler._send_json(200, page)
+
+    def _update_page(self, handler, body, query, page_id):
+        with self.state.lock:
+            page = self.state.pages.get(page_id)
+            if page is not None:
+                page["properties"].update(body.get("properties", {}))
+        if page is None:
+            handler._send_json(404, {"object": "error", "code": "object_not_found", "message": "Page not found"})
+        else:
+            handler._send_json(200, page)
+
+    def _list_children(self, handler, body, query, block_id):
+        page_size = min(int(query.get("page_size", ["100"])[0]), 100)
+        start = int(query.get("start_cursor", ["0"])[0] or 0)
+        with self.state.lock:
+            children = list(self.state.children.get(block_id, []))
+        page = children[start:start + page_size]
+        has_more = start + page_size < len(children)
+        handler._send_json(200, {
+            "object": "list", "results": [{"object": "block", "id": child} for child in page],
+            "has_more": has_more, "next_cursor": str(start + page_size) if has_more else None,
+        })
+
+    def _append_children(self, handler, body, query, block_id):
+        created = self._add_children(block_id, body.get("children", []))
+        handler._send_json(200, {"object": "list", "results": created, "has_more": False, "next_cursor": None})
+
+    def _update_block(self, handler, body, query, block_id):
+        handler._send_json(200, {"object": "block", "id": block_id, **body})
+
+    def _delete_block(self, handler, body, query, block_id):
+        with self.state.lock:
+            for children in self.state.children.values():
+                if block_id in children:
+                    children.remove(block_id)
+        handler._send_json(200, {"object": "block", "id": block_id, "archived": True})
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI and Notion APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Median latency before each response")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="Log-normal spread of the latency (0 = fixed)")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="Delay between streamed chunks")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 5xx")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds of injected 429s")
+    parser.add_argument("--requests-per-minute", type=int, default=100000,
+                        help="Request limit reported in the x-ratelimit-* headers")
+    parser.add_argument("--tokens-per-minute", type=int, default=100000000,
+                        help="Token limit reported in the x-ratelimit-* headers")
+    parser.add_argument("--chat-response", help="File with a fixed chat completion response")
+    parser.add_argument("--seed", type=int, help="Random seed for latency and fault injection")
+    args = parser.parse_args(argv)
+
+    chat_response = None
+    if args.chat_response:
+        with open(args.chat_response, "r", encoding="utf-8") as f:
+            chat_response = f.read()
+
+    server = MockServer(MockConfig(
+        latency_ms=args.latency_ms, latency_sigma=args.latency_sigma, token_delay_ms=args.token_delay_ms,
+        rate_limit_rate=args.rate_limit_rate, server_error_rate=args.error_rate,
+        retry_after=args.retry_after, requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute, chat_response=chat_response, seed=args.seed,
+    ), host=args.host, port=args.port)
+    print(f"Mock OpenAI/Notion API listening on {server.base_url}")
+    print(f"  OPENAI_BASE_URL={server.base_url} NOTION_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import os
+import json
+import logging
+import datetime
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from token_budget import get_context_window
+
+logger = logging.getLogger(__name__)
+
+# 路由目標："latency" 選最快的模型，"cost" 選延遲預算內最便宜的模型，"balanced" 兼顧兩者
+ROUTING_TARGET_LATENCY = "latency"
+ROUTING_TARGET_COST = "cost"
+ROUTING_TARGET_BALANCED = "balanced"
+
+# 模型路由設定，可透過環境變數覆寫
+ROUTING_TARGET = os.getenv("MODEL_ROUTING_TARGET", ROUTING_TARGET_BALANCED)
+ROUTING_MODELS = [
+    name.strip() for name in os.getenv("MODEL_ROUTING_MODELS", "gpt-3.5-turbo,gpt-4o-mini,gpt-4o").split(",")
+    if name.strip()
+]
+ROUTING_LATENCY_BUDGET_SECONDS = float(os.getenv("MODEL_ROUTING_LATENCY_BUDGET", "30"))
+ROUTING_MIN_QUALITY = float(os.getenv("MODEL_ROUTING_MIN_QUALITY", "0.7"))
+DEFAULT_ROUTING_LOG_PATH = os.getenv("MODEL_ROUTING_LOG_PATH", os.path.join(".cache", "routing.jsonl"))
+
+# 實測延遲的指數移動平均權重，以及啟動時從紀錄讀回的請求數
+LATENCY_EWMA_ALPHA = 0.2
+HISTORY_REPLAY_LINES = 500
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """Prior knowledge about a model, used until measured latencies are available."""
+    name: str
+    input_cost: float                # USD per 1M input tokens
+    output_cost: float               # USD per 1M output tokens
+    first_token_seconds: float
+    seconds_per_output_token: float
+    quality: Dict[str, float]        # 各語言的分析品質，0 到 1
+
+MODEL_PROFILES = {
+    "gpt-3.5-turbo": ModelProfile("gpt-3.5-turbo", 0.50, 1.50, 0.5, 0.010, {"中文": 0.65, "English": 0.75}),
+    "gpt-4o-mini": ModelProfile("gpt-4o-mini", 0.15, 0.60, 0.6, 0.012, {"中文": 0.80, "English": 0.80}),
+    "gpt-4o": ModelProfile("gpt-4o", 2.50, 10.00, 0.7, 0.015, {"中文": 0.95, "English": 0.95}),
+}
+
+def estimate_cost(profile: ModelProfile, prompt_tokens: int, output_tokens: int) -> float:
+    """Estimate the price of a request in USD."""
+    return (prompt_tokens * profile.input_cost + output_tokens * profile.output_cost) / 1_000_000
+
+class ModelRouter:
+    """
+    Pick the model of each analysis request.
+
+    Candidates must fit the prompt and output budget in their context window and
+    reach ROUTING_MIN_QUALITY for the language; among them the target decides.
+    Latency estimates start from the model profiles and follow the measured
+    latencies of completed requests (an exponential moving average per model).
+    Every decision and its outcome is appended to a JSONL log for auditing, and
+    the log is replayed on startup so the measurements survive restarts.
+    """
+
+    def __init__(self, models: Optional[List[str]] = None, target: str = ROUTING_TARGET,
+                 latency_budget: float = ROUTING_LATENCY_BUDGET_SECONDS,
+                 min_quality: float = ROUTING_MIN_QUALITY,
+                 log_path: Optional[str] = DEFAULT_ROUTING_LOG_PATH):
+        """
+        Initialize the router.
+
+        Args:
+            models: Candidate model names (defaults to ROUTING_MODELS); models
+                without a profile in MODEL_PROFILES are ignored
+            target: ROUTING_TARGET_LATENCY, ROUTING_TARGET_COST or ROUTING_TARGET_BALANCED
+            latency_budget: Estimated seconds a request should stay within
+            min_quality: Minimum quality of a model for the request's language
+            log_path: JSONL file of decisions and outcomes (None to disable)
+        """
+        self.profiles = []
+        for name in models or ROUTING_MODELS:
+            if name in MODEL_PROFILES:
+                self.profiles.append(MODEL_PROFILES[name])
+            else:
+                logger.warning("No routing profile for model %s, ignoring it", name)
+        if not self.profiles:
+            raise ValueError("No routable models configured")
+        self.target = target
+        self.latency_budget = latency_budget
+        self.min_quality = min_quality
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._latency = {
+            profile.name: {
+                "first_token_seconds": profile.first_token_seconds,
+                "seconds_per_output_token": profile.seconds_per_output_token,
+                "samples": 0,
+            }
+            for profile in self.profiles
+        }
+        self._replay_log()
+
+    def _replay_log(self) -> None:
+        """Rebuild the latency averages from the most recent logged requests."""
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            lines = deque(f, maxlen=HISTORY_REPLAY_LINES)
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("success") and record.get("model") in self._latency:
+                self._update_latency(record["model"], record["seconds"],
+                                     record["first_token_seconds"], record["output_tokens"])
+
+    def _update_latency(self, model: str, seconds: float, first_token_seconds: float, output_tokens: int) -> None:
+        stats = self._latency[model]
+        per_token = max(seconds - first_token_seconds, 0.0) / max(output_tokens, 1)
+        for key, value in (("first_token_seconds", first_token_seconds), ("seconds_per_output_token", per_token)):
+            stats[key] += LATENCY_EWMA_ALPHA * (value - stats[key])
+        stats["samples"] += 1
+
+    def estimate_seconds(self, model: str, output_tokens: int) -> float:
+        """Estimate the duration of a request from the model's measured latencies."""
+        with self._lock:
+            stats = self._latency[model]
+            return stats["first_token_seconds"] + output_tokens * stats["seconds_per_output_token"]
+
+    def route(self, prompt_tokens: int, max_tokens: int, language: str) -> Dict:
+        """
+        Choose the model of a request.
+
+        Args:
+            prompt_tokens: Size of the prompt
+            max_tokens: Output token budget
+            language: UI language, "中文" or "English"
+
+        Returns:
+            Dict containing the chosen model, target, reason, the request size,
+            estimated_seconds, estimated_cost, and every candidate's estimates
+        """
+        candidates = []
+        for profile in self.profiles:
+            candidates.append({
+                "model": profile.name,
+                "fits": prompt_tokens + max_tokens <= get_context_window(profile.name),
+                "quality": profile.quality.get(language, min(profile.quality.values())),
+                "estimated_seconds": round(self.estimate_seconds(profile.name, max_tokens), 3),
+                "estimated_cost": round(estimate_cost(profile, prompt_tokens, max_tokens), 6),
+            })
+
+        fitting = [c for c in candidates if c["fits"]]
+        eligible = [c for c in fitting if c["quality"] >= self.min_quality] or fitting
+        if not eligible:
+            # 沒有模型能一次處理：交給上下文最長的模型分段處理
+            chosen = max(candidates, key=lambda c: get_context_window(c["model"]))
+            reason = "no model fits the request; largest context window (chunked)"
+        elif len(eligible) == 1:
+            chosen = eligible[0]
+            reason = "only eligible model" if len(fitting) > 1 else "only model whose context window fits"
+        elif self.target == ROUTING_TARGET_LATENCY:
+            chosen = min(eligible, key=lambda c: c["estimated_seconds"])
+            reason = "fastest eligible model"
+        else:
+            within_budget = [c for c in eligible if c["estimated_seconds"] <= self.latency_budget]
+            if not within_budget:
+                chosen = min(eligible, key=lambda c: c["estimated_seconds"])
+                reason = "no model within the latency budget; fastest eligible model"
+            elif self.target == ROUTING_TARGET_COST:
+                chosen = min(within_budget, key=lambda c: c["estimated_cost"])
+                reason = "cheapest model within the latency budget"
+            else:
+                fastest = min(c["estimated_seconds"] for c in within_budget)
+                cheapest = min(c["estimated_cost"] for c in within_budget)
+                chosen = min(within_budget, key=lambda c: (
+                    c["estimated_seconds"] / max(fastest, 1e-9) + c["estimated_cost"] / max(cheapest, 1e-9)
+                ))
+                reason = "best cost/latency balance within the latency budget"
+
+        decision = {
+            "model": chosen["model"],
+            "target": self.target,
+            "reason": reason,
+            "language": language,
+            "prompt_tokens": prompt_tokens,
+            "max_tokens": max_tokens,
+            "estimated_seconds": chosen["estimated_seconds"],
+            "estimated_cost": chosen["estimated_cost"],
+            "candidates": candidates,
+        }
+        logger.info(
+            "Routing: model=%s target=%s reason=%s prompt_tokens=%d max_tokens=%d language=%s est=%.1fs $%.5f",
+            decision["model"], self.target, reason, prompt_tokens, max_tokens, language,
+            decision["estimated_seconds"], decision["estimated_cost"]
+        )
+        return decision
+
+    def record(self, decision: Dict, seconds: float, first_token_seconds: Optional[float],
+               output_tokens: int, success: bool) -> None:
+        """
+        Record the outcome of a routed request: update the model's latency
+        averages (successful requests only) and append the decision with its
+        measured duration and cost to the routing log.
+        """
+        model = decision["model"]
+        first_token_seconds = seconds if first_token_seconds is None else first_token_seconds
+        record = {
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            **decision,
+            "success": success,
+            "seconds": round(seconds, 3),
+            "first_token_seconds": round(first_token_seconds, 3),
+            "output_tokens": output_tokens,
+            "cost": round(estimate_cost(MODEL_PROFILES[model], decision["prompt_tokens"], output_tokens), 6),
+        }
+        with self._lock:
+            if success:
+                self._update_latency(model, seconds, first_token_seconds, output_tokens)
+            if self.log_path:
+                directory = os.path.dirname(self.log_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        logger.info(
+            "Routed request done: model=%s success=%s %.1fs (estimated %.1fs) output_tokens=%d $%.5f",
+            model, success, seconds, decision["estimated_seconds"], output_tokens, record["cost"]
+        )
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+def get_model_router() -> ModelRouter:
+    """Get the shared model router for this process."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
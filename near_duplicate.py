@@ -0,0 +1,209 @@
+import os
+import sqlite3
+import zlib
+import threading
+from collections import defaultdict
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from analysis_cache import normalize_transcript
+
+# 近似重複偵測設定，可透過環境變數覆寫
+DEFAULT_FINGERPRINT_PATH = os.getenv("NEAR_DUPLICATE_INDEX_PATH", os.path.join(".cache", "fingerprints.sqlite3"))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.95"))
+
+SHINGLE_CHARS = 4
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16  # 16 段 × 每段 8 個值：相似度 0.95 幾乎必定成為候選，0.7 以下很少
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+SIGNATURE_SLICE_ROWS = 4096  # 每次計算的 shingle 數（4096 × 128 × 8 bytes = 4 MB）
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(20240601)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+def shingles(text: str) -> Set[int]:
+    """Hash the overlapping character n-grams of a normalized transcript."""
+    text = normalize_transcript(text)
+    if len(text) <= SHINGLE_CHARS:
+        return {zlib.crc32(text.encode("utf-8"))} if text else set()
+    return {
+        zlib.crc32(text[i:i + SHINGLE_CHARS].encode("utf-8"))
+        for i in range(len(text) - SHINGLE_CHARS + 1)
+    }
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    Compute the MinHash signature of a transcript.
+
+    The fraction of equal positions between two signatures estimates the Jaccard
+    similarity of the transcripts' character 4-gram sets.
+    """
+    hashes = np.fromiter(shingles(text), dtype=np.uint64)
+    signature = np.full(NUM_PERMUTATIONS, _MAX_HASH, dtype=np.uint64)
+    # 分段計算，記憶體用量固定為 SIGNATURE_SLICE_ROWS × 128，與逐字稿長度無關
+    for start in range(0, hashes.size, SIGNATURE_SLICE_ROWS):
+        permuted = np.outer(hashes[start:start + SIGNATURE_SLICE_ROWS], _PERM_A)
+        permuted += _PERM_B
+        permuted %= _MERSENNE_PRIME
+        permuted &= _MAX_HASH
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimate the Jaccard similarity of two transcripts from their signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERMUTATIONS
+
+def _band_keys(signature: np.ndarray) -> List[bytes]:
+    return [signature[i * LSH_ROWS:(i + 1) * LSH_ROWS].tobytes() for i in range(LSH_BANDS)]
+
+class NearDuplicateIndex:
+    """
+    Index of transcript fingerprints for finding near-duplicate analyses.
+
+    MinHash signatures are persisted in SQLite and, per user, loaded into an
+    in-memory LSH table (16 bands of 8 values), so a lookup only compares the
+    signature against the few items sharing a band instead of the whole history.
+    """
+
+    def __init__(self, path: str = DEFAULT_FINGERPRINT_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._signatures: Dict[str, Dict[int, np.ndarray]] = {}
+        self._buckets: Dict[str, Dict[Tuple[int, bytes], Set[int]]] = {}
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    user_id TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    signature BLOB NOT NULL,
+                    PRIMARY KEY (user_id, item_id)
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _load_user(self, user_id: str) -> None:
+        """Build the in-memory LSH table of a user from the stored signatures (once per process)."""
+        if user_id in self._signatures:
+            return
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT item_id, signature FROM fingerprints WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        signatures = {}
+        buckets: Dict[Tuple[int, bytes], Set[int]] = defaultdict(set)
+        for item_id, blob in rows:
+            signature = np.frombuffer(blob, dtype=np.uint32)
+            signatures[item_id] = signature
+            for band, key in enumerate(_band_keys(signature)):
+                buckets[(band, key)].add(item_id)
+        self._signatures[user_id] = signatures
+        self._buckets[user_id] = buckets
+
+    def add(self, user_id: str, item_id: int, transcript: str) -> None:
+        """Fingerprint a history item's transcript."""
+        signature = minhash_signature(transcript)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (user_id, item_id, signature) VALUES (?, ?, ?)",
+                (user_id, item_id, signature.tobytes())
+            )
+        with self._lock:
+            if user_id in self._signatures:
+                self._signatures[user_id][item_id] = signature
+                for band, key in enumerate(_band_keys(signature)):
+                    self._buckets[user_id][(band, key)].add(item_id)
+
+    def remove_items(self, user_id: str, item_ids: Iterable[int]) -> None:
+        """Forget the fingerprints of deleted history items."""
+        item_ids = list(item_ids)
+        if not item_ids:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "DELETE FROM fingerprints WHERE user_id = ? AND item_id = ?",
+                [(user_id, item_id) for item_id in item_ids]
+            )
+        with self._lock:
+            signatures = self._signatures.get(user_id)
+            if signatures is None:
+                return
+            for item_id in item_ids:
+                signature = signatures.pop(item_id, None)
+                if signature is not None:
+                    for band, key in enumerate(_band_keys(signature)):
+                        self._buckets[user_id][(band, key)].discard(item_id)
+
+    def has_item(self, user_id: str, item_id: int) -> bool:
+        with self._lock:
+            self._load_user(user_id)
+            return item_id in self._signatures[user_id]
+
+    def index_history(self, store, user_id: str, page_size: int = 500) -> int:
+        """
+        Fingerprint every item of a user's history that has none yet.
+
+        Args:
+            store: HistoryStore to read the items from
+
+        Returns:
+            Number of items fingerprinted
+        """
+        added = 0
+        offset = 0
+        while True:
+            page = store.list(user_id, limit=page_size, offset=offset)
+            if not page:
+                return added
+            for item in page:
+                if not self.has_item(user_id, item["id"]):
+                    full = store.get(user_id, item["id"])
+                    if full:
+                        self.add(user_id, item["id"], full["chat_input"])
+                        added += 1
+            offset += page_size
+
+    def find(self, user_id: str, transcript: str,
+             threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[Tuple[int, float]]:
+        """
+        Find history items whose transcript is at least `threshold` similar.
+
+        Returns:
+            (item ID, estimated similarity) pairs, most similar first
+        """
+        signature = minhash_signature(transcript)
+        with self._lock:
+            self._load_user(user_id)
+            signatures = self._signatures[user_id]
+            buckets = self._buckets[user_id]
+            candidates: Set[int] = set()
+            for band, key in enumerate(_band_keys(signature)):
+                candidates |= buckets.get((band, key), set())
+            scored = [(item_id, estimate_similarity(signature, signatures[item_id])) for item_id in candidates]
+        matches = [(item_id, score) for item_id, score in scored if score >= threshold]
+        matches.sort(key=lambda pair: (pair[1], pair[0]), reverse=True)
+        return matches
+
+_index: Optional[NearDuplicateIndex] = None
+_index_lock = threading.Lock()
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """Get the shared near-duplicate index for this process."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NearDuplicateIndex()
+    return _index
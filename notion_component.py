@@ -1,7 +1,9 @@
 import streamlit as st
 import datetime
-from notion_integration import NotionIntegration, get_notion_credentials_from_secrets, parse_analysis_result
-from utils import extract_summary_title
+from analysis_parser import parse_analysis
+from notion_integration import NotionIntegration, get_notion_credentials_from_secrets
+from notion_index import make_source_key
+from notion_outbox import get_notion_outbox
 
 # 獲取本地時區的時間
 def get_local_time():
@@ -10,14 +12,20 @@ def get_local_time():
     local_tz = datetime.datetime.now().astimezone().tzinfo
     return datetime.datetime.now(local_tz)
 
-def render_notion_section(ui_text, analysis_result=None):
+def render_notion_section(ui_text, analysis_result=None, history_items=None, chat_input=None, user_id=None):
     """
     Render the Notion integration section in the Streamlit app.
 
     Args:
         ui_text: Dictionary containing UI text in the current language
         analysis_result: The analysis result text (optional)
+        history_items: Usage history items offered for bulk export (optional)
+        chat_input: The transcript the analysis was made from, used to update
+            its existing Notion page instead of creating a duplicate (optional)
+        user_id: ID of the current user, who owns the queued exports (defaults to
+            st.session_state["user_id"])
     """
+    user_id = user_id or st.session_state.get("user_id", "")
     # Add Notion-specific text to UI text dictionary if not present
     if "notion_section_title" not in ui_text:
         ui_text.update({
@@ -37,6 +45,17 @@ def render_notion_section(ui_text, analysis_result=None):
             "notion_api_key_help": "You can get your API key from https://www.notion.so/my-integrations" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "您可以從 https://www.notion.so/my-integrations 獲取 API key",
             "notion_database_id_help": "The ID of the database where you want to save the analysis" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "您想要保存分析結果的資料庫 ID",
             "notion_setup_instructions": "How to set up Notion integration" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "如何設置 Notion 集成",
+            "notion_send_queued": "✅ Added to the export queue, it will be sent to Notion in the background" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "✅ 已加入匯出佇列，將在背景發送到 Notion",
+            "notion_outbox_header": "Recent exports" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "最近的匯出",
+            "notion_outbox_queued": "⏳ Queued" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "⏳ 排隊中",
+            "notion_outbox_sending": "📤 Sending" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "📤 發送中",
+            "notion_outbox_refresh": "Refresh status" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "重新整理狀態",
+            "notion_outbox_retry": "Retry failed" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "重試失敗項目",
+            "notion_bulk_export_button": "Export all history to Notion ({count})" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "匯出全部歷史紀錄到 Notion（{count}）",
+            "notion_bulk_retry_button": "Retry failed exports ({count})" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "重試失敗的匯出（{count}）",
+            "notion_bulk_progress": "Exporting to Notion ({done} / {total})..." if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "正在匯出到 Notion（{done} / {total}）...",
+            "notion_bulk_success": "✅ Exported {count} analyses to Notion" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "✅ 已將 {count} 筆分析匯出到 Notion",
+            "notion_bulk_partial": "⚠️ {succeeded} exported, {failed} failed" if "language_selector" in ui_text and ui_text.get("language_selector") == "Select Language" else "⚠️ 成功 {succeeded} 筆，失敗 {failed} 筆",
         })
 
     # Get credentials from secrets
@@ -55,12 +74,13 @@ def render_notion_section(ui_text, analysis_result=None):
         # Auto-test connection if credentials are available
         if credentials.get("api_key") and credentials.get("database_id"):
             with st.spinner("Testing Notion connection..."):
-                result = notion.test_connection()
+                # The database schema is cached, so this only hits Notion on the first run;
+                # a successful database lookup already proves the connection works
+                db_info = notion.get_database_info()
+                result = {"success": True} if db_info["success"] else notion.test_connection()
                 if result["success"]:
                     st.success(ui_text["notion_connection_success"])
 
-                    # If database ID is provided, get database info
-                    db_info = notion.get_database_info()
                     if db_info["success"]:
                         st.success(f"✅ {ui_text.get('language_selector') == 'Select Language' and 'Connected to database:' or '已連接到資料庫:'} {db_info.get('title', 'Untitled')}")
                     else:
@@ -132,9 +152,9 @@ def render_notion_section(ui_text, analysis_result=None):
                     if result["success"]:
                         st.success(ui_text["notion_connection_success"])
 
-                        # If database ID is provided, get database info
+                        # If database ID is provided, fetch fresh database info
                         if notion_database_id:
-                            db_info = notion.get_database_info()
+                            db_info = notion.get_database_info(refresh=True)
                             if db_info["success"]:
                                 st.success(f"✅ Connected to database: {db_info.get('title', 'Untitled')}")
                             else:
@@ -146,11 +166,9 @@ def render_notion_section(ui_text, analysis_result=None):
         if analysis_result:
             st.markdown("---")
 
-            # Parse the analysis result
-            parsed_result = parse_analysis_result(analysis_result)
-
-            # Get a meaningful title from the summary content using the utility function
-            extracted_title = extract_summary_title(analysis_result)
+            # Parse the analysis result (memoized, so reruns do not parse it again)
+            parsed_result = parse_analysis(analysis_result)
+            extracted_title = parsed_result.title
 
             # Use the stored analysis timestamp if available, otherwise use current time
             current_time = get_local_time()
@@ -171,25 +189,119 @@ def render_notion_section(ui_text, analysis_result=None):
                 key="notion_page_title_input"
             )
 
-            # Send button
+            # Send button - the export is queued and sent by the background outbox worker
+            outbox = get_notion_outbox()
+            outbox.register_credentials(user_id, notion_api_key, notion_database_id)
+
             if st.button(ui_text["notion_send_button"], key="notion_send_button"):
                 if not notion_api_key or not notion_database_id:
                     st.error("Please enter both Notion API Key and Database ID")
                 else:
-                    with st.spinner("Sending to Notion..."):
-                        result = notion.create_page_with_analysis(
-                            title=notion_page_title,
-                            summary=parsed_result["summary"],
-                            todo_list=parsed_result["todo_list"]
-                        )
-
-                        if result["success"]:
-                            st.success(ui_text["notion_send_success"])
-
-                            # Add a link to view the page in Notion
-                            if "url" in result and result["url"]:
-                                st.markdown(f"[{ui_text['notion_view_in_notion']}]({result['url']})")
-                        else:
-                            st.error(f"{ui_text['notion_send_failed']}: {result.get('message', '')}")
+                    outbox.enqueue(
+                        owner=user_id,
+                        api_key=notion_api_key,
+                        database_id=notion_database_id,
+                        title=notion_page_title,
+                        summary=parsed_result.summary,
+                        todo_list=parsed_result.todo_list,
+                        source_key=make_source_key(chat_input) if chat_input else None
+                    )
+                    st.success(ui_text["notion_send_queued"])
+
+            if notion_database_id:
+                render_outbox_status(ui_text, outbox, user_id, notion_database_id)
         else:
             st.info(ui_text["notion_no_analysis"])
+
+        # Bulk export of the whole usage history
+        if history_items:
+            render_bulk_export(ui_text, notion, history_items)
+
+def render_outbox_status(ui_text, outbox, user_id, database_id):
+    """
+    Render the state of recent queued Notion exports.
+
+    Args:
+        ui_text: Dictionary containing UI text in the current language
+        outbox: The NotionOutbox the exports were queued in
+        user_id: Only show exports queued by this user
+        database_id: Only show exports to this database
+    """
+    items = outbox.list_items(user_id, database_id=database_id, limit=5)
+    if not items:
+        return
+
+    st.markdown(f"**{ui_text['notion_outbox_header']}**")
+    status_labels = {
+        "queued": ui_text["notion_outbox_queued"],
+        "sending": ui_text["notion_outbox_sending"],
+        "sent": ui_text["notion_send_success"],
+        "failed": ui_text["notion_send_failed"],
+    }
+    for item in items:
+        label = status_labels.get(item["status"], item["status"])
+        if item["status"] == "sent" and item["url"]:
+            st.markdown(f"{label} · {item['title']} · [{ui_text['notion_view_in_notion']}]({item['url']})")
+        elif item["last_error"]:
+            st.markdown(f"{label} · {item['title']}")
+            st.caption(item["last_error"])
+        else:
+            st.markdown(f"{label} · {item['title']}")
+
+    col_refresh, col_retry = st.columns(2)
+    with col_refresh:
+        st.button(ui_text["notion_outbox_refresh"], key="notion_outbox_refresh_button")
+    with col_retry:
+        if any(item["status"] == "failed" for item in items):
+            if st.button(ui_text["notion_outbox_retry"], key="notion_outbox_retry_button"):
+                outbox.retry_failed(user_id, database_id)
+                st.rerun()
+
+def render_bulk_export(ui_text, notion, history_items):
+    """
+    Render the bulk export of the usage history to Notion.
+
+    Args:
+        ui_text: Dictionary containing UI text in the current language
+        notion: Configured NotionIntegration instance
+        history_items: Usage history items to export
+    """
+    st.markdown("---")
+
+    # Items that failed in the previous bulk export, kept so they can be retried
+    failed_items = st.session_state.get("notion_bulk_failed", [])
+
+    export_all = st.button(
+        ui_text["notion_bulk_export_button"].format(count=len(history_items)),
+        key="notion_bulk_export_button"
+    )
+    retry_failed = bool(failed_items) and st.button(
+        ui_text["notion_bulk_retry_button"].format(count=len(failed_items)),
+        key="notion_bulk_retry_button"
+    )
+
+    if not (export_all or retry_failed):
+        return
+
+    if not notion.api_key or not notion.database_id:
+        st.error("Please enter both Notion API Key and Database ID")
+        return
+
+    items = list(history_items) if export_all else failed_items
+    progress_bar = st.progress(0, text=ui_text["notion_bulk_progress"].format(done=0, total=len(items)))
+
+    def update_progress(done, total, result):
+        progress_bar.progress(done / total, text=ui_text["notion_bulk_progress"].format(done=done, total=total))
+
+    results = notion.export_history(items, on_item_done=update_progress)
+
+    failed = [(item, result) for item, result in zip(items, results) if not result.get("success")]
+    st.session_state["notion_bulk_failed"] = [item for item, _ in failed]
+
+    succeeded = len(items) - len(failed)
+    if failed:
+        st.warning(ui_text["notion_bulk_partial"].format(succeeded=succeeded, failed=len(failed)))
+        for item, result in failed:
+            st.error(f"{item.get('title', '')}: {result.get('message', '')}")
+    else:
+        st.success(ui_text["notion_bulk_success"].format(count=succeeded))
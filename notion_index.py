@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+DEFAULT_INDEX_PATH = os.getenv("NOTION_INDEX_PATH", os.path.join(".cache", "notion_index.sqlite3"))
+
+def hash_content(value: Any) -> str:
+    """Hash any JSON-serializable value deterministically."""
+    encoded = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def make_source_key(transcript: str) -> str:
+    """Build the source key of an analysis from the transcript it was made from."""
+    return hash_content({"transcript": (transcript or "").strip()})
+
+class NotionPageIndex:
+    """
+    Local index of analyses already exported to Notion.
+
+    Maps (database ID, source key) to the page created for it, together with the
+    hashes of the exported page properties, of the whole content and of each block
+    (stored as "type:hash"), so unchanged analyses can be skipped and changed ones
+    updated block by block.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS notion_pages (
+                    database_id TEXT NOT NULL,
+                    source_key TEXT NOT NULL,
+                    page_id TEXT NOT NULL,
+                    url TEXT,
+                    properties_hash TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    block_hashes TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (database_id, source_key)
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def get(self, database_id: str, source_key: str) -> Optional[Dict[str, Any]]:
+        """Get the indexed page for an analysis, or None if it was never exported."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM notion_pages WHERE database_id = ? AND source_key = ?",
+                (database_id, source_key)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["block_hashes"] = json.loads(entry["block_hashes"])
+        return entry
+
+    def put(self, database_id: str, source_key: str, page_id: str, url: str,
+            properties_hash: str, content_hash: str, block_hashes: List[str]) -> None:
+        """Record the page and content exported for an analysis."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO notion_pages
+                    (database_id, source_key, page_id, url, properties_hash, content_hash, block_hashes, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (database_id, source_key, page_id, url, properties_hash, content_hash, json.dumps(block_hashes), time.time())
+            )
+
+    def delete(self, database_id: str, source_key: str) -> None:
+        """Forget the page of an analysis (e.g. after it was deleted in Notion)."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM notion_pages WHERE database_id = ? AND source_key = ?",
+                (database_id, source_key)
+            )
+
+_index: Optional[NotionPageIndex] = None
+_index_lock = threading.Lock()
+
+def get_notion_page_index() -> NotionPageIndex:
+    """Get the shared Notion page index for this process."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NotionPageIndex()
+    return _index
@@ -1,9 +1,66 @@
 import os
-import requests
 import json
+import time
+import threading
+import requests
 import streamlit as st
 import datetime
-from typing import Dict, Any, Optional, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Any, Optional, List, Tuple
+
+from analysis_parser import parse_analysis, parse_todo_lines
+from http_client import get_http_client
+from notion_index import NotionPageIndex, get_notion_page_index, hash_content, make_source_key
+from rate_limiter import RETRYABLE_STATUS_CODES, TokenBucket, backoff_delay, parse_retry_after
+
+# 資料庫結構（屬性類型與狀態選項）快取的存活秒數
+SCHEMA_CACHE_TTL = int(os.getenv("NOTION_SCHEMA_CACHE_TTL", "600"))
+
+# API 基底網址，可指向本機的 mock_server.py
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL", "https://api.notion.com/v1").rstrip("/")
+
+# Notion API 的長度限制：每個文字物件 2000 字元、每個 rich_text 陣列 100 個物件、每次請求 100 個區塊
+NOTION_MAX_TEXT_LENGTH = 2000
+NOTION_MAX_RICH_TEXT_ITEMS = 100
+NOTION_MAX_BLOCKS_PER_REQUEST = 100
+
+# Notion API 平均每秒約可接受 3 個請求；整個程序（包含背景匯出佇列）共用此限制
+NOTION_REQUESTS_PER_SECOND = float(os.getenv("NOTION_REQUESTS_PER_SECOND", "3"))
+
+# 批次匯出時同時進行的請求數與每個項目的重試次數
+BULK_EXPORT_WORKERS = 3
+BULK_EXPORT_MAX_RETRIES = 3
+
+# 以 (API key, 資料庫 ID) 為鍵的資料庫結構快取，整個程序共用
+_schema_cache: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_schema_cache_lock = threading.Lock()
+
+# 所有 Notion 請求共用的速率限制（每個 HTTP 請求取用一個額度）
+_request_bucket: Optional[TokenBucket] = None
+_request_bucket_lock = threading.Lock()
+
+def get_notion_rate_limiter() -> TokenBucket:
+    """Get the process-wide bucket pacing every request sent to the Notion API."""
+    global _request_bucket
+    if _request_bucket is None:
+        with _request_bucket_lock:
+            if _request_bucket is None:
+                _request_bucket = TokenBucket(NOTION_REQUESTS_PER_SECOND * 60, burst=NOTION_REQUESTS_PER_SECOND)
+    return _request_bucket
+
+def invalidate_schema_cache(database_id: Optional[str] = None) -> None:
+    """
+    Drop cached database schemas.
+
+    Args:
+        database_id: Only drop the schema of this database (optional, drops all if omitted)
+    """
+    with _schema_cache_lock:
+        if database_id is None:
+            _schema_cache.clear()
+        else:
+            for key in [key for key in _schema_cache if key[1] == database_id]:
+                del _schema_cache[key]
 
 # 獲取本地時區的時間
 def get_local_time():
@@ -12,23 +69,73 @@ def get_local_time():
     local_tz = datetime.datetime.now().astimezone().tzinfo
     return datetime.datetime.now(local_tz)
 
+def split_text(content: str, limit: int = NOTION_MAX_TEXT_LENGTH) -> List[str]:
+    """Split text into runs of at most limit characters, preferring line breaks."""
+    runs = []
+    while len(content) > limit:
+        cut = content.rfind("\n", limit // 2, limit)
+        cut = cut + 1 if cut != -1 else limit
+        runs.append(content[:cut])
+        content = content[cut:]
+    if content or not runs:
+        runs.append(content)
+    return runs
+
+def build_rich_text(content: str) -> List[Dict[str, Any]]:
+    """Build a rich_text array for arbitrarily long text (within one block's limits)."""
+    return [{"type": "text", "text": {"content": run}} for run in split_text(content)]
+
+def build_text_blocks(block_type: str, content: str, **extra) -> List[Dict[str, Any]]:
+    """
+    Build one or more blocks of the given type holding the content.
+
+    Text longer than one block can hold is continued in additional blocks.
+    """
+    runs = split_text(content)
+    blocks = []
+    for start in range(0, len(runs), NOTION_MAX_RICH_TEXT_ITEMS):
+        rich_text = [
+            {"type": "text", "text": {"content": run}}
+            for run in runs[start:start + NOTION_MAX_RICH_TEXT_ITEMS]
+        ]
+        blocks.append({
+            "object": "block",
+            "type": block_type,
+            block_type: dict(rich_text=rich_text, **extra)
+        })
+    return blocks
+
+def build_analysis_blocks(summary: str, todo_list: str) -> List[Dict[str, Any]]:
+    """Build the page blocks for an analysis: summary heading and text, then to-do items."""
+    blocks = build_text_blocks("heading_2", "摘要")
+    blocks += build_text_blocks("paragraph", summary)
+    blocks += build_text_blocks("heading_2", "待辦事項")
+
+    # Add the to-do items as to-do blocks
+    for todo in parse_todo_lines(todo_list):
+        blocks += build_text_blocks("to_do", todo.text, checked=todo.checked)
+
+    return blocks
+
 class NotionIntegration:
     """
     A class to handle integration with Notion API.
     This allows sending analysis results directly to a Notion database.
     """
 
-    def __init__(self, api_key: Optional[str] = None, database_id: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, database_id: Optional[str] = None,
+                 base_url: Optional[str] = None):
         """
         Initialize the Notion integration with API key and database ID.
 
         Args:
             api_key: Notion API key (optional, can be set later)
             database_id: Notion database ID (optional, can be set later)
+            base_url: API base URL (defaults to NOTION_BASE_URL)
         """
         self.api_key = api_key
         self.database_id = database_id
-        self.base_url = "https://api.notion.com/v1"
+        self.base_url = (base_url or NOTION_BASE_URL).rstrip("/")
         self.version = "2022-06-28"  # Notion API version
 
     def set_api_key(self, api_key: str) -> None:
@@ -51,6 +158,23 @@ class NotionIntegration:
             "Notion-Version": self.version
         }
 
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        Send a request to the Notion API under the process-wide rate limit.
+
+        A 429 response empties the shared bucket for its Retry-After delay, so
+        every thread and the export outbox back off together.
+        """
+        bucket = get_notion_rate_limiter()
+        bucket.acquire(1)
+        response = get_http_client().request(
+            method, f"{self.base_url}/{path}", headers=self.get_headers(), **kwargs
+        )
+        if response.status_code == 429:
+            delay = parse_retry_after(response.headers) or 1.0
+            bucket.sync(remaining=-delay * bucket.rate_per_minute / 60.0)
+        return response
+
     def test_connection(self) -> Dict[str, Any]:
         """
         Test the connection to Notion API.
@@ -63,9 +187,8 @@ class NotionIntegration:
 
         try:
             # Try to get the user's information as a simple test
-            response = requests.get(
-                f"{self.base_url}/users/me",
-                headers=self.get_headers()
+            response = self._request(
+                "GET", f"users/me"
             )
 
             if response.status_code == 200:
@@ -78,29 +201,44 @@ class NotionIntegration:
         except Exception as e:
             return {"success": False, "message": f"Error connecting to Notion API: {str(e)}"}
 
-    def get_database_info(self) -> Dict[str, Any]:
+    def get_database_info(self, refresh: bool = False) -> Dict[str, Any]:
         """
         Get information about the Notion database.
 
+        The schema is cached per database for SCHEMA_CACHE_TTL seconds, so repeated
+        calls do not hit the Notion API.
+
+        Args:
+            refresh: Ignore the cached schema and fetch it again
+
         Returns:
             Dict containing database information or error message
         """
         if not self.api_key or not self.database_id:
             return {"success": False, "message": "Notion API key or database ID is not set"}
 
+        cache_key = (self.api_key, self.database_id)
+        if not refresh:
+            with _schema_cache_lock:
+                cached = _schema_cache.get(cache_key)
+            if cached and time.monotonic() - cached["fetched_at"] < SCHEMA_CACHE_TTL:
+                return cached["info"]
+
         try:
-            response = requests.get(
-                f"{self.base_url}/databases/{self.database_id}",
-                headers=self.get_headers()
+            response = self._request(
+                "GET", f"databases/{self.database_id}"
             )
 
             if response.status_code == 200:
                 data = response.json()
-                return {
+                info = {
                     "success": True,
                     "title": data.get("title", [{}])[0].get("plain_text", "Untitled"),
                     "properties": data.get("properties", {})
                 }
+                with _schema_cache_lock:
+                    _schema_cache[cache_key] = {"info": info, "fetched_at": time.monotonic()}
+                return info
             else:
                 return {
                     "success": False,
@@ -139,7 +277,9 @@ class NotionIntegration:
             todo_list: To-do list text from analysis
 
         Returns:
-            Dict containing success status and message
+            Dict containing success status and message. Once the page exists it also
+            contains page_id, url and blocks_created, the number of leading blocks
+            added, even if appending the rest failed
         """
         if not self.api_key or not self.database_id:
             return {"success": False, "message": "Notion API key or database ID is not set"}
@@ -159,13 +299,7 @@ class NotionIntegration:
                 "parent": {"database_id": self.database_id},
                 "properties": {
                     "任務名稱": {  # title type
-                        "title": [
-                            {
-                                "text": {
-                                    "content": title
-                                }
-                            }
-                        ]
+                        "title": build_rich_text(title)
                     },
                     "狀態": {  # status type
                         "status": {
@@ -187,30 +321,7 @@ class NotionIntegration:
                             }
                         ]
                     }
-                },
-                "children": [
-                    {
-                        "object": "block",
-                        "type": "heading_2",
-                        "heading_2": {
-                            "rich_text": [{"type": "text", "text": {"content": "摘要"}}]
-                        }
-                    },
-                    {
-                        "object": "block",
-                        "type": "paragraph",
-                        "paragraph": {
-                            "rich_text": [{"type": "text", "text": {"content": summary}}]
-                        }
-                    },
-                    {
-                        "object": "block",
-                        "type": "heading_2",
-                        "heading_2": {
-                            "rich_text": [{"type": "text", "text": {"content": "待辦事項"}}]
-                        }
-                    }
-                ]
+                }
             }
 
             # Add task description (text type)
@@ -218,54 +329,334 @@ class NotionIntegration:
                 "rich_text": [
                     {
                         "text": {
-                            "content": summary[:2000] if summary else ""  # Limit to 2000 chars
+                            "content": summary[:NOTION_MAX_TEXT_LENGTH] if summary else ""  # Limit to 2000 chars
                         }
                     }
                 ]
             }
 
-            # Parse to-do list items and add them as to-do blocks
-            if todo_list:
-                todo_items = todo_list.strip().split('\n')
-                for item in todo_items:
-                    if item.strip().startswith('- [ ]') or item.strip().startswith('- [x]'):
-                        # Extract the task content
-                        is_checked = item.strip().startswith('- [x]')
-                        task_content = item.strip()[5:].strip()  # Remove "- [ ]" or "- [x]"
-
-                        # Add to-do block
-                        todo_block = {
-                            "object": "block",
-                            "type": "to_do",
-                            "to_do": {
-                                "rich_text": [{"type": "text", "text": {"content": task_content}}],
-                                "checked": is_checked
-                            }
-                        }
-                        payload["children"].append(todo_block)
+            # Notion accepts at most 100 children when creating a page;
+            # the rest are appended to the page afterwards
+            blocks = build_analysis_blocks(summary, todo_list)
+            payload["children"] = blocks[:NOTION_MAX_BLOCKS_PER_REQUEST]
 
-            response = requests.post(
-                f"{self.base_url}/pages",
-                headers=self.get_headers(),
+            response = self._request(
+                "POST", f"pages",
                 data=json.dumps(payload)
             )
 
             if response.status_code in [200, 201]:
                 data = response.json()
-                return {
+                result = {
                     "success": True,
                     "message": "Successfully created page in Notion",
                     "page_id": data.get("id", ""),
                     "url": data.get("url", "")
                 }
+
+                result["blocks_created"] = len(payload["children"])
+                remaining_blocks = blocks[NOTION_MAX_BLOCKS_PER_REQUEST:]
+                if remaining_blocks:
+                    appended = self.append_blocks(result["page_id"], remaining_blocks)
+                    result["blocks_created"] += appended["appended"]
+                    if not appended["success"]:
+                        result.update(
+                            success=False,
+                            message=f"Page created but some content could not be added: {appended['message']}",
+                            status_code=appended.get("status_code")
+                        )
+                return result
             else:
+                # 資料庫結構可能已被修改（例如狀態選項被刪除），下次重新取得
+                if response.status_code == 400:
+                    invalidate_schema_cache(self.database_id)
                 return {
                     "success": False,
-                    "message": f"Failed to create page: {response.status_code} - {response.text}"
+                    "message": f"Failed to create page: {response.status_code} - {response.text}",
+                    "status_code": response.status_code
                 }
         except Exception as e:
             return {"success": False, "message": f"Error creating page: {str(e)}"}
 
+    def append_blocks(self, block_id: str, blocks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Append blocks to a page or block, in batches of at most 100 per request.
+
+        Args:
+            block_id: ID of the page or block to append to
+            blocks: Blocks to append, in order
+
+        Returns:
+            Dict containing success status, message and the number of blocks appended
+        """
+        appended = 0
+        try:
+            for start in range(0, len(blocks), NOTION_MAX_BLOCKS_PER_REQUEST):
+                batch = blocks[start:start + NOTION_MAX_BLOCKS_PER_REQUEST]
+                response = self._request(
+                    "PATCH", f"blocks/{block_id}/children",
+                    data=json.dumps({"children": batch})
+                )
+                if response.status_code != 200:
+                    return {
+                        "success": False,
+                        "message": f"Failed to append blocks: {response.status_code} - {response.text}",
+                        "status_code": response.status_code,
+                        "appended": appended
+                    }
+                appended += len(batch)
+        except Exception as e:
+            return {"success": False, "message": f"Error appending blocks: {str(e)}", "appended": appended}
+
+        return {"success": True, "message": f"Appended {appended} blocks", "appended": appended}
+
+    def list_child_block_ids(self, block_id: str) -> Dict[str, Any]:
+        """
+        List the IDs of the child blocks of a page or block, following pagination.
+
+        Returns:
+            Dict containing success status and the block IDs in order, or an error message
+        """
+        block_ids: List[str] = []
+        params: Dict[str, Any] = {"page_size": NOTION_MAX_BLOCKS_PER_REQUEST}
+        while True:
+            response = self._request(
+                "GET", f"blocks/{block_id}/children",
+                params=params
+            )
+            if response.status_code != 200:
+                return {
+                    "success": False,
+                    "message": f"Failed to list blocks: {response.status_code} - {response.text}",
+                    "status_code": response.status_code
+                }
+            data = response.json()
+            block_ids.extend(block["id"] for block in data.get("results", []))
+            if not data.get("has_more"):
+                return {"success": True, "block_ids": block_ids}
+            params["start_cursor"] = data.get("next_cursor")
+
+    def upsert_page_with_analysis(self, title: str, summary: str, todo_list: str,
+                                  source_key: Optional[str] = None,
+                                  page_index: Optional[NotionPageIndex] = None) -> Dict[str, Any]:
+        """
+        Create or update the Notion page of an analysis without creating duplicates.
+
+        The local page index maps source_key to the page exported for it. If the
+        content is unchanged nothing is sent; if it changed, only the page
+        properties and blocks that differ are updated in place.
+
+        Args:
+            title: Title for the page
+            summary: Summary text from analysis
+            todo_list: To-do list text from analysis
+            source_key: Stable key of the analysis, e.g. a hash of its transcript
+                (optional, defaults to the content hash so identical analyses are deduplicated)
+            page_index: Index of exported pages (defaults to the shared local index)
+
+        Returns:
+            Dict containing success status, message, page_id, url, and whether the
+            page was skipped or updated
+        """
+        if not self.api_key or not self.database_id:
+            return {"success": False, "message": "Notion API key or database ID is not set"}
+
+        page_index = page_index or get_notion_page_index()
+        blocks = build_analysis_blocks(summary, todo_list)
+        block_hashes = [f"{block['type']}:{hash_content(block)}" for block in blocks]
+        properties_hash = hash_content({"title": title, "summary": summary[:NOTION_MAX_TEXT_LENGTH]})
+        content_hash = hash_content({"properties": properties_hash, "blocks": block_hashes})
+        source_key = source_key or content_hash
+
+        entry = page_index.get(self.database_id, source_key)
+        if entry and entry["content_hash"] == content_hash:
+            return {
+                "success": True,
+                "message": "Page is already up to date in Notion",
+                "page_id": entry["page_id"],
+                "url": entry["url"],
+                "skipped": True
+            }
+
+        if entry:
+            result = self._update_page_blocks(entry, title, summary, blocks, block_hashes, properties_hash)
+            if result.get("status_code") != 404:
+                if result["success"]:
+                    page_index.put(
+                        self.database_id, source_key, entry["page_id"], entry["url"],
+                        properties_hash, content_hash, block_hashes
+                    )
+                return result
+            # 頁面已在 Notion 中被刪除，改為重新建立
+            page_index.delete(self.database_id, source_key)
+
+        result = self.create_page_with_analysis(title, summary, todo_list)
+        if result["success"]:
+            page_index.put(
+                self.database_id, source_key, result["page_id"], result["url"],
+                properties_hash, content_hash, block_hashes
+            )
+        elif result.get("page_id"):
+            # 頁面已建立但附加其餘區塊失敗：只記錄已送出的區塊，重試時補齊這個頁面而不是再建立一個
+            sent_hashes = block_hashes[:result["blocks_created"]]
+            page_index.put(
+                self.database_id, source_key, result["page_id"], result["url"], properties_hash,
+                hash_content({"properties": properties_hash, "blocks": sent_hashes}), sent_hashes
+            )
+        return result
+
+    def _update_page_blocks(self, entry: Dict[str, Any], title: str, summary: str,
+                            blocks: List[Dict[str, Any]], block_hashes: List[str],
+                            properties_hash: str) -> Dict[str, Any]:
+        """Bring an existing page in line with the new content, touching only what changed."""
+        page_id = entry["page_id"]
+        result = {
+            "success": True,
+            "message": "Successfully updated page in Notion",
+            "page_id": page_id,
+            "url": entry["url"],
+            "updated": True
+        }
+
+        try:
+            if entry["properties_hash"] != properties_hash:
+                response = self._request(
+                    "PATCH", f"pages/{page_id}",
+                    data=json.dumps({"properties": {
+                        "任務名稱": {"title": build_rich_text(title)},
+                        "任務說明": {"rich_text": build_rich_text(summary[:NOTION_MAX_TEXT_LENGTH])}
+                    }})
+                )
+                if response.status_code != 200:
+                    return {
+                        "success": False,
+                        "message": f"Failed to update page: {response.status_code} - {response.text}",
+                        "status_code": response.status_code
+                    }
+
+            old_hashes = entry["block_hashes"]
+            if old_hashes == block_hashes:
+                return result
+
+            listed = self.list_child_block_ids(page_id)
+            if not listed["success"]:
+                return listed
+            block_ids = listed["block_ids"]
+
+            # 頁面內容在 Notion 中被手動修改過時，無法對應舊區塊，改為整頁替換
+            if len(block_ids) != len(old_hashes):
+                old_hashes = [""] * len(block_ids)
+
+            # 跳過相同的區塊，原地更新類型相同但內容不同的區塊
+            position = 0
+            while position < min(len(old_hashes), len(block_hashes)):
+                old_type = old_hashes[position].split(":", 1)[0]
+                block = blocks[position]
+                if old_hashes[position] != block_hashes[position]:
+                    if old_type != block["type"]:
+                        break
+                    response = self._request(
+                        "PATCH", f"blocks/{block_ids[position]}",
+                        data=json.dumps({block["type"]: block[block["type"]]})
+                    )
+                    if response.status_code != 200:
+                        return {
+                            "success": False,
+                            "message": f"Failed to update block: {response.status_code} - {response.text}",
+                            "status_code": response.status_code
+                        }
+                position += 1
+
+            # 刪除其餘的舊區塊，再把其餘的新區塊附加到頁面末尾
+            for block_id in block_ids[position:]:
+                response = self._request(
+                    "DELETE", f"blocks/{block_id}"
+                )
+                if response.status_code != 200:
+                    return {
+                        "success": False,
+                        "message": f"Failed to delete block: {response.status_code} - {response.text}",
+                        "status_code": response.status_code
+                    }
+
+            if blocks[position:]:
+                appended = self.append_blocks(page_id, blocks[position:])
+                if not appended["success"]:
+                    return appended
+        except Exception as e:
+            return {"success": False, "message": f"Error updating page: {str(e)}"}
+
+        return result
+
+    def export_history(self, history_items: List[Dict[str, Any]],
+                       max_workers: int = BULK_EXPORT_WORKERS,
+                       max_retries: int = BULK_EXPORT_MAX_RETRIES,
+                       on_item_done: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Create a Notion page for every analysis in the usage history.
+
+        Pages are upserted concurrently; every HTTP request goes through the
+        process-wide Notion rate limit (see get_notion_rate_limiter), which is shared
+        with the export outbox. Items already exported unchanged are skipped.
+        Rate-limited and transient failures are retried with backoff; other
+        failures are reported per item.
+
+        Args:
+            history_items: Usage history items with title, timestamp and analysis_result
+            max_workers: Maximum number of pages created at the same time
+            max_retries: Retries per item for rate-limited or transient failures
+            on_item_done: Called with (items_done, items_total, result) after each item (optional)
+
+        Returns:
+            List of per-item results in the same order as history_items, each with
+            success status, message and the page URL when successful
+        """
+        def export(item: Dict[str, Any]) -> Dict[str, Any]:
+            # History items carry their parsed result; parse only if it is missing
+            parsed = item.get("parsed") or parse_analysis(item.get("analysis_result"))
+            title = f"{item.get('title', 'Untitled Analysis')} ({item.get('timestamp', '')})"
+            for attempt in range(max_retries + 1):
+                result = self.upsert_page_with_analysis(
+                    title=title,
+                    summary=parsed.summary,
+                    todo_list=parsed.todo_list,
+                    source_key=make_source_key(item["chat_input"]) if item.get("chat_input") else None
+                )
+                status_code = result.get("status_code")
+                retryable = status_code in RETRYABLE_STATUS_CODES or (
+                    not result["success"] and status_code is None
+                )
+                if result["success"] or not retryable or attempt == max_retries:
+                    break
+                time.sleep(backoff_delay(attempt))
+            result["attempts"] = attempt + 1
+            return result
+
+        if not self.api_key or not self.database_id:
+            return [
+                {"success": False, "message": "Notion API key or database ID is not set"}
+                for _ in history_items
+            ]
+
+        total = len(history_items)
+        results: List[Dict[str, Any]] = [{} for _ in history_items]
+        if not total:
+            return results
+
+        # 先取得一次資料庫結構，避免每個執行緒各自發出同樣的請求
+        self.get_database_info()
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as executor:
+            futures = {executor.submit(export, item): i for i, item in enumerate(history_items)}
+            done = 0
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                done += 1
+                if on_item_done:
+                    on_item_done(done, total, results[index])
+        return results
+
 # Helper functions for Streamlit UI
 def get_notion_credentials_from_secrets() -> Dict[str, Optional[str]]:
     """Get Notion credentials from Streamlit secrets."""
@@ -296,22 +687,8 @@ def parse_analysis_result(result_text: str) -> Dict[str, str]:
     Returns:
         Dict containing summary and todo_list
     """
-    summary = ""
-    todo_list = ""
-
-    # Split by sections
-    sections = result_text.split("##")
-
-    for section in sections:
-        if "📌" in section or "Summary" in section or "摘要" in section:
-            summary = section.split("\n", 1)[1].strip() if "\n" in section else ""
-        elif "✅" in section or "To-Do" in section or "待辦" in section:
-            todo_list = section.split("\n", 1)[1].strip() if "\n" in section else ""
-
-    # Format todo_list for better display in Notion
-    # We'll do the actual replacement of "- [ ]" to "/[ ]" in the create_page_with_analysis method
-
+    parsed = parse_analysis(result_text)
     return {
-        "summary": summary,
-        "todo_list": todo_list
+        "summary": parsed.summary,
+        "todo_list": parsed.todo_list
     }
@@ -0,0 +1,333 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Tuple
+
+from notion_integration import NotionIntegration
+from rate_limiter import RETRYABLE_STATUS_CODES
+
+logger = logging.getLogger(__name__)
+
+# 匯出佇列設定，可透過環境變數覆寫
+DEFAULT_OUTBOX_PATH = os.getenv("NOTION_OUTBOX_PATH", os.path.join(".cache", "notion_outbox.sqlite3"))
+MAX_ATTEMPTS = int(os.getenv("NOTION_OUTBOX_MAX_ATTEMPTS", "8"))
+RETRY_BASE_SECONDS = 5.0
+RETRY_MAX_SECONDS = 600.0
+CLAIM_BATCH_SIZE = 200  # 每次查詢比對的憑證數，避免超過 SQLite 的參數數量上限
+CREDENTIAL_IDLE_SECONDS = 3600.0  # 沒有待發送項目的憑證超過此時間未重新登記即從記憶體移除
+
+STATUS_QUEUED = "queued"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+class NotionOutbox:
+    """
+    A durable queue of Notion exports drained by a background worker thread.
+
+    Exports are written to SQLite before anything is sent, so they survive Notion
+    outages and app restarts. The worker retries transient failures with
+    exponential backoff and records the resulting page URL or the last error.
+
+    Items belong to the user who queued them. API keys are never written to
+    disk: they are held in memory per (user, database), and the worker only
+    sends an item with the key its own user registered. After a restart, queued
+    items therefore wait until their user opens the Notion section again with
+    the same credentials. Keys with nothing left to send are forgotten after
+    CREDENTIAL_IDLE_SECONDS, so long-running processes do not accumulate them.
+    """
+
+    def __init__(self, path: str = DEFAULT_OUTBOX_PATH, max_attempts: int = MAX_ATTEMPTS):
+        """
+        Initialize the outbox and recover items interrupted by a previous shutdown.
+
+        Args:
+            path: SQLite file holding the queue
+            max_attempts: Attempts before an item is marked as failed
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self._credentials: Dict[Tuple[str, str], str] = {}  # (使用者, 資料庫 ID) -> API key
+        self._registered_at: Dict[Tuple[str, str], float] = {}
+        self._pruned_at = time.time()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS notion_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    owner TEXT NOT NULL DEFAULT '',
+                    database_id TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    todo_list TEXT NOT NULL,
+                    source_key TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    page_id TEXT,
+                    url TEXT,
+                    last_error TEXT
+                )
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(notion_outbox)")}
+            if "source_key" not in columns:
+                conn.execute("ALTER TABLE notion_outbox ADD COLUMN source_key TEXT")
+            if "owner" not in columns:
+                # 舊版建立的項目沒有擁有者，不會再被任何使用者的憑證發送
+                conn.execute("ALTER TABLE notion_outbox ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_notion_outbox_due ON notion_outbox (status, next_attempt_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_notion_outbox_owner ON notion_outbox (owner, database_id, id)"
+            )
+            # 上次關閉時正在發送的項目重新排入佇列
+            conn.execute(
+                "UPDATE notion_outbox SET status = ? WHERE status = ?", (STATUS_QUEUED, STATUS_SENDING)
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def register_credentials(self, owner: str, api_key: str, database_id: str) -> None:
+        """Make a user's API key available to the worker for that user's exports to the given database."""
+        if owner and api_key and database_id:
+            with self._lock:
+                self._credentials[(owner, database_id)] = api_key
+                self._registered_at[(owner, database_id)] = time.time()
+            self._wakeup.set()
+
+    def enqueue(self, owner: str, api_key: str, database_id: str, title: str, summary: str, todo_list: str,
+                source_key: Optional[str] = None) -> int:
+        """
+        Queue an export and return immediately.
+
+        Args:
+            owner: ID of the user queuing the export
+            source_key: Stable key of the analysis used to update its existing page
+                instead of creating a duplicate (optional)
+
+        Returns:
+            ID of the queued item
+        """
+        self.register_credentials(owner, api_key, database_id)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO notion_outbox
+                    (owner, database_id, title, summary, todo_list, source_key, status,
+                     next_attempt_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (owner, database_id, title, summary or "", todo_list or "", source_key, STATUS_QUEUED,
+                 now, now, now)
+            )
+            item_id = cursor.lastrowid
+        self.start()
+        self._wakeup.set()
+        return item_id
+
+    def retry_failed(self, owner: str, database_id: Optional[str] = None) -> int:
+        """
+        Queue a user's failed items again.
+
+        Returns:
+            Number of items re-queued
+        """
+        query = "UPDATE notion_outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE status = ? AND owner = ?"
+        params: List[Any] = [STATUS_QUEUED, time.time(), STATUS_FAILED, owner]
+        if database_id:
+            query += " AND database_id = ?"
+            params.append(database_id)
+        with closing(self._connect()) as conn, conn:
+            count = conn.execute(query, params).rowcount
+        self._wakeup.set()
+        return count
+
+    def list_items(self, owner: str, database_id: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get a user's most recent items with their status, newest first."""
+        query = (
+            "SELECT id, database_id, title, status, attempts, url, last_error, created_at FROM notion_outbox"
+            " WHERE owner = ?"
+        )
+        params: List[Any] = [owner]
+        if database_id:
+            query += " AND database_id = ?"
+            params.append(database_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with closing(self._connect()) as conn:
+            return [dict(row) for row in conn.execute(query, params)]
+
+    def get_item(self, item_id: int) -> Optional[Dict[str, Any]]:
+        """Get a single item by ID."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM notion_outbox WHERE id = ?", (item_id,)).fetchone()
+        return dict(row) if row else None
+
+    def start(self) -> None:
+        """Start the background worker if it is not running."""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run, name="notion-outbox", daemon=True)
+                self._worker.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the background worker."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        """Mark the next due item with known credentials as sending and return it."""
+        with self._lock:
+            registered = list(self._credentials)
+        if not registered:
+            return None
+
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            # 憑證分批比對，取各批中最早到期的項目
+            candidates = []
+            for start in range(0, len(registered), CLAIM_BATCH_SIZE):
+                batch = registered[start:start + CLAIM_BATCH_SIZE]
+                conditions = " OR ".join("(owner = ? AND database_id = ?)" for _ in batch)
+                row = conn.execute(
+                    f"""
+                    SELECT * FROM notion_outbox
+                    WHERE status = ? AND next_attempt_at <= ? AND ({conditions})
+                    ORDER BY next_attempt_at, id LIMIT 1
+                    """,
+                    [STATUS_QUEUED, now] + [value for pair in batch for value in pair]
+                ).fetchone()
+                if row is not None:
+                    candidates.append(row)
+            if not candidates:
+                return None
+            row = min(candidates, key=lambda candidate: (candidate["next_attempt_at"], candidate["id"]))
+            conn.execute(
+                "UPDATE notion_outbox SET status = ?, updated_at = ? WHERE id = ?",
+                (STATUS_SENDING, time.time(), row["id"])
+            )
+        return dict(row)
+
+    def _prune_credentials(self) -> None:
+        """Forget API keys that have no queued items and were not registered again recently."""
+        now = time.time()
+        if now - self._pruned_at < CREDENTIAL_IDLE_SECONDS:
+            return
+        self._pruned_at = now
+        with closing(self._connect()) as conn:
+            pending = {
+                (row["owner"], row["database_id"]) for row in conn.execute(
+                    "SELECT DISTINCT owner, database_id FROM notion_outbox WHERE status IN (?, ?)",
+                    (STATUS_QUEUED, STATUS_SENDING)
+                )
+            }
+        with self._lock:
+            for pair, registered_at in list(self._registered_at.items()):
+                if pair not in pending and now - registered_at >= CREDENTIAL_IDLE_SECONDS:
+                    del self._credentials[pair]
+                    del self._registered_at[pair]
+
+    def _next_due_in(self) -> float:
+        """Seconds until the next queued item is due, capped so new credentials are noticed."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM notion_outbox WHERE status = ?", (STATUS_QUEUED,)
+            ).fetchone()
+        if row[0] is None:
+            return 60.0
+        return min(60.0, max(0.0, row[0] - time.time()))
+
+    def _send(self, item: Dict[str, Any]) -> None:
+        with self._lock:
+            api_key = self._credentials.get((item["owner"], item["database_id"]))
+        notion = NotionIntegration(api_key=api_key, database_id=item["database_id"])
+        result = notion.upsert_page_with_analysis(
+            title=item["title"],
+            summary=item["summary"],
+            todo_list=item["todo_list"],
+            source_key=item["source_key"]
+        )
+
+        attempts = item["attempts"] + 1
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            if result["success"]:
+                conn.execute(
+                    """
+                    UPDATE notion_outbox
+                    SET status = ?, attempts = ?, page_id = ?, url = ?, last_error = NULL, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (STATUS_SENT, attempts, result.get("page_id"), result.get("url"), now, item["id"])
+                )
+                return
+
+            status_code = result.get("status_code")
+            retryable = status_code is None or status_code in RETRYABLE_STATUS_CODES
+            if retryable and attempts < self.max_attempts:
+                status = STATUS_QUEUED
+                next_attempt_at = now + min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+            else:
+                status = STATUS_FAILED
+                next_attempt_at = now
+            conn.execute(
+                """
+                UPDATE notion_outbox
+                SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (status, attempts, next_attempt_at, result.get("message", ""), now, item["id"])
+            )
+        logger.warning("Notion export %d failed (attempt %d): %s", item["id"], attempts, result.get("message"))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                item = self._claim_next()
+                if item is not None:
+                    self._send(item)
+                    continue
+                self._prune_credentials()
+                wait = self._next_due_in()
+            except Exception:
+                logger.exception("Notion outbox worker error")
+                wait = RETRY_BASE_SECONDS
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+_outbox: Optional[NotionOutbox] = None
+_outbox_lock = threading.Lock()
+
+def get_notion_outbox() -> NotionOutbox:
+    """Get the shared Notion outbox for this process, starting its worker."""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = NotionOutbox()
+                _outbox.start()
+    return _outbox
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import logging
+import requests
+from typing import Iterator, List, Optional, Union
+
+from http_client import get_http_client
+from rate_limiter import (
+    MAX_RETRIES, RETRYABLE_STATUS_CODES,
+    backoff_delay, get_rate_limiter, parse_retry_after
+)
+from token_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# API 基底網址，可指向相容的代理或本機的 mock_server.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+OPENAI_CHAT_COMPLETIONS_URL = f"{OPENAI_BASE_URL}/chat/completions"
+OPENAI_EMBEDDINGS_URL = f"{OPENAI_BASE_URL}/embeddings"
+
+def set_openai_base_url(base_url: str) -> None:
+    """Point every OpenAI request of this process at another base URL (e.g. a local mock server)."""
+    global OPENAI_BASE_URL, OPENAI_CHAT_COMPLETIONS_URL, OPENAI_EMBEDDINGS_URL
+    OPENAI_BASE_URL = base_url.rstrip("/")
+    OPENAI_CHAT_COMPLETIONS_URL = f"{OPENAI_BASE_URL}/chat/completions"
+    OPENAI_EMBEDDINGS_URL = f"{OPENAI_BASE_URL}/embeddings"
+
+class StreamInterruptedError(Exception):
+    """The stream failed after part of the output was already yielded."""
+
+def _build_headers(api_key: str) -> dict:
+    """Build the headers required for OpenAI API requests."""
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+
+def _post_with_retry(payload: dict, api_key: str, stream: bool = False,
+                     url: Optional[str] = None) -> Union[requests.Response, str]:
+    """
+    Send an OpenAI request under the rate limiter, retrying transient errors.
+
+    The caller waits in the limiter's queue until the model's request and token
+    budgets allow the request. 429 and 5xx responses and connection errors are
+    retried with jittered exponential backoff, honouring Retry-After.
+
+    Args:
+        url: Endpoint to post to (defaults to chat completions)
+
+    Returns:
+        The successful response, or an error message string
+    """
+    model = payload["model"]
+    limiter = get_rate_limiter(model)
+    if "messages" in payload:
+        prompt_text = "".join(message["content"] for message in payload["messages"])
+    else:
+        inputs = payload.get("input", "")
+        prompt_text = inputs if isinstance(inputs, str) else "".join(inputs)
+    request_tokens = count_tokens(prompt_text, model) + payload.get("max_tokens", 0)
+
+    for attempt in range(MAX_RETRIES + 1):
+        if not limiter.acquire(request_tokens):
+            return "錯誤: 等待 API 配額逾時，請稍後再試"
+
+        try:
+            response = get_http_client().post(
+                url or OPENAI_CHAT_COMPLETIONS_URL,
+                headers=_build_headers(api_key),
+                data=json.dumps(payload),
+                stream=stream
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == MAX_RETRIES:
+                return f"錯誤: {str(e)}"
+            delay = backoff_delay(attempt)
+            logger.warning("OpenAI request failed (%s), retrying in %.1fs", e, delay)
+            time.sleep(delay)
+            continue
+
+        limiter.update_from_headers(response.headers)
+
+        if response.status_code == 200:
+            return response
+        if response.status_code not in RETRYABLE_STATUS_CODES or attempt == MAX_RETRIES:
+            message = f"錯誤: API 返回狀態碼 {response.status_code}，錯誤信息: {response.text}"
+            response.close()
+            return message
+
+        delay = backoff_delay(attempt, parse_retry_after(response.headers))
+        if response.status_code == 429:
+            limiter.penalize(delay)
+        logger.warning("OpenAI returned %d, retrying in %.1fs", response.status_code, delay)
+        response.close()
+        time.sleep(delay)
+
+    return "錯誤: API 重試次數已用盡"
+
+# 直接使用 requests 庫調用 OpenAI API，避免使用 OpenAI 客戶端（經由共用連線池與速率限制）
+def call_openai_api(prompt, api_key, model="gpt-3.5-turbo", temperature=0.3, max_tokens=800, response_format=None):
+    """使用 requests 直接調用 OpenAI API（response_format 例如 {"type": "json_object"} 可要求 JSON 輸出）"""
+    if not api_key:
+        return "錯誤: 未找到 API key"
+
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    if response_format:
+        payload["response_format"] = response_format
+
+    try:
+        response = _post_with_retry(payload, api_key)
+        if isinstance(response, str):
+            return response
+        return response.json()["choices"][0]["message"]["content"]
+    except Exception as e:
+        return f"錯誤: {str(e)}"
+
+# 以串流 (SSE) 方式調用 OpenAI API，逐步產出回應文字
+def stream_openai_api(prompt, api_key, model="gpt-3.5-turbo", temperature=0.3, max_tokens=800,
+                      response_format=None) -> Iterator[str]:
+    """使用 requests 以 stream 模式調用 OpenAI API，逐段 yield 回應內容"""
+    if not api_key:
+        yield "錯誤: 未找到 API key"
+        return
+
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+    if response_format:
+        payload["response_format"] = response_format
+
+    received = False
+    try:
+        response = _post_with_retry(payload, api_key, stream=True)
+        if isinstance(response, str):
+            yield response
+            return
+
+        with response:
+            # 每一行 SSE 事件格式為 "data: {...}"，以 "data: [DONE]" 結束
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    received = True
+                    yield delta
+        # 連線在 [DONE] 之前結束，輸出不完整
+        error = "串流在完成前中斷"
+    except Exception as e:
+        error = str(e)
+
+    # 已產出部分內容時不能再附加錯誤訊息（會被當成輸出的一部分），改為拋出例外
+    if received:
+        raise StreamInterruptedError(error)
+    yield f"錯誤: {error}"
+
+def create_embeddings(texts: List[str], api_key: str,
+                      model: str = "text-embedding-3-small") -> Union[List[List[float]], str]:
+    """
+    Embed several texts in a single request.
+
+    Returns:
+        One embedding per text in input order, or an error message string
+    """
+    if not api_key:
+        return "錯誤: 未找到 API key"
+
+    payload = {"model": model, "input": texts}
+
+    try:
+        response = _post_with_retry(payload, api_key, url=OPENAI_EMBEDDINGS_URL)
+        if isinstance(response, str):
+            return response
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+    except Exception as e:
+        return f"錯誤: {str(e)}"
+
+def is_error_output(output: str) -> bool:
+    """Check whether an API output string is one of our error messages."""
+    return output.startswith("錯誤:") or output.startswith("Error:")
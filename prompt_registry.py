@@ -0,0 +1,258 @@
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+# 提示詞任務
+TASK_ANALYSIS = "analysis"            # 完整分析（Markdown 輸出）
+TASK_ANALYSIS_JSON = "analysis_json"  # 完整分析（JSON mode 結構化輸出）
+TASK_INCREMENTAL = "incremental"      # 對話修改後的增量更新
+TASK_MAP = "map"                      # 長對話的單一分段摘要
+TASK_REDUCE = "reduce"                # 合併各分段摘要
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    A prompt split into a static instruction prefix and the per-request input.
+
+    The instructions never contain request data, so every request of a task and
+    language starts with the same bytes and the provider's prompt cache can reuse
+    the prefix. Only input_template is formatted with the request fields.
+    """
+    task: str
+    language: str
+    version: str       # 修改模板內容時請遞增，讓舊的快取結果失效
+    instructions: str
+    input_template: str
+
+    @property
+    def cache_version(self) -> str:
+        """Version string identifying this template in analysis cache keys."""
+        return f"{self.task}-{self.version}"
+
+    def render(self, **fields) -> str:
+        """Build the full prompt: the static instructions followed by the formatted input."""
+        return self.instructions + self.input_template.format(**fields)
+
+_ANALYSIS_ZH = """你是一個專業的AI分析助手，專門處理會議記錄、對話內容和文字資料，提取關鍵資訊並生成詳細的分析報告。
+
+請對以下文字內容進行深入分析：
+
+1. 仔細閱讀輸入的文字內容，識別並提取以下要素：
+   - 主要討論主題和背景
+   - 關鍵決策和結論
+   - 重要的數據點和事實
+   - 參與者的角色和責任
+   - 時間線和截止日期
+
+2. 生成全面而詳細的摘要，確保：
+   - 涵蓋所有重要資訊
+   - 按邏輯順序組織內容
+   - 提供足夠的上下文以便理解
+   - 突出關鍵見解和結論
+
+3. 從文字中識別所有可執行的工作項目，確保每個待辦事項：
+   - 明確具體且可操作
+   - 包含負責人（如有提及）
+   - 包含截止日期（如有提及）
+   - 按優先順序或時間順序排列
+   - 使用動詞開頭，清晰描述需要完成的行動
+
+4. 最後，將摘要與待辦事項整理成 **Markdown 格式** 輸出，結構清晰、易於閱讀與複製使用。
+
+若文字內容前附有說話者代號對照（例如「S1 = 王小明」），輸出中請以代號指稱這些說話者。
+
+請使用以下格式輸出：
+
+## 📌 摘要
+- [主題/背景相關的重點]
+- [決策和結論相關的重點]
+- [時間線和責任相關的重點]
+- [其他重要資訊]
+
+## ✅ 待辦事項清單
+- [ ] [動詞開頭的具體任務1]，負責人：[姓名]，截止日期：[日期]
+- [ ] [動詞開頭的具體任務2]，負責人：[姓名]，截止日期：[日期]
+- [ ] [動詞開頭的具體任務3]
+
+"""
+
+_ANALYSIS_EN = """You are a professional AI analysis assistant, specializing in processing meeting notes, conversation content, and text data to extract key information and generate detailed analysis reports.
+
+Please conduct an in-depth analysis of the following text content:
+
+1. Carefully read the input text and identify the following elements:
+   - Main discussion topics and background
+   - Key decisions and conclusions
+   - Important data points and facts
+   - Roles and responsibilities of participants
+   - Timelines and deadlines
+
+2. Generate a comprehensive and detailed summary, ensuring:
+   - All important information is covered
+   - Content is organized in logical order
+   - Sufficient context is provided for understanding
+   - Key insights and conclusions are highlighted
+
+3. Identify all actionable work items from the text, ensuring each to-do item:
+   - Is clear, specific, and actionable
+   - Includes the responsible person (if mentioned)
+   - Includes the deadline (if mentioned)
+   - Is arranged by priority or chronological order
+   - Starts with a verb, clearly describing the action to be completed
+
+4. Finally, organize the summary and to-do items into a **Markdown format** output that is clear, easy to read, and copy.
+
+If the text content is preceded by a speaker legend (e.g. "S1 = Alice Wang"), refer to those speakers by their codes in the output.
+
+Please use the following output format:
+
+## 📌 Summary
+- [Point related to topic/background]
+- [Point related to decisions and conclusions]
+- [Point related to timeline and responsibilities]
+- [Other important information]
+
+## ✅ To-Do List
+- [ ] [Specific task starting with a verb 1], Responsible: [Name], Deadline: [Date]
+- [ ] [Specific task starting with a verb 2], Responsible: [Name], Deadline: [Date]
+- [ ] [Specific task starting with a verb 3]
+
+"""
+
+# 結構化輸出：只要求 JSON 欄位，不需產生 Markdown 格式
+_ANALYSIS_JSON_ZH = """你是一個專業的AI分析助手，專門處理會議記錄、對話內容和文字資料。
+
+請分析以下文字內容，並只輸出符合此結構的 JSON 物件：
+{"summary": ["重點", ...], "tasks": [{"task": "以動詞開頭的具體任務", "owner": "負責人或 null", "deadline": "截止日期或 null", "priority": "high、medium、low 或 null"}, ...]}
+
+- summary：3 到 6 個重點，涵蓋主題背景、決策結論、時間線與責任
+- tasks：所有可執行的工作項目，依優先順序或時間順序排列；未提及的負責人或截止日期填 null
+- 使用與文字內容相同的語言（繁體中文）
+- 若文字內容前附有說話者代號對照（例如「S1 = 王小明」），請以代號指稱這些說話者
+
+"""
+
+_ANALYSIS_JSON_EN = """You are a professional AI analysis assistant, specializing in meeting notes, conversations and text data.
+
+Analyze the following text and output only a JSON object with this structure:
+{"summary": ["point", ...], "tasks": [{"task": "specific task starting with a verb", "owner": "name or null", "deadline": "date or null", "priority": "high, medium, low or null"}, ...]}
+
+- summary: 3 to 6 key points covering topic and background, decisions and conclusions, timeline and responsibilities
+- tasks: every actionable work item, ordered by priority or time; use null when the owner or deadline is not mentioned
+- Write in English
+- If the text is preceded by a speaker legend (e.g. "S1 = Alice Wang"), refer to those speakers by their codes
+
+"""
+
+# 增量分析：只送出先前的分析結果與對話的變動部分
+_INCREMENTAL_ZH = """你是一個專業的AI分析助手。以下是一份會議記錄先前的分析結果，之後會議記錄有所更新。
+
+請根據「變動內容」更新分析結果：
+- 將新增內容中的重點、決策與待辦事項加入對應區塊
+- 刪除或修正只來自已移除內容的重點與待辦事項
+- 未受影響的內容保持原樣，不要改寫
+- 使用與先前分析完全相同的 Markdown 格式（## 📌 摘要 與 ## ✅ 待辦事項清單）輸出完整的更新後結果
+
+變動內容中以 + 開頭為新增的行，以 - 開頭為移除的行。
+
+"""
+
+_INCREMENTAL_EN = """You are a professional AI analysis assistant. Below is a previous analysis of a meeting record, which has since been updated.
+
+Please update the analysis according to the changes:
+- Add key points, decisions and to-do items from the added lines to the matching sections
+- Remove or correct points and to-do items that only came from the removed lines
+- Keep unaffected content as it is, without rewording it
+- Output the complete updated result in exactly the same Markdown format as the previous analysis (## 📌 Summary and ## ✅ To-Do List)
+
+In the changes, lines starting with + were added and lines starting with - were removed.
+
+"""
+
+_MAP_ZH = """你是一個專業的AI分析助手。以下是一份較長對話紀錄的其中一段。
+
+請只根據這一段內容，整理出重點摘要與可執行的待辦事項（包含負責人與截止日期，如有提及），並使用以下格式輸出：
+
+## 📌 摘要
+- [重點]
+
+## ✅ 待辦事項清單
+- [ ] [動詞開頭的具體任務]，負責人：[姓名]，截止日期：[日期]
+
+若對話紀錄前附有說話者代號對照（例如「S1 = 王小明」），輸出中請以代號指稱這些說話者。
+
+"""
+
+_MAP_EN = """You are a professional AI analysis assistant. Below is one part of a long conversation record.
+
+Based only on this part, list the key summary points and the actionable to-do items (with the responsible person and deadline, if mentioned), using the following output format:
+
+## 📌 Summary
+- [Point]
+
+## ✅ To-Do List
+- [ ] [Specific task starting with a verb], Responsible: [Name], Deadline: [Date]
+
+If the conversation record is preceded by a speaker legend (e.g. "S1 = Alice Wang"), refer to those speakers by their codes in the output.
+
+"""
+
+_REDUCE_ZH = """你是一個專業的AI分析助手。以下是同一份對話紀錄各段落的摘要與待辦事項。
+
+請將它們整合成一份完整的分析報告：
+- 合併重複或相近的摘要重點，按邏輯順序組織，保留所有重要資訊
+- 合併重複的待辦事項，保留負責人與截止日期，按優先順序或時間順序排列
+
+請使用以下格式輸出：
+
+## 📌 摘要
+- [重點]
+
+## ✅ 待辦事項清單
+- [ ] [動詞開頭的具體任務]，負責人：[姓名]，截止日期：[日期]
+
+"""
+
+_REDUCE_EN = """You are a professional AI analysis assistant. Below are the summaries and to-do items of each part of the same conversation record.
+
+Please merge them into one complete analysis report:
+- Merge duplicate or similar summary points, organize them in logical order and keep all important information
+- Merge duplicate to-do items, keep the responsible person and deadline, and arrange them by priority or chronological order
+
+Please use the following output format:
+
+## 📌 Summary
+- [Point]
+
+## ✅ To-Do List
+- [ ] [Specific task starting with a verb], Responsible: [Name], Deadline: [Date]
+
+"""
+
+def _build_registry() -> Dict[Tuple[str, str], PromptTemplate]:
+    entries = [
+        # (task, language, version, instructions, input_template)
+        (TASK_ANALYSIS, "中文", "2", _ANALYSIS_ZH, "文字內容：\n{chat_input}\n"),
+        (TASK_ANALYSIS, "English", "2", _ANALYSIS_EN, "Text content:\n{chat_input}\n"),
+        (TASK_ANALYSIS_JSON, "中文", "2", _ANALYSIS_JSON_ZH, "文字內容：\n{chat_input}\n"),
+        (TASK_ANALYSIS_JSON, "English", "2", _ANALYSIS_JSON_EN, "Text content:\n{chat_input}\n"),
+        (TASK_INCREMENTAL, "中文", "2", _INCREMENTAL_ZH,
+         "先前的分析結果：\n{previous_result}\n\n變動內容：\n{changes}\n"),
+        (TASK_INCREMENTAL, "English", "2", _INCREMENTAL_EN,
+         "Previous analysis:\n{previous_result}\n\nChanges:\n{changes}\n"),
+        (TASK_MAP, "中文", "2", _MAP_ZH, "對話紀錄（第 {index} 段，共 {total} 段）：\n{chunk}\n"),
+        (TASK_MAP, "English", "2", _MAP_EN, "Conversation record (part {index} of {total}):\n{chunk}\n"),
+        (TASK_REDUCE, "中文", "2", _REDUCE_ZH, "各段摘要：\n{summaries}\n\n各段待辦事項：\n{tasks}\n"),
+        (TASK_REDUCE, "English", "2", _REDUCE_EN,
+         "Summaries of each part:\n{summaries}\n\nTo-do items of each part:\n{tasks}\n"),
+    ]
+    return {
+        (task, language): PromptTemplate(task, language, version, instructions, input_template)
+        for task, language, version, instructions, input_template in entries
+    }
+
+# 模板只在載入模組時建立一次，之後每次請求共用同一份
+PROMPTS = _build_registry()
+
+def get_prompt(task: str, language: str) -> PromptTemplate:
+    """Get the prompt template of a task for the UI language ("中文" or English for anything else)."""
+    return PROMPTS[(task, "中文" if language == "中文" else "English")]
@@ -0,0 +1,176 @@
+import os
+import re
+import time
+import random
+import threading
+from typing import Dict, Mapping, Optional
+
+# 預設的每分鐘請求數與 token 數上限，收到 API 回應後會以 x-ratelimit-* 標頭更新
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TPM_LIMIT", "60000"))
+
+# 排隊等待額度的最長時間（秒）
+MAX_QUEUE_WAIT = float(os.getenv("OPENAI_MAX_QUEUE_WAIT", "120"))
+
+# 重試設定
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a reset duration such as "1s", "6m0s" or "20ms" into seconds."""
+    if not value:
+        return None
+    parts = _DURATION_PATTERN.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Get the delay requested by the server through Retry-After headers, in seconds."""
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            return None
+    return None
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Get the delay before the next retry.
+
+    Uses the server's Retry-After when given, otherwise exponential backoff with full jitter.
+    """
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+class TokenBucket:
+    """
+    A thread-safe token bucket refilled continuously at a rate per minute.
+
+    Callers that need more than what is available wait in acquire() until the
+    bucket refills, instead of failing.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate_per_minute: How much is refilled per minute
+            burst: Maximum amount that can be held at once (defaults to one minute of refill)
+        """
+        self.rate_per_minute = float(rate_per_minute)
+        self.capacity = float(burst if burst is not None else rate_per_minute)
+        self.available = self.capacity
+        self.updated_at = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate_per_minute / 60.0)
+        self.updated_at = now
+
+    def acquire(self, amount: float, timeout: Optional[float] = None) -> bool:
+        """
+        Take the given amount from the bucket, waiting until it is available.
+
+        Returns:
+            True if acquired, False if the timeout expired first
+        """
+        # 單次請求超過整個容量時，最多只需要等到桶滿
+        amount = min(float(amount), self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+            while True:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return True
+
+                wait = (amount - self.available) * 60.0 / self.rate_per_minute
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                self._condition.wait(wait)
+
+    def sync(self, limit_per_minute: Optional[float] = None, remaining: Optional[float] = None) -> None:
+        """Update the per-minute limit and remaining amount reported by the server."""
+        with self._condition:
+            self._refill()
+            if limit_per_minute:
+                self.rate_per_minute = float(limit_per_minute)
+                self.capacity = float(limit_per_minute)
+            if remaining is not None:
+                self.available = min(self.available, float(remaining), self.capacity)
+            self._condition.notify_all()
+
+class RateLimiter:
+    """
+    Client-side requests-per-minute and tokens-per-minute limiter for one model.
+
+    Budgets start from the configured defaults and are re-seeded from the
+    x-ratelimit-* headers of every response.
+    """
+
+    def __init__(self, requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, tokens: int, timeout: Optional[float] = MAX_QUEUE_WAIT) -> bool:
+        """
+        Wait for budget for one request consuming the given number of tokens.
+
+        Returns:
+            True if the request may be sent, False if the wait exceeded the timeout
+        """
+        started = time.monotonic()
+        if not self.requests.acquire(1, timeout):
+            return False
+        remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - started))
+        return self.tokens.acquire(tokens, remaining)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Re-seed the budgets from the x-ratelimit-* headers of an API response."""
+        def number(name: str) -> Optional[float]:
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        self.requests.sync(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"))
+        self.tokens.sync(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"))
+
+    def penalize(self, delay: float) -> None:
+        """Empty the request budget after a 429 so queued callers wait for the server to recover."""
+        self.requests.sync(remaining=-delay * self.requests.rate_per_minute / 60.0)
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """Get the shared rate limiter for a model (OpenAI limits are applied per model)."""
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter()
+        return _limiters[model]
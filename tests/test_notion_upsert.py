@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import MockServer
+from notion_index import NotionPageIndex
+from notion_integration import NOTION_MAX_BLOCKS_PER_REQUEST, NotionIntegration
+
+def test_retry_after_failed_append_completes_the_same_page(tmp_path):
+    todo_list = "\n".join(f"- [ ] 任務 {i}" for i in range(NOTION_MAX_BLOCKS_PER_REQUEST + 20))
+    page_index = NotionPageIndex(str(tmp_path / "notion_index.sqlite3"))
+
+    with MockServer() as server:
+        append_children = server._append_children
+        failures = []
+
+        def fail_first_append(handler, body, query, block_id):
+            if not failures:
+                failures.append(block_id)
+                handler._send_json(503, {"object": "error", "message": "Service unavailable"})
+            else:
+                append_children(handler, body, query, block_id)
+
+        server._append_children = fail_first_append
+        notion = NotionIntegration("secret", "database", base_url=server.base_url)
+
+        first = notion.upsert_page_with_analysis("標題", "摘要", todo_list, source_key="source", page_index=page_index)
+        assert not first["success"]
+        assert first["status_code"] == 503
+
+        retry = notion.upsert_page_with_analysis("標題", "摘要", todo_list, source_key="source", page_index=page_index)
+        assert retry["success"]
+        assert retry["page_id"] == first["page_id"]
+
+        assert server.stats()["requests"]["create_page"] == 1
+        # 摘要標題 + 摘要 + 待辦標題 + 每個待辦各一個區塊
+        assert len(server.state.children[first["page_id"]]) == NOTION_MAX_BLOCKS_PER_REQUEST + 23
@@ -0,0 +1,103 @@
+import re
+from typing import List, Tuple
+
+# 中日韓文字（不含全形標點）連續出現時以雙字元 (bigram) 建立索引，其他文字以單字為單位
+_CJK_RANGES = "㐀-䶿一-鿿぀-ヿ가-힯豈-﫿"
+_CJK_RUN_PATTERN = re.compile(f"[{_CJK_RANGES}]+")
+# 單字不可包含中日韓文字，否則「完成Q3報告」會整段成為一個單字而不經過 bigram 切分
+_WORD_PATTERN = re.compile(f"[{_CJK_RANGES}]+|[^\\W_{_CJK_RANGES}]+", re.UNICODE)
+
+SNIPPET_CHARS = 80
+
+def _is_cjk_run(term: str) -> bool:
+    return bool(_CJK_RUN_PATTERN.fullmatch(term))
+
+def _bigrams(run: str) -> List[str]:
+    """Split a run of CJK characters into overlapping bigrams (a single character stays as is)."""
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+def split_terms(text: str) -> List[str]:
+    """
+    Split text into CJK runs and lowercase words.
+
+    >>> split_terms("完成Q3報告，API測試通過")
+    ['完成', 'q3', '報告', 'api', '測試通過']
+    """
+    return [term.lower() for term in _WORD_PATTERN.findall(text or "")]
+
+def tokenize_for_index(text: str) -> str:
+    """
+    Rewrite text into space-separated tokens for an FTS5 unicode61 index.
+
+    SQLite's built-in tokenizers treat a whole run of Chinese characters as one
+    token, so runs are indexed as overlapping bigrams instead. The last character
+    of each run is also indexed alone so single-character queries still match.
+    """
+    tokens = []
+    for term in split_terms(text):
+        if _is_cjk_run(term):
+            tokens.extend(_bigrams(term))
+            if len(term) > 1:
+                tokens.append(term[-1])
+        else:
+            tokens.append(term)
+    return " ".join(tokens)
+
+def build_match_query(query: str) -> str:
+    """
+    Build an FTS5 MATCH expression requiring every term of the query.
+
+    CJK runs become phrases of consecutive bigrams, so "測試報告" only matches
+    the four characters in order; other words match as prefixes.
+    """
+    clauses = []
+    for term in split_terms(query):
+        if _is_cjk_run(term):
+            if len(term) == 1:
+                clauses.append(f'"{term}"*')
+            else:
+                clauses.append('"' + " ".join(_bigrams(term)) + '"')
+        else:
+            clauses.append(f'"{term}"*')
+    return " AND ".join(clauses)
+
+def highlight_snippet(text: str, query: str, width: int = SNIPPET_CHARS) -> str:
+    """
+    Cut a snippet of text around the first query match and mark matches in bold Markdown.
+
+    Returns an empty string if no query term occurs in the text.
+    """
+    text = " ".join((text or "").split())
+    lowered = text.lower()
+    terms = sorted(set(split_terms(query)), key=len, reverse=True)
+    if not terms:
+        return ""
+
+    positions = [(lowered.find(term), term) for term in terms]
+    positions = [(pos, term) for pos, term in positions if pos >= 0]
+    if not positions:
+        return ""
+
+    first = min(pos for pos, _ in positions)
+    start = max(0, first - width // 3)
+    end = min(len(text), start + width)
+    snippet = text[start:end]
+
+    spans: List[Tuple[int, int]] = []
+    lowered_snippet = snippet.lower()
+    for term in terms:
+        pos = lowered_snippet.find(term)
+        while pos >= 0:
+            if not any(s < pos + len(term) and pos < e for s, e in spans):
+                spans.append((pos, pos + len(term)))
+            pos = lowered_snippet.find(term, pos + len(term))
+
+    marked = snippet
+    for s, e in sorted(spans, reverse=True):
+        marked = marked[:s] + "**" + marked[s:e] + "**" + marked[e:]
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    return prefix + marked + suffix
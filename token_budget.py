@@ -0,0 +1,132 @@
+import math
+import re
+from typing import Any, Dict, Optional
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 為可選依賴，未安裝時使用估算
+    tiktoken = None
+
+# 各模型的上下文長度（輸入 + 輸出 tokens）
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+}
+
+DEFAULT_CONTEXT_WINDOW = 4096
+
+# CJK 字元（中日韓文字與全形標點）大約每字 1 個 token 以上，其他文字約每 4 個字元 1 個 token
+_CJK_PATTERN = re.compile(r"[　-〿぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+CJK_TOKENS_PER_CHAR = 1.2
+OTHER_CHARS_PER_TOKEN = 4.0
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text without calling a tokenizer."""
+    if not text:
+        return 0
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    other_chars = len(text) - cjk_chars
+    return int(math.ceil(cjk_chars * CJK_TOKENS_PER_CHAR + other_chars / OTHER_CHARS_PER_TOKEN))
+
+def get_context_window(model: str) -> int:
+    """Get the context window size of a model, matching dated variants by prefix."""
+    for name in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_CONTEXT_WINDOWS[name]
+    return DEFAULT_CONTEXT_WINDOW
+
+# 輸出預算：依對話長度按比例決定，並限制在上下限之間
+MIN_OUTPUT_TOKENS = 400
+MAX_OUTPUT_TOKENS = 1500
+OUTPUT_TOKENS_PER_INPUT_TOKEN = 0.3
+
+# 單次分析允許的對話長度上限，超過時直接拒絕以避免失控的費用
+MAX_TRANSCRIPT_TOKENS = 200000
+
+_encodings = {}
+
+def _get_encoding(model: str):
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Count the tokens of a text with the model's tokenizer, or estimate them if tiktoken is unavailable."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text or "", disallowed_special=()))
+
+def choose_max_tokens(transcript_tokens: int) -> int:
+    """Pick an output token budget proportional to the transcript size."""
+    budget = int(transcript_tokens * OUTPUT_TOKENS_PER_INPUT_TOKEN)
+    return min(max(budget, MIN_OUTPUT_TOKENS), MAX_OUTPUT_TOKENS)
+
+def plan_request(prompt: str, transcript: str, model: str,
+                 max_tokens: Optional[int] = None,
+                 chunk_tokens: int = 3000,
+                 chunk_output_tokens: int = 500) -> Dict[str, Any]:
+    """
+    Plan an analysis request before anything is sent.
+
+    Counts the prompt tokens locally, picks the output budget, and decides whether
+    the request can be sent in one shot or must be split into chunks.
+
+    Args:
+        prompt: The full single-shot prompt
+        transcript: The conversation record included in the prompt
+        model: OpenAI model name
+        max_tokens: Fixed output budget (optional, chosen from the transcript size if omitted)
+        chunk_tokens: Input token budget per chunk in chunked mode
+        chunk_output_tokens: Output token budget per chunk in chunked mode
+
+    Returns:
+        Dict containing ok, mode ("single" or "chunked"), token counts, warnings,
+        and a message explaining the refusal when ok is False
+    """
+    context_window = get_context_window(model)
+    prompt_tokens = count_tokens(prompt, model)
+    transcript_tokens = count_tokens(transcript, model)
+    if max_tokens is None:
+        max_tokens = choose_max_tokens(transcript_tokens)
+
+    plan = {
+        "ok": True,
+        "mode": "single",
+        "model": model,
+        "context_window": context_window,
+        "prompt_tokens": prompt_tokens,
+        "transcript_tokens": transcript_tokens,
+        "max_tokens": max_tokens,
+        "estimated_chunks": 1,
+        "warnings": [],
+    }
+
+    if max_tokens >= context_window:
+        plan.update(ok=False, message=f"錯誤: 輸出上限 {max_tokens} tokens 超過模型 {model} 的上下文長度 {context_window}")
+        return plan
+
+    if transcript_tokens > MAX_TRANSCRIPT_TOKENS:
+        plan.update(ok=False, message=f"錯誤: 對話內容約 {transcript_tokens} tokens，超過單次分析上限 {MAX_TRANSCRIPT_TOKENS} tokens")
+        return plan
+
+    if prompt_tokens + max_tokens <= context_window:
+        return plan
+
+    # 超出上下文長度：改為分段處理，並確認合併步驟的輸入不會再次超出
+    estimated_chunks = int(math.ceil(transcript_tokens / chunk_tokens))
+    reduce_tokens = prompt_tokens - transcript_tokens + estimated_chunks * chunk_output_tokens
+    plan.update(mode="chunked", estimated_chunks=estimated_chunks)
+    plan["warnings"].append(
+        f"對話內容約 {transcript_tokens} tokens，超過模型上下文長度，將分為約 {estimated_chunks} 段處理"
+    )
+
+    if reduce_tokens + max_tokens > context_window:
+        plan.update(ok=False, message=f"錯誤: 對話內容過長（約 {estimated_chunks} 段），合併結果將超過模型 {model} 的上下文長度")
+    return plan
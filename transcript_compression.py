@@ -0,0 +1,111 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from token_budget import count_tokens
+
+# 說話者至少發言這麼多次，才考慮以代號取代其名稱
+MIN_ALIAS_TURNS = 2
+
+# 代號前綴，依序選用第一個不會與對話原有文字混淆的
+_ALIAS_PREFIXES = ("S", "P", "SP")
+
+_INVISIBLE_PATTERN = re.compile(r"[\u200b-\u200d\u2060\ufeff]")
+_INLINE_SPACE_PATTERN = re.compile(r"[ \t\u00a0\u3000]+")
+# 以「說話者：」或「Speaker:」開頭的行；半形冒號後須為空白或行尾，避免把網址或時間誤判為說話者
+_SPEAKER_PATTERN = re.compile(r"^([^\s：:][^：:\n]{0,39}?)\s*(：|:(?=\s|$))\s*")
+_ROLE_PATTERN = re.compile(r"\s*[（(][^（）()]*[）)]$")
+
+@dataclass(frozen=True)
+class CompressedTranscript:
+    """A transcript with collapsed whitespace and speaker labels replaced by short aliases."""
+    text: str
+    aliases: Dict[str, str] = field(default_factory=dict)  # 代號 -> 說話者名稱
+    legend: str = ""                                        # 「S1 = 名稱（角色）」，每行一位
+
+    def with_legend(self, text: Optional[str] = None) -> str:
+        """Prefix the transcript (or a chunk of it) with the speaker legend, if any."""
+        text = self.text if text is None else text
+        return f"{self.legend}\n\n{text}" if self.legend else text
+
+    def expand(self, output: str) -> str:
+        """Replace the speaker aliases in a model output with the speakers' names."""
+        if not self.aliases or not output:
+            return output
+        alternatives = "|".join(sorted(map(re.escape, self.aliases), key=len, reverse=True))
+        pattern = re.compile(rf"(?<![A-Za-z0-9])({alternatives})(?![A-Za-z0-9])")
+        return pattern.sub(lambda match: self.aliases[match.group(1)], output)
+
+def collapse_whitespace(text: str) -> str:
+    """Collapse runs of spaces, drop invisible characters, indentation and blank lines."""
+    lines = []
+    for line in _INVISIBLE_PATTERN.sub("", text or "").splitlines():
+        line = _INLINE_SPACE_PATTERN.sub(" ", line).strip()
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+def _choose_prefix(text: str) -> Optional[str]:
+    for prefix in _ALIAS_PREFIXES:
+        if not re.search(rf"(?<![A-Za-z0-9]){prefix}\d", text):
+            return prefix
+    return None
+
+def compress_transcript(transcript: str, model: str = "gpt-3.5-turbo",
+                        use_aliases: bool = True) -> CompressedTranscript:
+    """
+    Shrink a transcript before it is sent to the model.
+
+    Whitespace is collapsed, then the label of every speaker with at least
+    MIN_ALIAS_TURNS turns is replaced by a short alias ("S1", "S2", ...) when that
+    saves more tokens than the speaker's legend line costs. A role in parentheses
+    after a name ("王小明（產品經理）") is kept once, in the legend.
+
+    Args:
+        transcript: The conversation record
+        model: Model whose tokenizer decides whether an alias pays off
+        use_aliases: Whether to replace speaker labels (whitespace is always collapsed)
+
+    Returns:
+        CompressedTranscript; pass model outputs through its expand() to restore the names
+    """
+    text = collapse_whitespace(transcript)
+    prefix = _choose_prefix(text) if use_aliases else None
+    if prefix is None:
+        return CompressedTranscript(text=text)
+
+    lines = text.split("\n")
+    turns: Dict[str, List[int]] = {}
+    labels: Dict[str, str] = {}     # 說話者名稱 -> 完整標籤（含角色，如有）
+    for i, line in enumerate(lines):
+        match = _SPEAKER_PATTERN.match(line)
+        if not match or not any(char.isalpha() for char in match.group(1)):
+            continue
+        label = match.group(1).strip()
+        name = _ROLE_PATTERN.sub("", label) or label
+        turns.setdefault(name, []).append(i)
+        if name not in labels or labels[name] == name:
+            labels[name] = label
+
+    aliases: Dict[str, str] = {}
+    legend = []
+    for name, line_numbers in turns.items():
+        if len(line_numbers) < MIN_ALIAS_TURNS:
+            continue
+        alias = f"{prefix}{len(aliases) + 1}"
+        legend_line = f"{alias} = {labels[name]}"
+        alias_tokens = count_tokens(alias, model)
+        saved = sum(
+            count_tokens(_SPEAKER_PATTERN.match(lines[i]).group(1), model) - alias_tokens
+            for i in line_numbers
+        )
+        if saved <= count_tokens(legend_line + "\n", model):
+            continue
+        aliases[alias] = name
+        legend.append(legend_line)
+        for i in line_numbers:
+            match = _SPEAKER_PATTERN.match(lines[i])
+            separator = "：" if match.group(2) == "：" else ": "
+            lines[i] = alias + separator + lines[i][match.end():]
+
+    return CompressedTranscript(text="\n".join(lines), aliases=aliases, legend="\n".join(legend))
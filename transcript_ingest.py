@@ -0,0 +1,253 @@
+import io
+import os
+import re
+import mmap
+import zipfile
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from xml.etree import ElementTree
+
+SUPPORTED_EXTENSIONS = ("txt", "md", "srt", "vtt", "docx")
+
+# 超過此大小的檔案以 mmap 逐行讀取，不整份載入記憶體
+MMAP_MIN_BYTES = 1024 * 1024
+
+# 字幕中同一位說話者連續的片段會合併為一段發言，直到超過此長度或片段間隔過久
+MAX_MERGED_CHARS = 1000
+MAX_MERGE_GAP_SECONDS = 30
+
+PREVIEW_TURNS = 20
+
+_WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_CUE_TIMING_PATTERN = re.compile(r"^((?:\d+:)?\d{1,2}:\d{2}[.,]\d{1,3})\s*-->\s*")
+_LEADING_TIMESTAMP_PATTERN = re.compile(r"^[\[(]?((?:\d{1,2}:)?\d{1,2}:\d{2})(?:[.,]\d{1,3})?[\])]?\s+")
+# 「說話者：」或「Speaker: 」；半形冒號後須為空白，避免把網址或時間誤判為說話者
+_SPEAKER_PATTERN = re.compile(r"^([^\s：:\[\]()<>-][^：:\n]{0,39}?)\s*(?:：|:\s)\s*")
+_VOICE_PATTERN = re.compile(r"<v(?:\.[^\s>]+)*\s+([^>]+)>")
+_TAG_PATTERN = re.compile(r"<[^>]*>|\{\\[^}]*\}")
+
+Source = Union[str, bytes, BinaryIO]
+
+@dataclass(frozen=True)
+class Turn:
+    """One speaker turn of a transcript."""
+    text: str
+    speaker: Optional[str] = None
+    start: Optional[float] = None   # Seconds from the start of the recording
+
+    def to_line(self) -> str:
+        """Render the turn as "Speaker: [hh:mm:ss] text"."""
+        text = f"[{format_timestamp(self.start)}] {self.text}" if self.start is not None else self.text
+        return f"{self.speaker}: {text}" if self.speaker else text
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def parse_timestamp(value: str) -> float:
+    """Parse "hh:mm:ss,mmm", "mm:ss.mmm" or "hh:mm:ss" into seconds."""
+    parts = value.replace(",", ".").split(":")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def _detect_encoding(head: bytes) -> str:
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return "utf-16"
+    return "utf-8-sig"
+
+def iter_lines(source: Source) -> Iterator[str]:
+    """
+    Iterate over the lines of a text file without decoding it all at once.
+
+    Args:
+        source: A file path, raw bytes, or a binary file object (e.g. a Streamlit
+            UploadedFile). Paths of files over MMAP_MIN_BYTES are memory-mapped.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            encoding = _detect_encoding(f.read(4))
+            if encoding == "utf-8-sig" and os.path.getsize(source) >= MMAP_MIN_BYTES:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if mapped[:3] == b"\xef\xbb\xbf":
+                        mapped.seek(3)
+                    for line in iter(mapped.readline, b""):
+                        yield line.decode("utf-8", errors="replace").rstrip("\r\n")
+                return
+            f.seek(0)
+            yield from _iter_decoded(f, encoding)
+        return
+
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    source.seek(0)
+    encoding = _detect_encoding(source.read(4))
+    source.seek(0)
+    yield from _iter_decoded(source, encoding)
+
+def _iter_decoded(binary: BinaryIO, encoding: str) -> Iterator[str]:
+    text = io.TextIOWrapper(binary, encoding=encoding, errors="replace", newline=None)
+    try:
+        for line in text:
+            yield line.rstrip("\n")
+    finally:
+        # 不關閉呼叫端的檔案物件
+        text.detach()
+
+def iter_docx_paragraphs(source: Source) -> Iterator[str]:
+    """Stream the paragraphs of a .docx document (parsed incrementally with the standard library)."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    try:
+        with zipfile.ZipFile(source) as archive, archive.open("word/document.xml") as document:
+            parts: List[str] = []
+            for event, element in ElementTree.iterparse(document, events=("start", "end")):
+                if event == "start":
+                    continue
+                if element.tag == _WORD_NAMESPACE + "t":
+                    parts.append(element.text or "")
+                elif element.tag == _WORD_NAMESPACE + "tab":
+                    parts.append(" ")
+                elif element.tag in (_WORD_NAMESPACE + "br", _WORD_NAMESPACE + "cr"):
+                    parts.append("\n")
+                elif element.tag == _WORD_NAMESPACE + "p":
+                    yield from "".join(parts).split("\n")
+                    parts = []
+                    element.clear()
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise ValueError(f"Not a valid .docx file: {e}") from e
+
+def _split_speaker(text: str) -> Tuple[Optional[str], str]:
+    match = _SPEAKER_PATTERN.match(text)
+    if match and any(char.isalpha() for char in match.group(1)):
+        return match.group(1).strip(), text[match.end():]
+    return None, text
+
+def parse_plain_lines(lines: Iterable[str]) -> Iterator[Turn]:
+    """
+    Parse plain text (txt, md, docx paragraphs) into turns.
+
+    A line starting with an optional timestamp and/or "Name:" begins a new turn;
+    other lines continue the previous turn of a named speaker, or stand alone.
+    """
+    current: Optional[Turn] = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        start = None
+        timestamp = _LEADING_TIMESTAMP_PATTERN.match(line)
+        if timestamp:
+            start = parse_timestamp(timestamp.group(1))
+            line = line[timestamp.end():]
+        speaker, text = _split_speaker(line)
+
+        if current and current.speaker and speaker is None and start is None:
+            current = Turn(current.text + "\n" + text, current.speaker, current.start)
+            continue
+        if current:
+            yield current
+        current = Turn(text, speaker, start)
+    if current:
+        yield current
+
+def _iter_cues(lines: Iterable[str]) -> Iterator[Tuple[float, List[str]]]:
+    """Iterate over the (start, text lines) of SRT/WebVTT cues, skipping headers, ids and notes."""
+    start: Optional[float] = None
+    text: List[str] = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if start is not None and text:
+                yield start, text
+            start, text = None, []
+            continue
+        timing = _CUE_TIMING_PATTERN.match(line)
+        if timing:
+            start, text = parse_timestamp(timing.group(1)), []
+        elif start is not None:
+            text.append(line)
+    if start is not None and text:
+        yield start, text
+
+def parse_subtitle_lines(lines: Iterable[str]) -> Iterator[Turn]:
+    """
+    Parse SRT or WebVTT subtitles into turns.
+
+    The speaker comes from a WebVTT voice tag (<v Name>) or a "Name:" prefix;
+    consecutive cues of the same speaker are merged up to MAX_MERGED_CHARS,
+    unless they are more than MAX_MERGE_GAP_SECONDS apart.
+    """
+    current: Optional[Turn] = None
+    previous_start = 0.0
+    for start, cue_lines in _iter_cues(lines):
+        cue = " ".join(cue_lines)
+        voice = _VOICE_PATTERN.search(cue)
+        cue = " ".join(_TAG_PATTERN.sub("", cue).split())
+        speaker, text = (voice.group(1).strip(), cue) if voice else _split_speaker(cue)
+        if not text:
+            continue
+        mergeable = current and speaker == current.speaker and start - previous_start <= MAX_MERGE_GAP_SECONDS
+        previous_start = start
+        if mergeable and len(current.text) + len(text) < MAX_MERGED_CHARS:
+            current = Turn(current.text + " " + text, current.speaker, current.start)
+            continue
+        if current:
+            yield current
+        current = Turn(text, speaker, start)
+    if current:
+        yield current
+
+def iter_turns(source: Source, filename: str) -> Iterator[Turn]:
+    """
+    Stream the turns of a transcript file.
+
+    Raises:
+        ValueError: If the file type is not supported or the file cannot be read
+    """
+    extension = os.path.splitext(filename)[1].lower().lstrip(".")
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file type: .{extension}")
+    if extension == "docx":
+        return parse_plain_lines(iter_docx_paragraphs(source))
+    if extension in ("srt", "vtt"):
+        return parse_subtitle_lines(iter_lines(source))
+    return parse_plain_lines(iter_lines(source))
+
+def load_transcript(source: Source, filename: str) -> Dict:
+    """
+    Read a transcript file into the normalized form sent to the analysis pipeline.
+
+    Returns:
+        Dict containing name, transcript (one "Speaker: [hh:mm:ss] text" line per
+        turn), turns, speakers, duration (seconds, or None without timestamps),
+        chars and preview (the first PREVIEW_TURNS lines)
+
+    Raises:
+        ValueError: If the file type is not supported, the file cannot be read,
+            or it contains no text
+    """
+    lines: List[str] = []
+    speakers = set()
+    duration = None
+    for turn in iter_turns(source, filename):
+        lines.append(turn.to_line())
+        if turn.speaker:
+            speakers.add(turn.speaker)
+        if turn.start is not None:
+            duration = turn.start
+    if not lines:
+        raise ValueError("The file contains no text")
+
+    transcript = "\n".join(lines)
+    return {
+        "name": os.path.basename(filename),
+        "transcript": transcript,
+        "turns": len(lines),
+        "speakers": len(speakers),
+        "duration": duration,
+        "chars": len(transcript),
+        "preview": "\n".join(lines[:PREVIEW_TURNS]),
+    }